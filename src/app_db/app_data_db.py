@@ -1,25 +1,165 @@
 """"""
+import datetime
+import os
+import threading
 import uuid
-from sqlite3 import IntegrityError
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, create_engine, event, func, inspect, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
 
+from app_db.cached_answers import CachedAnswer, CachedAnswerTable
+from app_db.compendium_entries import Monster, MonsterTable, Spell, SpellTable
 from app_db.decl_base import DeclarativeBaseDnDAppDB
+from app_db.documents import (
+    DocumentChunk,
+    DocumentChunkTable,
+    DocumentPage,
+    DocumentPageTable,
+    SourceDocument,
+    SourceDocumentTable
+)
+from app_db.registry_version import RegistryVersionTable
+from app_db.vector_rows import VectorRowTable
 from llm_common.persona import Persona, PersonaTable
-from llm_common.conversation import Conversation, ConversationTable
+from llm_common.conversation import (
+    ArchivedSession,
+    ArchivedSessionTable,
+    Conversation,
+    ConversationSummary,
+    ConversationRecord,
+    ConversationSummaryTable,
+    ConversationTable,
+    ConversationTurn
+)
+from llm_common.embedding_cache import EmbeddingCacheEntry, EmbeddingCacheTable
+from llm_common.session_settings import SessionSettings, SessionSettingsTable
+from llm_common.uuid_type import UUIDType, set_uuid_as_blob, uuid_as_blob, uuid_db_value
 from log.logger import logger
 
+# keep bound parameters per statement well under SQLite's variable limit
+SQLITE_IN_BATCH = 500
+
+PERSONA_REGISTRY = 'personas'
+
+APP_DB_URL = os.environ.get('DND_APP_DB_URL', 'sqlite:///dnd_rag_data.db')
+APP_DB_ECHO = os.environ.get('DND_APP_DB_ECHO', '').lower() in {'1', 'true', 'yes'}
+
 
 class AppDataDB:
     """"""
-    def __init__(self):
+    def __init__(
+        self,
+        db_url: str = APP_DB_URL,
+        echo: bool = APP_DB_ECHO,
+        pool_size: int = 16,
+        max_overflow: int = 16,
+        busy_timeout_ms: int = 5000,
+        mmap_size: int = 256 * 1024 * 1024,
+    ):
         """"""
-        self._engine = create_engine('sqlite:///dnd_rag_data.db', echo=True)
+        self._engine = create_engine(
+            db_url,
+            echo=echo,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            connect_args={
+                # connections are handed between threads by the pool, never shared at once
+                'check_same_thread': False,
+                'timeout': busy_timeout_ms / 1000,
+            },
+        )
+        event.listen(self._engine, 'connect',
+                self._make_pragma_listener(busy_timeout_ms, mmap_size))
         self._session_mkr = sessionmaker(bind=self._engine)
-        self._session = self._session_mkr()
+        # one session per thread; web requests release theirs via remove_session()
+        self._session = scoped_session(self._session_mkr)
         DeclarativeBaseDnDAppDB.metadata.create_all(self._engine)
+        self._upgrade_schema()
+        self._check_uuid_storage()
+
+    @staticmethod
+    def _make_pragma_listener(busy_timeout_ms: int, mmap_size: int):
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # WAL lets readers proceed while a single writer commits
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+            cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            # SQLite ignores REFERENCES clauses, ON DELETE CASCADE included, unless asked
+            cursor.execute('PRAGMA foreign_keys=ON')
+            cursor.close()
+        return set_sqlite_pragmas
+
+    def remove_session(self):
+        """Close and discard the calling thread's session, returning its connection to the pool."""
+        self._session.remove()
+
+    def _upgrade_schema(self):
+        """create_all() does not alter existing tables; add nullable columns and indexes
+        declared since."""
+        inspector = inspect(self._engine)
+        with self._engine.begin() as conn:
+            for table in DeclarativeBaseDnDAppDB.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+                existing = {c['name'] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing or not column.nullable:
+                        continue
+                    column_type = column.type.compile(dialect=self._engine.dialect)
+                    logger.info(f"Adding column {table.name}.{column.name} {column_type}")
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+
+    def _check_uuid_storage(self):
+        """Lookups would miss every row whose UUIDs are stored unlike this process binds them, so
+        bind them the way the database already stores them."""
+        wanted = 'blob' if uuid_as_blob() else 'text'
+        with self._engine.connect() as conn:
+            stored = conn.execute(text(
+                f'SELECT typeof(session_id) FROM {ConversationTable.__tablename__} LIMIT 1'
+            )).scalar()
+        if stored is not None and stored != wanted:
+            logger.warning(f"Conversation session ids are stored as {stored}, but "
+                           f"DND_APP_DB_UUID_BLOB asks for {wanted}; binding them as {stored}. "
+                           f"Convert with python -m app_db.compact_conversations "
+                           f"--uuid_storage {wanted}")
+            set_uuid_as_blob(stored == 'blob')
+
+    def convert_uuid_storage(self, as_blob: bool) -> int:
+        """Rewrite the values of every UUID column as 16-byte BLOBs, or back to strings, and
+        bind them that way from now on."""
+        wanted = 'blob' if as_blob else 'text'
+        converted = 0
+        with self._engine.begin() as conn:
+            for table in DeclarativeBaseDnDAppDB.metadata.sorted_tables:
+                for column in table.columns:
+                    if not isinstance(column.type, UUIDType):
+                        continue
+                    values = conn.execute(text(
+                        f'SELECT DISTINCT {column.name} FROM {table.name} '
+                        f'WHERE {column.name} IS NOT NULL AND typeof({column.name}) != :wanted'
+                    ), {'wanted': wanted}).scalars().all()
+                    if values:
+                        conn.execute(text(
+                            f'UPDATE {table.name} SET {column.name} = :new '
+                            f'WHERE {column.name} = :old'
+                        ), [{'old': value, 'new': uuid_db_value(value, as_blob)}
+                            for value in values])
+                    converted += len(values)
+        set_uuid_as_blob(as_blob)
+        return converted
+
+    def vacuum(self):
+        """Rebuild the database file, handing the pages freed by deletes back to the filesystem."""
+        with self._engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
 
     @property
     def engine(self):
@@ -51,8 +191,8 @@ class AppDataDB:
         all_personas = self._session.query(PersonaTable).all()
         return [Persona.model_validate(persona) for persona in all_personas]
 
-    def upsert_persona(self, persona_data: Persona):
-        """"""
+    def upsert_persona(self, persona_data: Persona) -> bool:
+        """True once committed."""
         try:
             # Check if persona exists by name
             existing_persona = self.session.query(PersonaTable).filter_by(
@@ -73,14 +213,35 @@ class AppDataDB:
                 )
                 self.session.add(persona_db)
 
+            self._bump_registry_version(PERSONA_REGISTRY)
             # Commit changes
             self.session.commit()
             logger.info(f"Persona '{persona_data.name}' upserted successfully!")
+            return True
 
-        except IntegrityError as e:
+        except (IntegrityError, OperationalError) as e:
             self.session.rollback()
             logger.error(f"Error during database operation: {e}")
             # raise e
+            return False
+
+    def get_registry_version(self, registry_name: str) -> int:
+        """"""
+        version = self.session.query(RegistryVersionTable.version).filter_by(
+            registry_name=registry_name
+        ).scalar()
+        # end the read transaction right away; this runs on otherwise DB-free request paths
+        self.session.commit()
+        return version or 0
+
+    def _bump_registry_version(self, registry_name: str):
+        """Increment within the caller's transaction."""
+        stmt = sqlite_insert(RegistryVersionTable).values(registry_name=registry_name, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RegistryVersionTable.registry_name],
+            set_={'version': RegistryVersionTable.version + 1}
+        )
+        self.session.execute(stmt)
 
     def get_conversation_history(
         self,
@@ -96,6 +257,48 @@ class AppDataDB:
             Conversation.model_validate(x) for x in result
         ]
 
+    def get_conversation_records(
+        self,
+        session_id: uuid.UUID,
+        persona_name: str,
+        before: Optional[Tuple[datetime.datetime, str]] = None,
+        since: Optional[datetime.datetime] = None,
+        limit: int = 50
+    ) -> List[ConversationRecord]:
+        """Up to ``limit`` most recent turns, oldest first.
+
+        ``before`` is a keyset cursor of (message_time, conversation_sender): only turns strictly
+        older are returned. ``since`` excludes turns at or before that time.
+        """
+        query = select(
+            ConversationTable.session_id,
+            ConversationTable.persona_name,
+            ConversationTable.message_time,
+            ConversationTable.conversation_sender,
+            ConversationTable.conversation_content,
+            ConversationTable.token_count
+        ).where(
+            ConversationTable.session_id == session_id,
+            ConversationTable.persona_name == persona_name
+        )
+        if before is not None:
+            before_time, before_sender = before
+            query = query.where(or_(
+                ConversationTable.message_time < before_time,
+                and_(
+                    ConversationTable.message_time == before_time,
+                    ConversationTable.conversation_sender < before_sender
+                )
+            ))
+        if since is not None:
+            query = query.where(ConversationTable.message_time > since)
+        query = query.order_by(
+            ConversationTable.message_time.desc(),
+            ConversationTable.conversation_sender.desc()
+        ).limit(limit)
+        rows = self.session.execute(query).all()
+        return [ConversationRecord(*row) for row in reversed(rows)]
+
     def get_conversation_entry(
         self,
         session_id: uuid.UUID,
@@ -114,33 +317,607 @@ class AppDataDB:
 
     def upsert_conversation_entry(self, conversation: Conversation):
         """"""
+        self.upsert_conversation_entries([conversation])
+
+    def upsert_conversation_entries(self, conversations: List[Conversation]):
+        """"""
+        if not conversations:
+            return
         try:
-            existing_conversation = self.session.query(ConversationTable).filter_by(
-                session_id=conversation.session_id,
-                persona_name=conversation.persona_name,
-                message_time=conversation.message_time,
-                conversation_sender=conversation.conversation_sender,
-            ).all()
+            self._execute_conversation_upserts(conversations)
+            self.session.commit()
+            logger.debug(f"Upserted {len(conversations)} conversation entries")
+        # an OperationalError (a locked database) goes to the caller, which may retry
+        except IntegrityError as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+            # raise e
 
-            if existing_conversation:
-                logger.info(f"Conversation '{conversation}' exists, updating.")
-                existing_conversation.conversation_content = conversation.conversation_content
-            else:
-                logger.info(f"Conversation '{conversation}' does not exist, creating.")
-                conversation_db = ConversationTable(
+    def _execute_conversation_upserts(self, conversations: List[Conversation]):
+        """Within the caller's transaction."""
+        for start in range(0, len(conversations), SQLITE_IN_BATCH // 6):
+            stmt = sqlite_insert(ConversationTable).values([
+                conversation.model_dump()
+                for conversation in conversations[start:start + SQLITE_IN_BATCH // 6]
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[c.name for c in ConversationTable.__table__.primary_key],
+                set_={
+                    'conversation_content': stmt.excluded.conversation_content,
+                    'token_count': stmt.excluded.token_count,
+                }
+            )
+            self.session.execute(stmt)
+
+    def get_session_conversations(self, session_id: uuid.UUID) -> List[Conversation]:
+        """Every turn of the session, with any persona, oldest first."""
+        result = self.session.query(ConversationTable).filter_by(
+            session_id=session_id
+        ).order_by(
+            ConversationTable.message_time.asc(),
+            ConversationTable.persona_name.asc(),
+            ConversationTable.conversation_sender.asc()
+        ).all()
+        return [
+            Conversation.model_validate(x) for x in result
+        ]
+
+    def get_idle_sessions(
+        self,
+        idle_before: datetime.datetime,
+        after: Optional[uuid.UUID] = None,
+        limit: int = 100
+    ) -> List[uuid.UUID]:
+        """Sessions whose newest turn is older than ``idle_before``, in session id order,
+        starting after ``after``."""
+        query = select(ConversationTable.session_id).group_by(
+            ConversationTable.session_id
+        ).having(
+            func.max(ConversationTable.message_time) < idle_before
+        )
+        if after is not None:
+            query = query.where(ConversationTable.session_id > after)
+        query = query.order_by(ConversationTable.session_id).limit(limit)
+        return list(self.session.execute(query).scalars().all())
+
+    def archive_conversation_session(self, entry: ArchivedSession,
+            replaces: Optional[ArchivedSession] = None) -> bool:
+        """Replace the session's hot turns by its archive entry; False, changing nothing, if a
+        turn newer than the archived ones arrived in the meantime, or if the session's archive
+        entry is no longer ``replaces``, whose turns ``entry`` must include."""
+        try:
+            newest = self.session.query(func.max(ConversationTable.message_time)).filter_by(
+                session_id=entry.session_id
+            ).scalar()
+            if newest != entry.last_message_time:
+                self.session.rollback()
+                return False
+            existing = self.session.query(ArchivedSessionTable).filter_by(
+                session_id=entry.session_id
+            ).first()
+            if (existing is None) != (replaces is None) or existing is not None and (
+                    (existing.segment, existing.offset) != (replaces.segment, replaces.offset)):
+                # merging with a block that was restored or replaced meanwhile would lose turns
+                self.session.rollback()
+                logger.error(f"Archive entry of session {entry.session_id} changed while "
+                             f"archiving it; left its turns hot")
+                return False
+            self.session.query(ConversationTable).filter_by(
+                session_id=entry.session_id
+            ).delete(synchronize_session=False)
+            self.session.merge(ArchivedSessionTable(**entry.model_dump()))
+            self.session.commit()
+            return True
+        except (IntegrityError, OperationalError) as e:
+            # a writer committed to the session after our read; it isn't idle after all
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+            return False
+
+    def get_archived_session(self, session_id: uuid.UUID) -> Optional[ArchivedSession]:
+        """"""
+        result = self.session.query(ArchivedSessionTable).filter_by(
+            session_id=session_id
+        ).first()
+        return ArchivedSession.model_validate(result) if result is not None else None
+
+    def restore_archived_session(self, session_id: uuid.UUID, conversations: List[Conversation]):
+        """Put archived turns back into the hot table and drop the archive entry, atomically."""
+        try:
+            self._execute_conversation_upserts(conversations)
+            self.session.query(ArchivedSessionTable).filter_by(
+                session_id=session_id
+            ).delete(synchronize_session=False)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_archive_totals(self) -> Tuple[int, int, int, int]:
+        """Archived sessions, turns, compressed bytes and raw bytes."""
+        row = self.session.query(
+            func.count(ArchivedSessionTable.session_id),
+            func.coalesce(func.sum(ArchivedSessionTable.turn_count), 0),
+            func.coalesce(func.sum(ArchivedSessionTable.length), 0),
+            func.coalesce(func.sum(ArchivedSessionTable.raw_bytes), 0),
+        ).one()
+        self.session.commit()
+        return tuple(row)
+
+    def update_conversation_token_counts(self, conversations: List[ConversationTurn]):
+        """"""
+        try:
+            for conversation in conversations:
+                self.session.query(ConversationTable).filter_by(
                     session_id=conversation.session_id,
                     persona_name=conversation.persona_name,
                     message_time=conversation.message_time,
                     conversation_sender=conversation.conversation_sender,
-                    conversation_content=conversation.conversation_content,
+                ).update(
+                    {ConversationTable.token_count: conversation.token_count},
+                    synchronize_session=False
                 )
-                self.session.add(conversation_db)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_conversation_summary(
+        self,
+        session_id: uuid.UUID,
+        persona_name: str
+    ) -> Optional[ConversationSummary]:
+        """"""
+        result = self.session.query(ConversationSummaryTable).filter_by(
+            session_id=session_id,
+            persona_name=persona_name
+        ).first()
+        return ConversationSummary.model_validate(result) if result is not None else None
 
+    def upsert_conversation_summary(self, summary: ConversationSummary):
+        """"""
+        try:
+            self.session.merge(ConversationSummaryTable(**summary.model_dump()))
             self.session.commit()
-            logger.info(f"Conversation '{conversation}' upserted successfully!")
-        except IntegrityError as e:
+        except (IntegrityError, OperationalError) as e:
             self.session.rollback()
             logger.error(f"Error during database operation: {e}")
-            # raise e
 
-app_db = AppDataDB()
+    def get_session_settings(self, session_id: uuid.UUID) -> Optional[SessionSettings]:
+        """"""
+        result = self.session.query(SessionSettingsTable).filter(
+            SessionSettingsTable.session_id == session_id
+        ).first()
+        return SessionSettings.model_validate(result) if result is not None else None
+
+    def upsert_session_settings(self, settings: SessionSettings):
+        """"""
+        try:
+            self.session.merge(SessionSettingsTable(**settings.model_dump()))
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def upsert_source_document(self, document: SourceDocument):
+        """"""
+        try:
+            self.session.merge(SourceDocumentTable(**document.model_dump()))
+            # a re-ingested book may have shrunk
+            self.session.query(DocumentPageTable).filter(
+                DocumentPageTable.source_path == document.source_path,
+                DocumentPageTable.page_number >= document.page_count
+            ).delete(synchronize_session=False)
+            self.session.commit()
+            logger.info(f"Source document '{document.source_path}' upserted successfully!")
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_source_document(self, source_path: str) -> Optional[SourceDocument]:
+        """"""
+        result = self.session.query(SourceDocumentTable).filter_by(source_path=source_path).first()
+        return SourceDocument.model_validate(result) if result is not None else None
+
+    def get_source_paths(self) -> List[str]:
+        """"""
+        result = self.session.query(SourceDocumentTable.source_path).all()
+        return [source_path for source_path, in result]
+
+    def delete_source_document(self, source_path: str) -> List[str]:
+        """Delete the document with its pages, chunks and compendium entries; returns the ids
+        of the chunks deleted, whose vector rows are tombstoned."""
+        chunk_ids = self.get_document_chunk_ids(source_path)
+        self.delete_document_chunks(chunk_ids)
+        self.replace_compendium_entries(source_path, [], [])
+        try:
+            self.session.query(DocumentPageTable).filter_by(
+                source_path=source_path
+            ).delete(synchronize_session=False)
+            self.session.query(SourceDocumentTable).filter_by(
+                source_path=source_path
+            ).delete(synchronize_session=False)
+            self.session.commit()
+            logger.info(f"Source document '{source_path}' deleted with {len(chunk_ids)} chunks")
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+        return chunk_ids
+
+    def upsert_document_pages(self, pages: List[DocumentPage]):
+        """"""
+        try:
+            for page in pages:
+                self.session.merge(DocumentPageTable(**page.model_dump()))
+            self.session.commit()
+            # pages are write-once for the ingest; don't keep their text in the identity map
+            self.session.expunge_all()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_document_pages(self, source_path: str) -> List[DocumentPage]:
+        """"""
+        result = self.session.query(DocumentPageTable).filter_by(
+            source_path=source_path
+        ).order_by(DocumentPageTable.page_number.asc()).all()
+        return [DocumentPage.model_validate(x) for x in result]
+
+    def get_document_page(self, source_path: str, page_number: int) -> Optional[DocumentPage]:
+        """"""
+        result = self.session.query(DocumentPageTable).filter_by(
+            source_path=source_path,
+            page_number=page_number
+        ).first()
+        return DocumentPage.model_validate(result) if result is not None else None
+
+    def get_page_source_hashes(self, source_path: str) -> Dict[int, str]:
+        """"""
+        result = self.session.query(
+            DocumentPageTable.page_number,
+            DocumentPageTable.source_sha256
+        ).filter(
+            DocumentPageTable.source_path == source_path,
+            DocumentPageTable.source_sha256.isnot(None)
+        ).all()
+        return {page_number: source_sha256 for page_number, source_sha256 in result}
+
+    def upsert_document_chunks(self, chunks: List[DocumentChunk]):
+        """"""
+        try:
+            for chunk in chunks:
+                self.session.merge(DocumentChunkTable(**chunk.model_dump()))
+            self.session.commit()
+            self.session.expunge_all()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_document_chunks(self, chunk_ids: List[str]) -> Dict[str, DocumentChunk]:
+        """"""
+        result = self.session.query(DocumentChunkTable).filter(
+            DocumentChunkTable.chunk_id.in_(chunk_ids)
+        ).all()
+        return {x.chunk_id: DocumentChunk.model_validate(x) for x in result}
+
+    def get_document_chunk_ids(self, source_path: str) -> List[str]:
+        """"""
+        result = self.session.query(DocumentChunkTable.chunk_id).filter_by(
+            source_path=source_path
+        ).all()
+        return [chunk_id for chunk_id, in result]
+
+    def delete_document_chunks(self, chunk_ids: List[str]):
+        """"""
+        try:
+            for start in range(0, len(chunk_ids), SQLITE_IN_BATCH):
+                batch = chunk_ids[start:start + SQLITE_IN_BATCH]
+                self.session.query(DocumentChunkTable).filter(
+                    DocumentChunkTable.chunk_id.in_(batch)
+                ).delete(synchronize_session=False)
+                # in every vector store, so the next compaction drops them
+                self.session.query(VectorRowTable).filter(
+                    VectorRowTable.chunk_id.in_(batch)
+                ).update({VectorRowTable.deleted: True}, synchronize_session=False)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def replace_compendium_entries(self, source_path: str, monsters: List[Monster],
+            spells: List[Spell]):
+        """"""
+        try:
+            for table in (MonsterTable, SpellTable):
+                self.session.query(table).filter(
+                    table.source_path == source_path
+                ).delete(synchronize_session=False)
+            for monster in monsters:
+                self.session.merge(MonsterTable(**monster.model_dump()))
+            for spell in spells:
+                self.session.merge(SpellTable(**spell.model_dump()))
+            self.session.commit()
+            self.session.expunge_all()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def query_monsters(
+        self,
+        creature_type: Optional[str] = None,
+        cr_min: Optional[float] = None,
+        cr_max: Optional[float] = None,
+        size: Optional[str] = None,
+        source_path: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Monster]:
+        """"""
+        query = self.session.query(MonsterTable)
+        if creature_type is not None:
+            query = query.filter(MonsterTable.creature_type == creature_type)
+        if cr_min is not None:
+            query = query.filter(MonsterTable.challenge_rating >= cr_min)
+        if cr_max is not None:
+            query = query.filter(MonsterTable.challenge_rating <= cr_max)
+        if size is not None:
+            query = query.filter(MonsterTable.size == size)
+        if source_path is not None:
+            query = query.filter(MonsterTable.source_path == source_path)
+        result = query.order_by(
+            MonsterTable.challenge_rating.asc(),
+            MonsterTable.name.asc()
+        ).limit(limit).all()
+        return [Monster.model_validate(x) for x in result]
+
+    def query_spells(
+        self,
+        level: Optional[int] = None,
+        school: Optional[str] = None,
+        ritual: Optional[bool] = None,
+        concentration: Optional[bool] = None,
+        source_path: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Spell]:
+        """"""
+        query = self.session.query(SpellTable)
+        if level is not None:
+            query = query.filter(SpellTable.level == level)
+        if school is not None:
+            query = query.filter(SpellTable.school == school)
+        if ritual is not None:
+            query = query.filter(SpellTable.ritual.is_(ritual))
+        if concentration is not None:
+            query = query.filter(SpellTable.concentration.is_(concentration))
+        if source_path is not None:
+            query = query.filter(SpellTable.source_path == source_path)
+        result = query.order_by(SpellTable.level.asc(), SpellTable.name.asc()).limit(limit).all()
+        return [Spell.model_validate(x) for x in result]
+
+    def iter_chunk_texts(self, batch_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """"""
+        query = self.session.query(
+            DocumentChunkTable.chunk_id,
+            DocumentChunkTable.chunk_text
+        ).order_by(DocumentChunkTable.chunk_id).execution_options(yield_per=batch_size)
+        for chunk_id, chunk_text in query:
+            yield chunk_id, chunk_text
+
+    def get_unembedded_chunk_ids(self, store_name: str) -> List[str]:
+        """Chunks without a live row in the vector store."""
+        embedded = select(VectorRowTable.chunk_id).where(
+            VectorRowTable.store_name == store_name,
+            VectorRowTable.deleted.is_(False)
+        )
+        result = self.session.query(DocumentChunkTable.chunk_id).filter(
+            DocumentChunkTable.chunk_id.not_in(embedded)
+        ).order_by(DocumentChunkTable.chunk_id).all()
+        return [chunk_id for chunk_id, in result]
+
+    def add_vector_rows(self, store_name: str, start_row: int, chunk_ids: List[str]):
+        """"""
+        try:
+            self.session.bulk_insert_mappings(VectorRowTable, [
+                {
+                    'store_name': store_name,
+                    'row_index': start_row + offset,
+                    'chunk_id': chunk_id,
+                    'deleted': False,
+                }
+                for offset, chunk_id in enumerate(chunk_ids)
+            ])
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_vector_row_chunk_ids(self, store_name: str, row_indices: List[int]) -> Dict[int, str]:
+        """"""
+        if not row_indices:
+            return {}
+        result = self.session.query(VectorRowTable.row_index, VectorRowTable.chunk_id).filter(
+            VectorRowTable.store_name == store_name,
+            VectorRowTable.row_index.in_(row_indices),
+            VectorRowTable.deleted.is_(False)
+        ).all()
+        return {row_index: chunk_id for row_index, chunk_id in result}
+
+    def get_deleted_vector_rows(self, store_name: str) -> List[int]:
+        """"""
+        result = self.session.query(VectorRowTable.row_index).filter_by(
+            store_name=store_name,
+            deleted=True
+        ).all()
+        return [row_index for row_index, in result]
+
+    def mark_vector_rows_deleted(self, store_name: str, chunk_ids: List[str]):
+        """"""
+        try:
+            self.session.query(VectorRowTable).filter(
+                VectorRowTable.store_name == store_name,
+                VectorRowTable.chunk_id.in_(chunk_ids)
+            ).update({VectorRowTable.deleted: True}, synchronize_session=False)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_cached_embeddings(self, cache_keys: List[str]) -> Dict[str, bytes]:
+        """"""
+        found = {}
+        for start in range(0, len(cache_keys), SQLITE_IN_BATCH):
+            result = self.session.query(
+                EmbeddingCacheTable.cache_key,
+                EmbeddingCacheTable.vector
+            ).filter(
+                EmbeddingCacheTable.cache_key.in_(cache_keys[start:start + SQLITE_IN_BATCH])
+            ).all()
+            found.update(result)
+        return found
+
+    def touch_cached_embeddings(self, cache_keys: List[str]):
+        """"""
+        try:
+            now = datetime.datetime.now()
+            for start in range(0, len(cache_keys), SQLITE_IN_BATCH):
+                self.session.query(EmbeddingCacheTable).filter(
+                    EmbeddingCacheTable.cache_key.in_(cache_keys[start:start + SQLITE_IN_BATCH])
+                ).update({EmbeddingCacheTable.last_used: now}, synchronize_session=False)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def put_cached_embeddings(self, entries: List[EmbeddingCacheEntry]):
+        """"""
+        try:
+            for start in range(0, len(entries), SQLITE_IN_BATCH):
+                stmt = sqlite_insert(EmbeddingCacheTable).values(
+                    [entry.model_dump() for entry in entries[start:start + SQLITE_IN_BATCH]]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[EmbeddingCacheTable.cache_key],
+                    set_={'last_used': stmt.excluded.last_used}
+                )
+                self.session.execute(stmt)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def evict_cached_embeddings(self, max_entries: int):
+        """"""
+        try:
+            count = self.session.query(func.count(EmbeddingCacheTable.cache_key)).scalar()
+            if count <= max_entries:
+                return
+            oldest = select(EmbeddingCacheTable.cache_key).order_by(
+                EmbeddingCacheTable.last_used.asc()
+            ).limit(count - max_entries)
+            self.session.query(EmbeddingCacheTable).filter(
+                EmbeddingCacheTable.cache_key.in_(oldest)
+            ).delete(synchronize_session=False)
+            self.session.commit()
+            logger.info(f"Evicted {count - max_entries} cached embeddings")
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def get_cached_answer(self, cache_key: str) -> Optional[CachedAnswer]:
+        """"""
+        row = self.session.query(CachedAnswerTable).filter(
+            CachedAnswerTable.cache_key == cache_key
+        ).first()
+        return CachedAnswer.model_validate(row) if row is not None else None
+
+    def get_cached_answer_vectors(self, persona_name: str, prompt_sha256: str,
+            model: str) -> List[Tuple[str, bytes]]:
+        """"""
+        return [tuple(row) for row in self.session.query(
+            CachedAnswerTable.cache_key,
+            CachedAnswerTable.question_vector
+        ).filter(
+            CachedAnswerTable.persona_name == persona_name,
+            CachedAnswerTable.prompt_sha256 == prompt_sha256,
+            CachedAnswerTable.model == model,
+            CachedAnswerTable.question_vector.is_not(None)
+        ).all()]
+
+    def put_cached_answer(self, entry: CachedAnswer):
+        """"""
+        try:
+            stmt = sqlite_insert(CachedAnswerTable).values(entry.model_dump())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CachedAnswerTable.cache_key],
+                set_={
+                    'answer_text': stmt.excluded.answer_text,
+                    'question_vector': stmt.excluded.question_vector,
+                    'created_at': stmt.excluded.created_at,
+                    'last_used': stmt.excluded.last_used,
+                }
+            )
+            self.session.execute(stmt)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def touch_cached_answer(self, cache_key: str):
+        """"""
+        try:
+            self.session.query(CachedAnswerTable).filter(
+                CachedAnswerTable.cache_key == cache_key
+            ).update({
+                CachedAnswerTable.last_used: datetime.datetime.now(),
+                CachedAnswerTable.hit_count: CachedAnswerTable.hit_count + 1,
+            }, synchronize_session=False)
+            self.session.commit()
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+
+    def evict_cached_answers(self, max_entries: int, created_before: datetime.datetime) -> int:
+        """"""
+        try:
+            expired = self.session.query(CachedAnswerTable).filter(
+                CachedAnswerTable.created_at < created_before
+            ).delete(synchronize_session=False)
+            count = self.session.query(func.count(CachedAnswerTable.cache_key)).scalar()
+            overflow = max(0, count - max_entries)
+            if overflow:
+                oldest = select(CachedAnswerTable.cache_key).order_by(
+                    CachedAnswerTable.last_used.asc()
+                ).limit(overflow)
+                self.session.query(CachedAnswerTable).filter(
+                    CachedAnswerTable.cache_key.in_(oldest)
+                ).delete(synchronize_session=False)
+            self.session.commit()
+            if expired or overflow:
+                logger.info(f"Evicted {expired} expired and {overflow} least recently used "
+                            f"cached answers")
+            return expired + overflow
+        except (IntegrityError, OperationalError) as e:
+            self.session.rollback()
+            logger.error(f"Error during database operation: {e}")
+            return 0
+
+
+_app_db: Optional[AppDataDB] = None
+_app_db_lock = threading.Lock()
+
+
+def get_app_db() -> AppDataDB:
+    """The process-wide :class:`AppDataDB`, opened (and its schema created or upgraded) on the
+    first call rather than at import."""
+    global _app_db
+    if _app_db is None:
+        with _app_db_lock:
+            if _app_db is None:
+                _app_db = AppDataDB()
+    return _app_db
+
+
+def __getattr__(name: str):
+    # ``from app_db.app_data_db import app_db`` still works, opening the DB at that import
+    if name == 'app_db':
+        return get_app_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
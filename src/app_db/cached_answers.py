@@ -0,0 +1,53 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, String, Text
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+
+class CachedAnswer(DnDAppBaseModel):
+    cache_key: str
+    persona_name: str
+    # sha256 of the persona's system prompt the answer was written under
+    prompt_sha256: Optional[str] = None
+    model: str
+    question: str
+    # sorted, comma separated ids of the chunks retrieved for the question
+    chunk_ids: str
+    answer_text: str
+    # normalised float32 embedding of the question, only kept when near hits are enabled
+    question_vector: Optional[bytes] = None
+    created_at: datetime.datetime
+    last_used: datetime.datetime
+    hit_count: int = 0
+
+
+class CachedAnswerTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'answer_cache'
+    __table_args__ = (
+        Index('ix_answer_cache_persona_model', 'persona_name', 'model'),
+    )
+
+    cache_key = Column(String(64), nullable=False, primary_key=True)
+    persona_name = Column(String, nullable=False)
+    prompt_sha256 = Column(String(64), nullable=True)
+    model = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    chunk_ids = Column(Text, nullable=False)
+    answer_text = Column(Text, nullable=False)
+    question_vector = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    last_used = Column(DateTime, nullable=False, index=True)
+    hit_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        parts = [
+            f"cache_key={self.cache_key}",
+            f"persona_name={self.persona_name}",
+            f"model={self.model}",
+            f"question={self.question[:40]}",
+            f"hit_count={self.hit_count}",
+        ]
+        return f"<CachedAnswer({', '.join(parts)})>"
@@ -0,0 +1,46 @@
+import datetime
+from pathlib import Path
+from typing import Optional
+
+import click
+
+
+@click.command()
+@click.option('--archive_dir', default='conversation_archive',
+        type=click.Path(file_okay=False, path_type=Path),
+        help='Directory of the archive segments; give the web app the same --archive_dir')
+@click.option('--idle_days', default=30.0, help='Archive sessions without a turn for this long')
+@click.option('--batch_size', default=100, help='Idle sessions looked up per query')
+@click.option('--max_sessions', default=None, type=int, help='Stop after archiving this many')
+@click.option('--vacuum/--no-vacuum', default=True,
+        help='Shrink the database file afterwards (rewrites it; needs as much free disk)')
+@click.option('--uuid_storage', default=None, type=click.Choice(['text', 'blob']),
+        help='First convert stored UUIDs to 36-character text or 16-byte blobs; run the app '
+             'with DND_APP_DB_UUID_BLOB=1 for blob')
+def main_cli(archive_dir: Path, idle_days: float, batch_size: int, max_sessions: Optional[int],
+        vacuum: bool, uuid_storage: Optional[str]):
+    """Move the conversations of idle sessions from the app DB into compressed archive segments.
+
+    Safe to run while the web app is up: a session that gets a new turn meanwhile stays put.
+    """
+    from app_db.app_data_db import app_db
+    from app_db.conversation_archive import ConversationArchive
+    if uuid_storage is not None:
+        converted = app_db.convert_uuid_storage(uuid_storage == 'blob')
+        click.echo(f"Converted {converted} UUID values to {uuid_storage}")
+    archive = ConversationArchive(app_db, archive_dir)
+    result = archive.archive_idle(datetime.timedelta(days=idle_days), batch_size, max_sessions)
+    ratio = result.raw_bytes / result.compressed_bytes if result.compressed_bytes else 0.0
+    click.echo(f"Archived {result.sessions} sessions, {result.turns} turns: "
+               f"{result.raw_bytes:,} bytes compressed to {result.compressed_bytes:,} "
+               f"({ratio:.1f}x)")
+    sessions, turns, compressed_bytes, _ = app_db.get_archive_totals()
+    click.echo(f"Archive now holds {sessions} sessions, {turns} turns, "
+               f"{compressed_bytes:,} bytes")
+    if vacuum and (result.sessions or uuid_storage is not None):
+        app_db.vacuum()
+        click.echo("Vacuumed the database")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,102 @@
+from typing import Optional
+
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Index, Integer, String
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+
+class Monster(DnDAppBaseModel):
+    source_path: str
+    name: str
+    page_number: int
+    size: str
+    creature_type: str
+    alignment: str = ''
+    armor_class: Optional[int] = None
+    hit_points: Optional[int] = None
+    # 1/8, 1/4 and 1/2 are stored as fractions so CR ranges compare numerically
+    challenge_rating: Optional[float] = None
+    xp: Optional[int] = None
+    entry_text: str
+
+
+class MonsterTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'monsters'
+    __table_args__ = (
+        Index('ix_monsters_type_cr', 'creature_type', 'challenge_rating'),
+    )
+
+    source_path = Column(
+        String,
+        ForeignKey('source_documents.source_path', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True
+    )
+    name = Column(String, nullable=False, primary_key=True)
+    page_number = Column(Integer, nullable=False)
+    size = Column(String, nullable=False)
+    creature_type = Column(String, nullable=False)
+    alignment = Column(String, nullable=False, default='')
+    armor_class = Column(Integer, nullable=True)
+    hit_points = Column(Integer, nullable=True)
+    challenge_rating = Column(Float, nullable=True, index=True)
+    xp = Column(Integer, nullable=True)
+    entry_text = Column(String, nullable=False)
+
+    def __repr__(self):
+        parts = [
+            f"name={self.name}",
+            f"creature_type={self.creature_type}",
+            f"challenge_rating={self.challenge_rating}",
+            f"source_path={self.source_path}",
+        ]
+        return f"<Monster({', '.join(parts)})>"
+
+
+class Spell(DnDAppBaseModel):
+    source_path: str
+    name: str
+    page_number: int
+    # 0 for cantrips
+    level: int
+    school: str
+    ritual: bool = False
+    concentration: bool = False
+    casting_time: str = ''
+    range: str = ''
+    duration: str = ''
+    entry_text: str
+
+
+class SpellTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'spells'
+    __table_args__ = (
+        Index('ix_spells_school_level', 'school', 'level'),
+    )
+
+    source_path = Column(
+        String,
+        ForeignKey('source_documents.source_path', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True
+    )
+    name = Column(String, nullable=False, primary_key=True)
+    page_number = Column(Integer, nullable=False)
+    level = Column(Integer, nullable=False, index=True)
+    school = Column(String, nullable=False)
+    ritual = Column(Boolean, nullable=False, default=False)
+    concentration = Column(Boolean, nullable=False, default=False)
+    casting_time = Column(String, nullable=False, default='')
+    range = Column(String, nullable=False, default='')
+    duration = Column(String, nullable=False, default='')
+    entry_text = Column(String, nullable=False)
+
+    def __repr__(self):
+        parts = [
+            f"name={self.name}",
+            f"level={self.level}",
+            f"school={self.school}",
+            f"source_path={self.source_path}",
+        ]
+        return f"<Spell({', '.join(parts)})>"
@@ -0,0 +1,159 @@
+"""Cold storage for the conversations of idle sessions.
+
+All turns of a session are archived together as one zlib-compressed JSONL block, appended to
+the newest segment file in the archive directory; the ``archived_sessions`` table maps the
+session to (segment, offset, length). The hot ``conversations`` table keeps only sessions in
+use, so it and its indexes stay small enough to remain cached. A session is read back into the
+hot table the first time it is asked for. Segments are append-only: a restored session leaves
+its block behind as dead bytes.
+"""
+import datetime
+import os
+import re
+import threading
+import uuid
+import zlib
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from app_db.app_data_db import AppDataDB
+from llm_common.conversation import ArchivedSession, Conversation
+from log.logger import logger
+from log.metrics import metrics
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{6})\.jsonl\.z$')
+
+ARCHIVE_OPERATIONS = metrics.counter(
+    'dnd_conversation_archive_operations_total',
+    'Sessions moved into and out of the conversation archive.',
+    labels=('operation',),
+)
+
+
+def segment_name(number: int) -> str:
+    return f'segment-{number:06d}.jsonl.z'
+
+
+class CompactionResult(NamedTuple):
+    sessions: int
+    turns: int
+    raw_bytes: int
+    compressed_bytes: int
+
+
+class ConversationArchive:
+    """Moves idle sessions between the hot table and compressed archive segments.
+
+    Only one process should archive into a directory at a time; any number may restore from it.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        directory: Union[str, Path],
+        max_segment_bytes: int = 256 * 1024 * 1024,
+        compression_level: int = 6,
+    ):
+        self._db = db
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._max_segment_bytes = max_segment_bytes
+        self._compression_level = compression_level
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def archive_idle(self, idle_for: datetime.timedelta, batch_size: int = 100,
+            max_sessions: Optional[int] = None) -> CompactionResult:
+        """Archive every session without a turn in the last ``idle_for``."""
+        idle_before = datetime.datetime.now() - idle_for
+        sessions = turns = raw_bytes = compressed_bytes = 0
+        after = None
+        while max_sessions is None or sessions < max_sessions:
+            session_ids = self._db.get_idle_sessions(idle_before, after, batch_size)
+            if not session_ids:
+                break
+            for session_id in session_ids:
+                entry = self.archive_session(session_id)
+                if entry is not None:
+                    sessions += 1
+                    turns += entry.turn_count
+                    raw_bytes += entry.raw_bytes
+                    compressed_bytes += entry.length
+                if max_sessions is not None and sessions >= max_sessions:
+                    break
+            after = session_ids[-1]
+            self._db.remove_session()
+        return CompactionResult(sessions, turns, raw_bytes, compressed_bytes)
+
+    def archive_session(self, session_id: uuid.UUID) -> Optional[ArchivedSession]:
+        """Move the session's turns into the archive; None if it had none or got a new turn
+        while it was being written."""
+        conversations = self._db.get_session_conversations(session_id)
+        if not conversations:
+            return None
+        # turns added without rehydrating (no --archive_dir) join the earlier archived ones in
+        # one new block; the old block becomes dead bytes like a restored one
+        previous = self._db.get_archived_session(session_id)
+        if previous is not None:
+            hot = {(c.persona_name, c.message_time, c.conversation_sender) for c in conversations}
+            conversations = sorted(
+                [c for c in self.read(previous)
+                 if (c.persona_name, c.message_time, c.conversation_sender) not in hot]
+                + conversations,
+                key=lambda c: c.message_time,
+            )
+        raw = ''.join(c.model_dump_json() + '\n' for c in conversations).encode('utf-8')
+        block = zlib.compress(raw, self._compression_level)
+        segment, offset = self._append(block)
+        entry = ArchivedSession(
+            session_id=session_id,
+            segment=segment,
+            offset=offset,
+            length=len(block),
+            turn_count=len(conversations),
+            raw_bytes=len(raw),
+            last_message_time=max(c.message_time for c in conversations),
+            archived_at=datetime.datetime.now(),
+        )
+        if not self._db.archive_conversation_session(entry, replaces=previous):
+            logger.info(f"Session {session_id} became active while archiving; left it hot")
+            return None
+        ARCHIVE_OPERATIONS.inc('archive')
+        return entry
+
+    def read(self, entry: ArchivedSession) -> List[Conversation]:
+        with open(self._directory / entry.segment, 'rb') as segment:
+            segment.seek(entry.offset)
+            block = segment.read(entry.length)
+        raw = zlib.decompress(block)
+        return [Conversation.model_validate_json(line) for line in raw.splitlines() if line]
+
+    def rehydrate(self, session_id: uuid.UUID) -> bool:
+        """Move an archived session back into the hot table; False if it isn't archived."""
+        entry = self._db.get_archived_session(session_id)
+        if entry is None:
+            return False
+        self._db.restore_archived_session(session_id, self.read(entry))
+        ARCHIVE_OPERATIONS.inc('rehydrate')
+        logger.info(f"Rehydrated {entry.turn_count} archived turns of session {session_id}")
+        return True
+
+    def _append(self, block: bytes) -> Tuple[str, int]:
+        with self._lock:
+            numbers = [int(m[1]) for m in map(SEGMENT_PATTERN.match, os.listdir(self._directory))
+                       if m]
+            number = max(numbers, default=1)
+            path = self._directory / segment_name(number)
+            if path.exists() and path.stat().st_size + len(block) > self._max_segment_bytes:
+                number += 1
+                path = self._directory / segment_name(number)
+            with open(path, 'ab') as segment:
+                offset = segment.seek(0, os.SEEK_END)
+                segment.write(block)
+                segment.flush()
+                # the index row that points here is committed only after this returns
+                os.fsync(segment.fileno())
+            return segment_name(number), offset
@@ -0,0 +1,163 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+
+from app_db.app_data_db import AppDataDB
+from llm_common.conversation import Conversation
+from log.logger import logger
+from log.metrics import span
+
+_STOP = object()
+
+
+def conversation_key(conversation: Conversation) -> Tuple:
+    return (
+        conversation.session_id,
+        conversation.persona_name,
+        conversation.message_time,
+        conversation.conversation_sender,
+    )
+
+
+class ConversationWriteBehind:
+    """Takes conversation writes off the request path.
+
+    Entries go into a bounded queue drained by one writer thread, which coalesces entries with
+    the same primary key (last write wins) and upserts up to ``batch_size`` of them per
+    transaction, waiting at most ``flush_interval`` seconds for a batch to fill. When the queue
+    is full, ``submit`` blocks, pushing back on producers instead of growing without bound.
+    A batch that fails with an ``OperationalError`` (typically a locked database) is rolled back
+    and retried up to ``max_retries`` times, backing off from ``retry_backoff`` seconds, before
+    it is dropped; later writes wait behind it, so last write still wins.
+    Pending writes are flushed at interpreter exit. Readers wait only for their own session's
+    writes with ``flush(session_id=...)``.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        max_pending: int = 1024,
+        batch_size: int = 128,
+        flush_interval: float = 0.05,
+        max_retries: int = 5,
+        retry_backoff: float = 0.05,
+    ):
+        self._db = db
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._closed = False
+        # submitted but not yet committed (or failed) writes per session
+        self._pending_sessions: Counter = Counter()
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='conversation-writer',
+            daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, conversation: Conversation, timeout: Optional[float] = None):
+        """Queue a write; raises ``queue.Full`` if no room frees up within ``timeout``."""
+        if self._closed:
+            self._db.upsert_conversation_entry(conversation)
+            return
+        with self._pending_lock:
+            self._pending_sessions[conversation.session_id] += 1
+        try:
+            self._queue.put(conversation, timeout=timeout)
+        except queue.Full:
+            self._settle(Counter([conversation.session_id]))
+            raise
+
+    def has_pending(self, session_id: uuid.UUID) -> bool:
+        with self._pending_lock:
+            return self._pending_sessions[session_id] > 0
+
+    def flush(self, timeout: Optional[float] = None,
+            session_id: Optional[uuid.UUID] = None) -> bool:
+        """Wait until everything submitted before this call has been committed; with
+        ``session_id``, return at once unless that session has writes pending."""
+        if self._closed:
+            return True
+        if session_id is not None and not self.has_pending(session_id):
+            return True
+        committed = threading.Event()
+        self._queue.put(committed, timeout=timeout)
+        return committed.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            batch: Dict[Tuple, Conversation] = {}
+            sessions: Counter = Counter()
+            waiters: List[threading.Event] = []
+            deadline = time.monotonic() + self._flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch[conversation_key(item)] = item
+                    sessions[item.session_id] += 1
+                if stop or waiters or len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._persist(list(batch.values()))
+                self._settle(sessions)
+            for waiter in waiters:
+                waiter.set()
+
+    def _persist(self, conversations: List[Conversation]):
+        for attempt in range(self._max_retries + 1):
+            try:
+                with span('db_persist'):
+                    self._db.upsert_conversation_entries(conversations)
+                return
+            except OperationalError as e:
+                if attempt == self._max_retries:
+                    logger.error(f"Dropping {len(conversations)} conversation entries after "
+                                 f"{attempt + 1} attempts: {e}")
+                    return
+                delay = self._retry_backoff * 2 ** attempt
+                logger.warning(f"Failed to persist {len(conversations)} conversation entries, "
+                               f"retrying in {delay:.2f}s: {e}")
+            except Exception as e:
+                logger.error(f"Failed to persist {len(conversations)} conversation entries: {e}")
+                return
+            finally:
+                # discards the session along with its failed transaction
+                self._db.remove_session()
+            time.sleep(delay)
+
+    def _settle(self, sessions: Counter):
+        with self._pending_lock:
+            self._pending_sessions.subtract(sessions)
+            for session_id in [s for s, n in self._pending_sessions.items() if n <= 0]:
+                del self._pending_sessions[session_id]
@@ -0,0 +1,88 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+
+class SourceDocument(DnDAppBaseModel):
+    source_path: str
+    title: str
+    file_sha256: str
+    page_count: int
+    ingested_at: datetime.datetime
+
+
+class SourceDocumentTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'source_documents'
+
+    source_path = Column(String, nullable=False, primary_key=True)
+    title = Column(String, nullable=False)
+    file_sha256 = Column(String(64), nullable=False)
+    page_count = Column(Integer, nullable=False)
+    ingested_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<SourceDocument({', '.join(parts)})>"
+
+
+class DocumentPage(DnDAppBaseModel):
+    source_path: str
+    page_number: int
+    page_text: str
+    text_sha256: str
+    ocr_used: bool
+    # hash of what the page is drawn from; equal means its text need not be extracted again
+    source_sha256: Optional[str] = None
+
+
+class DocumentPageTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'document_pages'
+
+    source_path = Column(
+        String,
+        ForeignKey('source_documents.source_path', ondelete='CASCADE'),
+        nullable=False,
+        primary_key=True
+    )
+    page_number = Column(Integer, nullable=False, primary_key=True)
+    page_text = Column(String, nullable=False)
+    text_sha256 = Column(String(64), nullable=False)
+    ocr_used = Column(Boolean, nullable=False, default=False)
+    source_sha256 = Column(String(64), nullable=True)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<DocumentPage({', '.join(parts)})>"
+
+
+class DocumentChunk(DnDAppBaseModel):
+    chunk_id: str
+    source_path: str
+    page_start: int
+    page_end: int
+    heading_path: str
+    chunk_text: str
+
+
+class DocumentChunkTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'document_chunks'
+
+    chunk_id = Column(String(64), nullable=False, primary_key=True)
+    source_path = Column(
+        String,
+        ForeignKey('source_documents.source_path', ondelete='CASCADE'),
+        nullable=False,
+        index=True
+    )
+    page_start = Column(Integer, nullable=False)
+    page_end = Column(Integer, nullable=False)
+    heading_path = Column(String, nullable=False, default='')
+    chunk_text = Column(String, nullable=False)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<DocumentChunk({', '.join(parts)})>"
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+
+
+class RegistryVersionTable(DeclarativeBaseDnDAppDB):
+    """Monotonic change counters for data cached in-process (e.g. personas); bumped in the same
+    transaction as the change so every worker can cheaply tell its copy is stale."""
+    __tablename__ = 'registry_versions'
+
+    registry_name = Column(String, nullable=False, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<RegistryVersion({', '.join(parts)})>"
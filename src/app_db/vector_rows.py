@@ -0,0 +1,24 @@
+from sqlalchemy import Boolean, Column, Integer, String
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+
+class VectorRow(DnDAppBaseModel):
+    store_name: str
+    row_index: int
+    chunk_id: str
+    deleted: bool = False
+
+
+class VectorRowTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'vector_rows'
+
+    store_name = Column(String, nullable=False, primary_key=True)
+    row_index = Column(Integer, nullable=False, primary_key=True)
+    chunk_id = Column(String(64), nullable=False, index=True)
+    deleted = Column(Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<VectorRow({', '.join(parts)})>"
@@ -0,0 +1,180 @@
+import hashlib
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app_db.app_data_db import AppDataDB
+from app_db.cached_answers import CachedAnswer
+from llm_common.embeddings import EmbeddingService, normalize_text
+from log.logger import logger
+from log.metrics import metrics
+
+ANSWER_CACHE_LOOKUPS = metrics.counter(
+    'dnd_answer_cache_lookups_total',
+    'Answer cache lookups by result (hit, near_hit, miss).',
+    labels=('result',),
+)
+
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+
+def normalize_question(question: str) -> str:
+    """Whitespace, case and trailing punctuation don't change what a question asks."""
+    return _TRAILING_PUNCTUATION.sub('', normalize_text(question).casefold())
+
+
+def prompt_sha256(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+
+
+def answer_cache_key(persona_name: str, prompt_hash: str, model: str, question: str,
+        chunk_ids: Sequence[str]) -> str:
+    material = '\0'.join([persona_name, prompt_hash, model, question,
+                          ','.join(sorted(chunk_ids))])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class AnswerCacheHit(NamedTuple):
+    cache_key: str
+    answer_text: str
+    # cosine similarity of the matched question; 1.0 for exact hits
+    similarity: float
+
+
+class AnswerCache:
+    """Answers to repeated questions, keyed on persona and its system prompt, model, normalised
+    question and the ids of the chunks retrieved for it, kept in the app DB. Editing a persona's
+    prompt thus retires its answers.
+
+    Entries expire ``ttl`` seconds after they were written, and beyond ``max_entries`` the least
+    recently used go first; both are enforced every ``evict_every`` writes. With an ``embedder``
+    and a ``near_hit_threshold``, a question without an exact entry may be answered from the
+    entry of the same persona, prompt and model whose question embedding has at least that cosine
+    similarity, whatever was retrieved for it.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 10_000,
+        embedder: Optional[EmbeddingService] = None,
+        near_hit_threshold: Optional[float] = None,
+        evict_every: int = 100,
+    ):
+        self._db = db
+        self._ttl = timedelta(seconds=ttl)
+        self._max_entries = max_entries
+        self._embedder = embedder if near_hit_threshold is not None else None
+        self._near_hit_threshold = near_hit_threshold
+        self._evict_every = evict_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        # (persona, prompt hash, model) -> (cache keys, normalised question vectors), loaded on
+        # first use
+        self._vectors: Dict[Tuple[str, str, str], Tuple[List[str], np.ndarray]] = {}
+
+    @property
+    def near_hits_enabled(self) -> bool:
+        return self._embedder is not None
+
+    def lookup(self, persona_name: str, system_prompt: str, model: str, question: str,
+            chunk_ids: Sequence[str]) -> Optional[AnswerCacheHit]:
+        normalized = normalize_question(question)
+        prompt_hash = prompt_sha256(system_prompt)
+        cache_key = answer_cache_key(persona_name, prompt_hash, model, normalized, chunk_ids)
+        hit = self._fresh_entry(cache_key)
+        result = 'hit'
+        if hit is None and self.near_hits_enabled:
+            hit = self._near_hit((persona_name, prompt_hash, model), normalized)
+            result = 'near_hit'
+        if hit is None:
+            result = 'miss'
+        else:
+            self._db.touch_cached_answer(hit.cache_key)
+        ANSWER_CACHE_LOOKUPS.inc(result)
+        return hit
+
+    def store(self, persona_name: str, system_prompt: str, model: str, question: str,
+            chunk_ids: Sequence[str], answer_text: str):
+        normalized = normalize_question(question)
+        prompt_hash = prompt_sha256(system_prompt)
+        partition = (persona_name, prompt_hash, model)
+        cache_key = answer_cache_key(persona_name, prompt_hash, model, normalized, chunk_ids)
+        vector = None
+        if self.near_hits_enabled:
+            vector = self._question_vector(normalized)
+        now = datetime.now()
+        self._db.put_cached_answer(CachedAnswer(
+            cache_key=cache_key,
+            persona_name=persona_name,
+            prompt_sha256=prompt_hash,
+            model=model,
+            question=normalized,
+            chunk_ids=','.join(sorted(chunk_ids)),
+            answer_text=answer_text,
+            question_vector=vector.tobytes() if vector is not None else None,
+            created_at=now,
+            last_used=now,
+        ))
+        with self._lock:
+            if vector is not None and partition in self._vectors:
+                keys, matrix = self._vectors[partition]
+                if not keys:
+                    # an empty entry can't know the embedding dim to stack onto
+                    self._vectors[partition] = ([cache_key], vector[None, :])
+                elif cache_key not in keys:
+                    self._vectors[partition] = (
+                        keys + [cache_key], np.vstack([matrix, vector[None, :]])
+                    )
+            self._writes += 1
+            evict = self._writes % self._evict_every == 0
+        if evict:
+            if self._db.evict_cached_answers(self._max_entries, now - self._ttl):
+                with self._lock:
+                    self._vectors.clear()
+
+    def _fresh_entry(self, cache_key: str) -> Optional[AnswerCacheHit]:
+        entry = self._db.get_cached_answer(cache_key)
+        if entry is None or datetime.now() - entry.created_at > self._ttl:
+            return None
+        return AnswerCacheHit(cache_key, entry.answer_text, 1.0)
+
+    def _question_vector(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self._embedder.embed_query(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _near_hit(self, partition: Tuple[str, str, str],
+            normalized: str) -> Optional[AnswerCacheHit]:
+        query = self._question_vector(normalized)
+        with self._lock:
+            loaded = self._vectors.get(partition)
+        if loaded is None:
+            rows = self._db.get_cached_answer_vectors(*partition)
+            keys = [key for key, _ in rows]
+            matrix = (np.vstack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+                      if rows else np.empty((0, query.shape[0]), dtype=np.float32))
+            loaded = (keys, matrix)
+            with self._lock:
+                self._vectors[partition] = loaded
+        keys, matrix = loaded
+        if not keys:
+            return None
+        if query.shape[0] != matrix.shape[1]:
+            logger.warning("Answer cache vectors don't match the embedding model; ignoring them")
+            return None
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self._near_hit_threshold:
+            return None
+        hit = self._fresh_entry(keys[best])
+        if hit is None:
+            # expired or evicted by another process; rebuild on the next lookup
+            with self._lock:
+                self._vectors.pop(partition, None)
+            return None
+        return hit._replace(similarity=float(similarities[best]))
@@ -0,0 +1,105 @@
+"""What the web routes send the browser, shared by the Flask and the Quart app, and the timing
+of a turn; kept apart from :mod:`backend.chat_app.chat_service` so the web routes can import it
+without the DB layer."""
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, MutableMapping, Optional, Tuple
+
+from llm_common.scheduler import SchedulerRejected
+from llm_common.sse import ChatCompletionDelta
+from log.logger import logger
+from log.metrics import CHAT_STAGE_SECONDS, CHAT_TURNS
+
+
+def chat_event(role_name: str, text_content: str, streaming_complete: bool = False) -> str:
+    """One message of the stream /submit sends to the browser."""
+    return json.dumps({
+        'role_name': role_name,
+        'text_content': text_content,
+        'streaming_complete': streaming_complete,
+    })
+
+
+def queue_event(position: int) -> str:
+    """Where the turn stands in the LLM scheduler's queue; the UI shows it until the reply
+    starts instead of appending it to the reply."""
+    return chat_event('queue', f"Waiting for the model: position {position} in the queue")
+
+
+def delta_event(delta: ChatCompletionDelta) -> str:
+    if delta.is_terminal:
+        return chat_event('', '', True)
+    role_name = delta.role or 'assistant'
+    return chat_event(f'{role_name[0].upper()}{role_name[1:]}', delta.content,
+            delta.finish_reason is not None)
+
+
+def answer_events(answer_text: str) -> Iterator[str]:
+    """Send a ready answer as a /submit stream. It goes out as one complete event: the UI
+    parses each chunk it reads as a single JSON object, and events yielded back to back with
+    no upstream pacing would reach it coalesced."""
+    yield chat_event('Assistant', answer_text, True)
+
+
+def parse_history_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """Parse a ``next_cursor`` of :meth:`ChatService.history_page`; raises ``ValueError``."""
+    if not cursor:
+        return None
+    before_time, _, before_sender = cursor.partition('|')
+    return datetime.fromisoformat(before_time), before_sender
+
+
+def session_id_from(session: MutableMapping[str, Any]) -> uuid.UUID:
+    """The chat session id kept in the web session, assigning one on the first request."""
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+    logger.info(f"session id: {session['session_id']}")
+    return uuid.UUID(session['session_id'])
+
+
+def rejection_body(rejection: SchedulerRejected) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """JSON body and headers of the 429 answering a turn the scheduler turned away."""
+    return ({"error": str(rejection), "retry_after": rejection.retry_after},
+            {'Retry-After': str(rejection.retry_after)})
+
+
+def persona_listing(personas: Iterable[Any]) -> Dict[str, Dict[str, str]]:
+    """The /list_personas JSON for :class:`llm_common.persona.Persona` objects."""
+    return {
+        p.name: {
+            'model': p.default_model,
+            'prompt': p.system_prompt
+        }
+        for p in personas
+    }
+
+
+class TurnTimer:
+    """Marks along one /submit: the upstream connect, the first token (measured from the start
+    of the request, as the user sees it) and the end of the stream, each observed into
+    ``dnd_chat_stage_seconds``."""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._connecting = self._started
+        self._connected = None
+        self._first_token = None
+
+    def connecting(self):
+        self._connecting = time.perf_counter()
+
+    def connected(self):
+        self._connected = time.perf_counter()
+        CHAT_STAGE_SECONDS.observe(self._connected - self._connecting, 'upstream_connect')
+
+    def token(self):
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+            CHAT_STAGE_SECONDS.observe(self._first_token - self._started, 'time_to_first_token')
+
+    def finished(self, outcome: str):
+        if self._connected is not None:
+            CHAT_STAGE_SECONDS.observe(time.perf_counter() - self._connected, 'stream')
+        CHAT_TURNS.inc(outcome)
@@ -0,0 +1,249 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app_db.app_data_db import AppDataDB
+from app_db.conversation_archive import ConversationArchive
+from app_db.conversation_writer import ConversationWriteBehind
+from backend.chat_app.answer_cache import AnswerCache
+from backend.chat_app.context_assembly import ContextAssembler
+from backend.chat_app.summarizer import ConversationSummarizer
+from backend.compendium.lookup import CompendiumLookup
+from backend.retrieval.retriever import HybridRetriever
+from llm_common.conversation import Conversation, ConversationRecord, ConversationSummary
+from llm_common.persona import Persona
+from llm_common.persona_registry import PersonaRegistry
+from llm_common.session_settings import SessionSettings
+from llm_common.session_store import SessionSettingsStore
+from llm_common.tokens import count_tokens
+from log.logger import logger
+from log.metrics import span
+
+DEFAULT_PERSONA = 'FeyCreature'
+MAX_PROMPT_HISTORY_RECORDS = 200
+DEFAULT_HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 200
+
+
+class PreparedTurn(NamedTuple):
+    session_id: uuid.UUID
+    persona_name: str
+    # the persona's system prompt when the turn was prepared, which the answer cache keys on
+    system_prompt: str
+    model: str
+    question: str
+    chunk_ids: List[str]
+    # chat completions request body; None when the answer is already known
+    payload: Optional[Dict[str, Any]]
+    answer: Optional[str] = None
+    # where ``answer`` came from, also the turn's outcome: 'cached' or 'compendium'
+    answer_source: Optional[str] = None
+
+
+class ChatService:
+    """The framework-independent half of a chat turn: everything the routes do besides talking
+    HTTP, shared by the threaded Flask app and the asyncio one.
+
+    All methods are blocking and touch the DB; async callers run them in a worker thread.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        writer: ConversationWriteBehind,
+        personas: PersonaRegistry,
+        assembler: ContextAssembler,
+        summarizer: Optional[ConversationSummarizer] = None,
+        retriever: Optional[HybridRetriever] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        session_store: Optional[SessionSettingsStore] = None,
+        compendium: Optional[CompendiumLookup] = None,
+        archive: Optional[ConversationArchive] = None,
+    ):
+        self._db = db
+        self._writer = writer
+        self._personas = personas
+        self._assembler = assembler
+        self._summarizer = summarizer
+        self._retriever = retriever
+        self._answer_cache = answer_cache
+        self._sessions = session_store if session_store is not None else SessionSettingsStore(db)
+        self._compendium = compendium
+        self._archive = archive
+
+    def default_persona(self) -> Persona:
+        persona = self._personas.get(DEFAULT_PERSONA)
+        if persona is None:
+            from app_db.init_db import init_db
+            init_db()
+            self._personas.invalidate()
+            persona = self._personas.get(DEFAULT_PERSONA)
+        return persona
+
+    def list_personas(self) -> List[Persona]:
+        self.default_persona()
+        return self._personas.all()
+
+    def create_persona(self, persona: Persona) -> bool:
+        return self._personas.upsert(persona)
+
+    def session_settings(self, session_id: uuid.UUID) -> SessionSettings:
+        return self._sessions.get(session_id)
+
+    def session_persona(self, session_id: uuid.UUID) -> Persona:
+        """The persona the session selected, or the default one."""
+        name = self._sessions.get(session_id).selected_persona_name
+        persona = self._personas.get(name) if name else None
+        return persona if persona is not None else self.default_persona()
+
+    def select(
+        self,
+        session_id: uuid.UUID,
+        persona_name: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> SessionSettings:
+        """Persist the session's persona and/or model choice; raises ``ValueError`` for an
+        unknown persona."""
+        if persona_name is not None and not self._personas.contains(persona_name):
+            raise ValueError(f"Unknown persona: {persona_name}")
+        return self._sessions.update(session_id, selected_persona_name=persona_name,
+                custom_mode_model=model)
+
+    def history_page(
+        self,
+        session_id: uuid.UUID,
+        limit: int,
+        before: Optional[Tuple[datetime, str]] = None,
+    ) -> Tuple[List[ConversationRecord], Optional[str]]:
+        """A page of history, oldest first, plus the cursor of the page before it (if any).
+        ``limit`` is clamped to 1..``MAX_HISTORY_PAGE_SIZE``."""
+        limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+        self._writer.flush(session_id=session_id)
+        records = self._conversation_records(
+                session_id=session_id,
+                persona_name=self.session_persona(session_id).name,
+                before=before,
+                limit=limit
+        )
+        next_cursor = None
+        if len(records) == limit:
+            oldest = records[0]
+            next_cursor = f'{oldest.message_time.isoformat()}|{oldest.conversation_sender}'
+        return records, next_cursor
+
+    def prepare_turn(self, session_id: uuid.UUID, model: str, chat_input: str) -> PreparedTurn:
+        """Record the user's message and either answer it from the monster/spell tables or the
+        answer cache, or build the chat completions request body."""
+        with span('persona_fetch'):
+            persona = self.session_persona(session_id)
+            self._sessions.update(session_id, custom_mode_model=model)
+        with span('history_load'):
+            # the session's previous turn is normally long committed; this only waits if not
+            self._writer.flush(session_id=session_id)
+            summary = self._db.get_conversation_summary(session_id, persona.name)
+            conv_hist = self._prompt_history(session_id, persona.name, summary)
+        self._writer.submit(Conversation(
+            session_id=session_id,
+            persona_name=persona.name,
+            message_time=datetime.now(),
+            conversation_sender='user',
+            conversation_content=chat_input,
+            token_count=count_tokens(chat_input)
+        ))
+
+        if self._compendium is not None:
+            # "all CR 3 undead" is a table lookup; no retrieval or LLM call needed
+            with span('compendium'):
+                answer = self._compendium.answer(chat_input)
+            if answer is not None:
+                return PreparedTurn(session_id, persona.name, persona.system_prompt, model,
+                        chat_input, [], None, answer, 'compendium')
+
+        with span('retrieval'):
+            rule_chunks = (self._retriever.retrieve(chat_input)
+                           if self._retriever is not None else [])
+        chunk_ids = [chunk.chunk_id for chunk in rule_chunks]
+        if self._answer_cache is not None:
+            with span('answer_cache'):
+                hit = self._answer_cache.lookup(persona.name, persona.system_prompt, model,
+                        chat_input, chunk_ids)
+            if hit is not None:
+                logger.info(f"Answer cache hit (similarity {hit.similarity:.3f})")
+                return PreparedTurn(session_id, persona.name, persona.system_prompt, model,
+                        chat_input, chunk_ids, None, hit.answer_text, 'cached')
+        with span('prompt_assembly'):
+            context = self._assembler.assemble(
+                system_prompt=persona.system_prompt,
+                user_message=chat_input,
+                history=conv_hist,
+                summary=summary,
+                chunks=rule_chunks,
+            )
+            if context.counted_turns:
+                self._db.update_conversation_token_counts(context.counted_turns)
+        if self._summarizer is not None and context.unsummarized_turns:
+            self._summarizer.schedule(model, context.unsummarized_turns, summary)
+        logger.info(f"Prompt: {len(context.messages)} messages, ~{context.prompt_tokens} tokens, "
+                    f"{len(rule_chunks)} rule chunks")
+        payload = {
+            "model": model,
+            "messages": context.messages,
+            "temperature": 0.7,
+            "max_tokens": -1,
+            "stream": True
+        }
+        return PreparedTurn(session_id, persona.name, persona.system_prompt, model, chat_input,
+                chunk_ids, payload)
+
+    def _prompt_history(self, session_id: uuid.UUID, persona_name: str,
+            summary: Optional[ConversationSummary]) -> List[ConversationRecord]:
+        """The turns the prompt may use: all those the summary doesn't cover yet when there is a
+        summarizer, since any that fall out of the window must reach it; otherwise just the
+        last ``MAX_PROMPT_HISTORY_RECORDS``."""
+        # turns already folded into the summary are never needed for the prompt
+        since = summary.summarized_through if summary is not None else None
+        records = self._conversation_records(session_id=session_id, persona_name=persona_name,
+                since=since, limit=MAX_PROMPT_HISTORY_RECORDS)
+        if self._summarizer is None:
+            return records
+        page = records
+        while len(page) == MAX_PROMPT_HISTORY_RECORDS:
+            oldest = page[0]
+            page = self._db.get_conversation_records(session_id=session_id,
+                    persona_name=persona_name, since=since,
+                    before=(oldest.message_time, oldest.conversation_sender),
+                    limit=MAX_PROMPT_HISTORY_RECORDS)
+            records = page + records
+        if len(records) > MAX_PROMPT_HISTORY_RECORDS:
+            logger.warning(f"Session {session_id} has {len(records)} turns not yet summarized")
+        return records
+
+    def _conversation_records(self, **query) -> List[ConversationRecord]:
+        records = self._db.get_conversation_records(**query)
+        # sessions are archived whole, so only a session with no hot turns can be in the archive
+        if not records and self._archive is not None:
+            with span('archive_rehydrate'):
+                if self._archive.rehydrate(query['session_id']):
+                    records = self._db.get_conversation_records(**query)
+        return records
+
+    def finish_turn(self, turn: PreparedTurn, response_parts: List[str], outcome: str):
+        """Record the reply; complete LLM answers also go into the answer cache."""
+        if not response_parts:
+            return
+        response_text = ''.join(response_parts)
+        self._writer.submit(Conversation(
+            session_id=turn.session_id,
+            persona_name=turn.persona_name,
+            message_time=datetime.now(),
+            conversation_sender='llm',
+            conversation_content=response_text,
+            token_count=count_tokens(response_text)
+        ))
+        if self._answer_cache is not None and turn.answer is None and outcome == 'ok':
+            try:
+                with span('answer_cache'):
+                    self._answer_cache.store(turn.persona_name, turn.system_prompt, turn.model,
+                            turn.question, turn.chunk_ids, response_text)
+            except Exception as e:
+                logger.error(f"Failed to cache answer: {e}")
@@ -0,0 +1,111 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from app_db.documents import DocumentChunk
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+from llm_common.conversation import ConversationSummary, ConversationTurn
+from llm_common.tokens import count_tokens
+
+# chat templates add a few tokens of role/separator framing per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+ROLE_BY_SENDER = {
+    'user': 'user',
+    'llm': 'assistant',
+}
+
+
+class ContextBudget(DnDAppBaseModel):
+    max_prompt_tokens: int = 4096
+    max_retrieved_tokens: int = 1536
+
+
+class AssembledContext(NamedTuple):
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    # turns that fell out of the window and are not yet covered by the rolling summary
+    unsummarized_turns: List[ConversationTurn]
+    # turns whose token count was computed during assembly and should be stored
+    counted_turns: List[ConversationTurn]
+
+
+def format_chunk(chunk: DocumentChunk) -> str:
+    heading = chunk.heading_path or chunk.source_path
+    return f"[{heading}, p. {chunk.page_start + 1}]\n{chunk.chunk_text}"
+
+
+class ContextAssembler:
+    """Packs the persona prompt, retrieved rule chunks, a rolling summary of older turns and
+    as many recent turns as fit into ``max_prompt_tokens``.
+
+    Priority, highest first: system prompt and the new user message (always sent), retrieved
+    chunks (best first, capped at ``max_retrieved_tokens``), the summary, then history from
+    newest to oldest.
+    """
+
+    def __init__(self, budget: Optional[ContextBudget] = None):
+        self._budget = budget if budget is not None else ContextBudget()
+
+    @property
+    def budget(self) -> ContextBudget:
+        return self._budget
+
+    def assemble(
+        self,
+        system_prompt: str,
+        user_message: str,
+        history: Sequence[ConversationTurn],
+        summary: Optional[ConversationSummary] = None,
+        chunks: Sequence[DocumentChunk] = (),
+    ) -> AssembledContext:
+        counted_turns: List[ConversationTurn] = []
+        used = (count_tokens(system_prompt) + count_tokens(user_message)
+                + 2 * MESSAGE_OVERHEAD_TOKENS)
+
+        rules_parts = []
+        rules_budget = min(self._budget.max_retrieved_tokens, self._budget.max_prompt_tokens - used)
+        for chunk in chunks:
+            part = format_chunk(chunk)
+            part_tokens = count_tokens(part)
+            if part_tokens > rules_budget:
+                continue
+            rules_parts.append(part)
+            rules_budget -= part_tokens
+            used += part_tokens
+
+        summary_tokens = summary.token_count if summary is not None else 0
+        remaining = self._budget.max_prompt_tokens - used - summary_tokens
+        window: List[ConversationTurn] = []
+        for turn in reversed(history):
+            if turn.token_count is None:
+                turn.token_count = count_tokens(turn.conversation_content)
+                counted_turns.append(turn)
+            turn_tokens = turn.token_count + MESSAGE_OVERHEAD_TOKENS
+            if turn_tokens > remaining:
+                break
+            window.append(turn)
+            remaining -= turn_tokens
+        window.reverse()
+        older = list(history[:len(history) - len(window)])
+
+        system_parts = [system_prompt]
+        # the summary is redundant only if the window reaches back past what it covers
+        if summary is not None and (
+            older or not window or window[0].message_time > summary.summarized_through
+        ):
+            system_parts.append(f"Summary of the earlier conversation:\n{summary.summary_text}")
+            used += summary_tokens
+            unsummarized = [t for t in older if t.message_time > summary.summarized_through]
+        else:
+            unsummarized = older
+        if rules_parts:
+            system_parts.append("Relevant rules excerpts:\n\n" + '\n\n'.join(rules_parts))
+
+        messages = [{'role': 'system', 'content': '\n\n'.join(system_parts)}]
+        for turn in window:
+            messages.append({
+                'role': ROLE_BY_SENDER.get(turn.conversation_sender, 'user'),
+                'content': turn.conversation_content,
+            })
+            used += turn.token_count + MESSAGE_OVERHEAD_TOKENS
+        messages.append({'role': 'user', 'content': user_message})
+        return AssembledContext(messages, used, unsummarized, counted_turns)
@@ -0,0 +1,114 @@
+import threading
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+from app_db.app_data_db import AppDataDB
+from llm_common.backend_pool import LLMBackendPool
+from llm_common.conversation import ConversationSummary, ConversationTurn
+from llm_common.scheduler import BACKGROUND_PRIORITY, LLMScheduler, SchedulerRejected
+from llm_common.tokens import count_tokens
+from log.logger import logger
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for the assistant's own future reference. Keep rules "
+    "rulings, character and place names, decisions and open questions; drop small talk. "
+    "Write at most {max_words} words."
+)
+
+
+class ConversationSummarizer:
+    """Folds turns that no longer fit the prompt window into a per-session rolling summary.
+
+    Summaries are produced off the request path on a single background thread, and at most one
+    refresh per (session, persona) is queued at a time. With a ``scheduler`` they wait behind
+    interactive turns for a model slot, and are skipped when the scheduler is too busy.
+    """
+
+    def __init__(
+        self,
+        backends: LLMBackendPool,
+        db: AppDataDB,
+        max_summary_words: int = 250,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        self._backends = backends
+        self._db = db
+        self._max_summary_words = max_summary_words
+        self._scheduler = scheduler
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarizer')
+        self._lock = threading.Lock()
+        self._pending: Set[Tuple[uuid.UUID, str]] = set()
+
+    def schedule(
+        self,
+        model: str,
+        turns: List[ConversationTurn],
+        previous: Optional[ConversationSummary],
+    ):
+        if not turns:
+            return
+        key = (turns[0].session_id, turns[0].persona_name)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._refresh, key, model, turns, previous)
+
+    def _refresh(
+        self,
+        key: Tuple[uuid.UUID, str],
+        model: str,
+        turns: List[ConversationTurn],
+        previous: Optional[ConversationSummary],
+    ):
+        try:
+            transcript = '\n'.join(
+                f"{turn.conversation_sender}: {turn.conversation_content}" for turn in turns
+            )
+            if previous is not None:
+                transcript = f"Summary so far:\n{previous.summary_text}\n\nNew turns:\n{transcript}"
+            slot = nullcontext()
+            if self._scheduler is not None:
+                # its own queue key, so it doesn't count against the session's queued turns
+                slot = self._scheduler.slot(model, ('summary', key[0]), BACKGROUND_PRIORITY)
+            with slot:
+                response = self._backends.post(
+                    'chat_completions',
+                    model,
+                    json={
+                        'model': model,
+                        'messages': [
+                            {
+                                'role': 'system',
+                                'content': SUMMARY_INSTRUCTIONS.format(
+                                    max_words=self._max_summary_words
+                                )
+                            },
+                            {'role': 'user', 'content': transcript},
+                        ],
+                        'temperature': 0.2,
+                        'stream': False,
+                    }
+                )
+            if response.status_code != 200:
+                logger.error(f"Failed to summarize conversation: {response.status_code} - "
+                             f"{response.text}")
+                return
+            summary_text = response.json()['choices'][0]['message']['content'].strip()
+            self._db.upsert_conversation_summary(ConversationSummary(
+                session_id=key[0],
+                persona_name=key[1],
+                summarized_through=turns[-1].message_time,
+                summary_text=summary_text,
+                token_count=count_tokens(summary_text),
+            ))
+        except SchedulerRejected as e:
+            logger.info(f"Skipped conversation summary: {e}")
+        except Exception as e:
+            logger.error(f"Failed to summarize conversation: {e}")
+        finally:
+            self._db.remove_session()
+            with self._lock:
+                self._pending.discard(key)
@@ -0,0 +1,98 @@
+"""Typed records from the spell entries and stat blocks the chunker finds."""
+import re
+from fractions import Fraction
+from typing import Optional
+
+from app_db.compendium_entries import Monster, Spell
+
+SCHOOLS = ('abjuration', 'conjuration', 'divination', 'enchantment', 'evocation', 'illusion',
+           'necromancy', 'transmutation')
+CREATURE_TYPES = ('aberration', 'beast', 'celestial', 'construct', 'dragon', 'elemental', 'fey',
+                  'fiend', 'giant', 'humanoid', 'monstrosity', 'ooze', 'plant', 'undead')
+SIZES = ('tiny', 'small', 'medium', 'large', 'huge', 'gargantuan')
+
+_SPELL_LEVEL_LINE = re.compile(
+    r'^(?:(?P<level>\d)(?:st|nd|rd|th)-level\s+(?P<school>\w+)|(?P<cantrip_school>\w+)\s+cantrip)'
+    r'(?P<ritual>\s*\(ritual\))?', re.IGNORECASE
+)
+_SPELL_FIELD = re.compile(r'^(Casting Time|Range|Duration):\s*(.+)$', re.IGNORECASE)
+_CREATURE_LINE = re.compile(
+    r'^(?P<size>\w+)(?:\s+or\s+\w+)?\s+(?P<type>\w+)(?:\s*\([^)]*\))?(?:,\s*(?P<alignment>.+))?$'
+)
+_ARMOR_CLASS = re.compile(r'^Armor Class\s+(\d+)', re.IGNORECASE)
+_HIT_POINTS = re.compile(r'^Hit Points\s+(\d+)', re.IGNORECASE)
+_CHALLENGE = re.compile(r'^Challenge\s+(\d+(?:/\d+)?)(?:\s*\(([\d,]+)\s*XP\))?', re.IGNORECASE)
+
+
+def parse_challenge_rating(text: str) -> float:
+    """'1/4' -> 0.25; raises ``ValueError``."""
+    try:
+        return float(Fraction(text.strip()))
+    except ZeroDivisionError:
+        raise ValueError(f"Not a challenge rating: {text}") from None
+
+
+def format_challenge_rating(value: float) -> str:
+    return str(Fraction(value).limit_denominator(8))
+
+
+def parse_spell(source_path: str, page_number: int, entry_text: str) -> Optional[Spell]:
+    lines = [line.strip() for line in entry_text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None
+    match = _SPELL_LEVEL_LINE.match(lines[1])
+    if match is None:
+        return None
+    school = (match['school'] or match['cantrip_school']).lower()
+    if school not in SCHOOLS:
+        return None
+    fields = {}
+    for line in lines[2:]:
+        field = _SPELL_FIELD.match(line)
+        if field is not None:
+            fields[field[1].lower()] = field[2]
+    duration = fields.get('duration', '')
+    return Spell(
+        source_path=source_path,
+        name=lines[0],
+        page_number=page_number,
+        level=int(match['level']) if match['level'] else 0,
+        school=school,
+        ritual=match['ritual'] is not None,
+        concentration=duration.lower().startswith('concentration'),
+        casting_time=fields.get('casting time', ''),
+        range=fields.get('range', ''),
+        duration=duration,
+        entry_text=entry_text,
+    )
+
+
+def parse_stat_block(source_path: str, page_number: int, entry_text: str) -> Optional[Monster]:
+    lines = [line.strip() for line in entry_text.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return None
+    match = _CREATURE_LINE.match(lines[1])
+    if match is None or match['size'].lower() not in SIZES:
+        return None
+    armor_class = hit_points = challenge_rating = xp = None
+    for line in lines[2:]:
+        if armor_class is None and (found := _ARMOR_CLASS.match(line)):
+            armor_class = int(found[1])
+        elif hit_points is None and (found := _HIT_POINTS.match(line)):
+            hit_points = int(found[1])
+        elif challenge_rating is None and (found := _CHALLENGE.match(line)):
+            challenge_rating = parse_challenge_rating(found[1])
+            xp = int(found[2].replace(',', '')) if found[2] else None
+    return Monster(
+        source_path=source_path,
+        name=lines[0],
+        page_number=page_number,
+        size=match['size'].lower(),
+        creature_type=match['type'].lower(),
+        alignment=(match['alignment'] or '').strip(),
+        armor_class=armor_class,
+        hit_points=hit_points,
+        challenge_rating=challenge_rating,
+        xp=xp,
+        entry_text=entry_text,
+    )
@@ -0,0 +1,220 @@
+"""Filter queries over the monster and spell tables, from query parameters or from a chat
+question such as "list all CR 3 undead" or "all 3rd-level evocation spells"."""
+import re
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Union
+
+from app_db.app_data_db import AppDataDB
+from app_db.compendium_entries import Monster, Spell
+from backend.compendium.extract import (
+    CREATURE_TYPES,
+    SCHOOLS,
+    SIZES,
+    format_challenge_rating,
+    parse_challenge_rating,
+)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+_CR = r'\d+(?:/\d+)?'
+_CR_FILTER = re.compile(
+    rf'\b(?:cr|challenge(?:\s+rating)?)\s*(?P<low>{_CR})(?:\s*(?:-|–|to)\s*(?P<high>{_CR}))?',
+    re.IGNORECASE
+)
+_SPELL_LEVEL = re.compile(r'\b(?:(\d)(?:st|nd|rd|th)[\s-]level|level[\s-](\d))\b', re.IGNORECASE)
+# only an explicit ask for a list is answered from the tables; anything else goes to the LLM
+_LISTING = re.compile(r'\b(all|list|every)\b', re.IGNORECASE)
+# "can I cast 3rd-level spells with ..." asks about the rules, not for a list
+_RULES_QUESTION = re.compile(
+    r'^\s*(how|why|can|could|does|do|is|are|should|when|if|what happens)\b', re.IGNORECASE
+)
+# words a listing request may contain besides the filters, e.g. "show me all the ... please"
+_LISTING_WORDS = frozenset({
+    'a', 'all', 'an', 'and', 'are', 'available', 'every', 'give', 'in', 'list', 'me', 'of',
+    'please', 'show', 'that', 'the', 'there', 'what', 'which', 'with',
+})
+_TABLE_WORDS = frozenset({'cantrip', 'creature', 'monster', 'ritual', 'spell'})
+_PLURAL_TYPES = {'monstrosities': 'monstrosity', 'fey': 'fey', 'undead': 'undead'}
+
+
+class MonsterFilter(NamedTuple):
+    creature_type: Optional[str] = None
+    cr_min: Optional[float] = None
+    cr_max: Optional[float] = None
+    size: Optional[str] = None
+    source_path: Optional[str] = None
+    limit: int = DEFAULT_LIMIT
+
+
+class SpellFilter(NamedTuple):
+    level: Optional[int] = None
+    school: Optional[str] = None
+    ritual: Optional[bool] = None
+    concentration: Optional[bool] = None
+    source_path: Optional[str] = None
+    limit: int = DEFAULT_LIMIT
+
+
+def _singular(word: str) -> str:
+    word = word.lower()
+    return _PLURAL_TYPES.get(word, word[:-1] if word.endswith('s') else word)
+
+
+def _bool_arg(value: Optional[str]) -> Optional[bool]:
+    if value is None:
+        return None
+    if value.lower() in {'1', 'true', 'yes'}:
+        return True
+    if value.lower() in {'0', 'false', 'no'}:
+        return False
+    raise ValueError(f"Not a boolean: {value}")
+
+
+def _limit_arg(value: Optional[str]) -> int:
+    limit = int(value) if value is not None else DEFAULT_LIMIT
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def monster_filter_from_args(args: Mapping[str, str]) -> MonsterFilter:
+    """``type``, ``cr`` (or ``cr_min``/``cr_max``), ``size``, ``source``, ``limit``; raises
+    ``ValueError``."""
+    creature_type = args.get('type')
+    if creature_type is not None and creature_type.lower() not in CREATURE_TYPES:
+        raise ValueError(f"Unknown creature type: {creature_type}")
+    size = args.get('size')
+    if size is not None and size.lower() not in SIZES:
+        raise ValueError(f"Unknown size: {size}")
+    cr_min = cr_max = None
+    if args.get('cr') is not None:
+        cr_min = cr_max = parse_challenge_rating(args['cr'])
+    if args.get('cr_min') is not None:
+        cr_min = parse_challenge_rating(args['cr_min'])
+    if args.get('cr_max') is not None:
+        cr_max = parse_challenge_rating(args['cr_max'])
+    return MonsterFilter(
+        creature_type=creature_type.lower() if creature_type else None,
+        cr_min=cr_min,
+        cr_max=cr_max,
+        size=size.lower() if size else None,
+        source_path=args.get('source'),
+        limit=_limit_arg(args.get('limit')),
+    )
+
+
+def spell_filter_from_args(args: Mapping[str, str]) -> SpellFilter:
+    """``level``, ``school``, ``ritual``, ``concentration``, ``source``, ``limit``; raises
+    ``ValueError``."""
+    school = args.get('school')
+    if school is not None and school.lower() not in SCHOOLS:
+        raise ValueError(f"Unknown school: {school}")
+    level = int(args['level']) if args.get('level') is not None else None
+    if level is not None and not 0 <= level <= 9:
+        raise ValueError("level must be between 0 and 9")
+    return SpellFilter(
+        level=level,
+        school=school.lower() if school else None,
+        ritual=_bool_arg(args.get('ritual')),
+        concentration=_bool_arg(args.get('concentration')),
+        source_path=args.get('source'),
+        limit=_limit_arg(args.get('limit')),
+    )
+
+
+def parse_compendium_question(question: str) -> Optional[Union[MonsterFilter, SpellFilter]]:
+    """The filter a chat question asks for, or None if it isn't a plain listing request: one
+    that asks for a list ("list", "all", "every") and says nothing the filters can't express,
+    so "which undead are immune to poison?" still goes to the LLM."""
+    if _RULES_QUESTION.match(question) or not _LISTING.search(question):
+        return None
+    cr_match = _CR_FILTER.search(question)
+    level_match = _SPELL_LEVEL.search(question)
+    rest = question.lower()
+    for match in (cr_match, level_match):
+        if match is not None:
+            rest = rest.replace(match[0].lower(), ' ')
+    words = re.findall(r'[a-z]+', rest)
+    filter_words = [_singular(w) for w in words if w not in _LISTING_WORDS]
+    if any(w not in _TABLE_WORDS and w not in CREATURE_TYPES and w not in SCHOOLS
+           and w not in SIZES for w in filter_words):
+        return None
+    if 'cantrip' in filter_words or 'spell' in filter_words:
+        level = 0 if 'cantrip' in filter_words else (
+            int(level_match[1] or level_match[2]) if level_match else None)
+        school = next((w for w in filter_words if w in SCHOOLS), None)
+        if cr_match is not None or (level is None and school is None):
+            return None
+        return SpellFilter(level=level, school=school,
+                ritual=True if 'ritual' in filter_words else None)
+    creature_type = next((w for w in filter_words if w in CREATURE_TYPES), None)
+    if level_match is not None or (cr_match is None and creature_type is None):
+        return None
+    cr_min = cr_max = None
+    if cr_match is not None:
+        try:
+            cr_min = parse_challenge_rating(cr_match['low'])
+            cr_max = parse_challenge_rating(cr_match['high']) if cr_match['high'] else cr_min
+        except ValueError:
+            # "cr 1/0": not a rating the tables can answer for
+            return None
+    return MonsterFilter(creature_type=creature_type, cr_min=cr_min, cr_max=cr_max,
+            size=next((w for w in filter_words if w in SIZES), None))
+
+
+def format_monster(monster: Monster) -> str:
+    details = [f"{monster.size} {monster.creature_type}"]
+    if monster.challenge_rating is not None:
+        details.insert(0, f"CR {format_challenge_rating(monster.challenge_rating)}")
+    if monster.armor_class is not None:
+        details.append(f"AC {monster.armor_class}")
+    if monster.hit_points is not None:
+        details.append(f"{monster.hit_points} HP")
+    return f"- {monster.name} ({', '.join(details)})"
+
+
+def format_spell(spell: Spell) -> str:
+    kind = f"{spell.school} cantrip" if spell.level == 0 else f"level {spell.level} {spell.school}"
+    tags = [kind] + [tag for tag, on in (('ritual', spell.ritual),
+                                         ('concentration', spell.concentration)) if on]
+    return f"- {spell.name} ({', '.join(tags)})"
+
+
+class CompendiumLookup:
+    def __init__(self, db: AppDataDB):
+        self._db = db
+
+    def monsters(self, query: MonsterFilter) -> List[Monster]:
+        return self._db.query_monsters(**query._asdict())
+
+    def spells(self, query: SpellFilter) -> List[Spell]:
+        return self._db.query_spells(**query._asdict())
+
+    def search(self, kind: str, args: Mapping[str, str]) -> List[Dict[str, Any]]:
+        """GET /compendium/<kind> for ``monsters`` or ``spells``; entry texts are only included
+        with ``full=true``. Raises ``ValueError`` for an unknown kind or bad arguments."""
+        if kind == 'monsters':
+            rows = self.monsters(monster_filter_from_args(args))
+        elif kind == 'spells':
+            rows = self.spells(spell_filter_from_args(args))
+        else:
+            raise ValueError(f"Unknown compendium table: {kind}")
+        exclude = None if _bool_arg(args.get('full')) else {'entry_text'}
+        return [row.model_dump(exclude=exclude) for row in rows]
+
+    def answer(self, question: str) -> Optional[str]:
+        """A listing that answers the question from the tables, or None to ask the LLM: the
+        question isn't a listing request, or nothing matched (the book may not be ingested)."""
+        query = parse_compendium_question(question)
+        if query is None:
+            return None
+        if isinstance(query, MonsterFilter):
+            rows, noun = self.monsters(query), 'monsters'
+            lines = [format_monster(m) for m in rows]
+        else:
+            rows, noun = self.spells(query), 'spells'
+            lines = [format_spell(s) for s in rows]
+        if not rows:
+            return None
+        more = f" (showing the first {query.limit})" if len(rows) == query.limit else ''
+        return '\n'.join([f"{len(rows)} matching {noun}{more}:"] + lines)
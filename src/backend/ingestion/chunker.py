@@ -0,0 +1,232 @@
+"""Structure-aware chunking of extracted rulebook pages.
+
+Pages are consumed as a stream and turned into blocks: headings, paragraphs, tables, spell
+entries and stat blocks. A heading followed by a spell's level/school line or a creature's
+size/type line opens an entry that runs to the next heading. Entries and tables are kept whole
+whenever they fit. Blocks are packed into chunks of at most ``max_tokens`` under one heading
+breadcrumb, and a chunk never spans two sections.
+"""
+import hashlib
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app_db.documents import DocumentChunk
+from backend.ingestion.pdf_extract import ExtractedPage
+from llm_common.tokens import count_tokens
+
+HEADING_SEPARATOR = ' > '
+
+_PAGE_NUMBER = re.compile(r'^\s*(page\s+)?\d{1,4}\s*$', re.IGNORECASE)
+_SPELL_META = re.compile(
+    r'^(\d+(st|nd|rd|th)-level\s+\w+|\w+\s+cantrip)(\s*\(ritual\))?\s*$', re.IGNORECASE
+)
+_STAT_BLOCK_META = re.compile(
+    r'^(Tiny|Small|Medium|Large|Huge|Gargantuan)(\s+or\s+\w+)?\s+[a-z]+', re.IGNORECASE
+)
+_NUMERIC_CELL = re.compile(r'^([+\-–]?\d+([–\-]\d+)?%?|\d*d\d+([+\-]\d+)?|—|–)$')
+_ABILITY_HEADER = re.compile(r'^STR\s+DEX\s+CON\b')
+# "Armor Class 12" or "Challenge 1" would otherwise pass for a Title Case heading
+_STAT_BLOCK_FIELD = re.compile(
+    r'^(Armor Class|Hit Points|Speed|Saving Throws|Skills|Damage \w+|Condition Immunities|'
+    r'Senses|Languages|Challenge|Proficiency Bonus)\b'
+)
+STAT_BLOCK_SECTIONS = {'actions', 'bonus actions', 'reactions', 'legendary actions',
+                       'lair actions', 'mythic actions'}
+_HEADING_WORD = re.compile(r"^[A-Z0-9][\w'’\-:,()&/]*$")
+_MINOR_WORDS = {'a', 'an', 'and', 'as', 'at', 'by', 'for', 'from', 'in', 'into', 'of', 'on',
+                'or', 'the', 'to', 'vs', 'with'}
+
+TEXT = 'text'
+TABLE = 'table'
+SPELL = 'spell'
+STAT_BLOCK = 'stat_block'
+
+
+class Block(NamedTuple):
+    kind: str
+    text: str
+    page_start: int
+    page_end: int
+    heading_path: Tuple[str, ...]
+
+
+def heading_level(line: str) -> Optional[int]:
+    """1 for an ALL CAPS heading, 2 for a Title Case one, None for body text."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60 or stripped[-1] in '.,;:' or _PAGE_NUMBER.match(line):
+        return None
+    words = stripped.split()
+    if len(words) > 8 or not any(c.isalpha() for c in stripped):
+        return None
+    if stripped.isupper() and len(stripped) > 3:
+        return 1
+    # "Duration: Instantaneous" is a spell field, not a heading
+    if any(w.endswith(':') for w in words[:-1]):
+        return None
+    if all(_HEADING_WORD.match(w) or w.lower() in _MINOR_WORDS for w in words):
+        return 2
+    return None
+
+
+def is_table_row(line: str) -> bool:
+    cells = line.split()
+    if len(cells) < 2:
+        return False
+    numeric = sum(1 for cell in cells if _NUMERIC_CELL.match(cell))
+    return numeric >= 2 or (numeric >= 1 and _NUMERIC_CELL.match(cells[0]) is not None)
+
+
+def chunk_id_for(source_path: str, heading_path: str, chunk_text: str, occurrence: int) -> str:
+    """Content hash: unchanged text under an unchanged heading keeps its id across re-ingests,
+    even if it moved to another page. ``occurrence`` separates verbatim repeats in one book."""
+    material = '\0'.join([source_path, heading_path, chunk_text, str(occurrence)])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class RulebookChunker:
+    def __init__(self, max_tokens: int = 400, max_heading_depth: int = 3):
+        self._max_tokens = max_tokens
+        self._max_heading_depth = max_heading_depth
+
+    def chunk(self, source_path: str, pages: Iterable[ExtractedPage]) -> Iterator[DocumentChunk]:
+        return self.chunk_blocks(source_path, self.blocks(pages))
+
+    def chunk_blocks(self, source_path: str, blocks: Iterable[Block]) -> Iterator[DocumentChunk]:
+        """Pack the output of :meth:`blocks`, for callers that also look at the blocks."""
+        occurrences: Counter = Counter()
+        for heading_path, text, page_start, page_end in self._pack(blocks):
+            key = (heading_path, text)
+            occurrences[key] += 1
+            yield DocumentChunk(
+                chunk_id=chunk_id_for(source_path, heading_path, text, occurrences[key] - 1),
+                source_path=source_path,
+                page_start=page_start,
+                page_end=page_end,
+                heading_path=heading_path,
+                chunk_text=text,
+            )
+
+    def blocks(self, pages: Iterable[ExtractedPage]) -> Iterator[Block]:
+        headings: List[Tuple[int, str]] = []
+        lines: List[str] = []
+        kind = TEXT
+        page_start = page_end = 0
+        # a heading whose role (section, spell, monster) depends on the line after it
+        pending: Optional[Tuple[int, str, int]] = None
+
+        def flush() -> Iterator[Block]:
+            nonlocal lines, kind
+            text = '\n'.join(lines).strip()
+            if text:
+                yield Block(kind, text, page_start, page_end, tuple(t for _, t in headings))
+            lines = []
+            kind = TEXT
+
+        def append(line: str, page_number: int):
+            nonlocal page_start, page_end
+            if not lines:
+                page_start = page_number
+            lines.append(line)
+            page_end = page_number
+
+        for page in pages:
+            for line in (raw.strip() for raw in page.text.splitlines()):
+                if _PAGE_NUMBER.match(line):
+                    continue
+                if pending is not None:
+                    level, title, title_page = pending
+                    pending = None
+                    yield from flush()
+                    if _SPELL_META.match(line) or _STAT_BLOCK_META.match(line):
+                        # an entry keeps its name in its text and nests under the section
+                        kind = SPELL if _SPELL_META.match(line) else STAT_BLOCK
+                        append(title, title_page)
+                    else:
+                        while headings and headings[-1][0] >= level:
+                            headings.pop()
+                        if len(headings) < self._max_heading_depth:
+                            headings.append((level, title))
+                if not line:
+                    if kind in (TEXT, TABLE):
+                        yield from flush()
+                    elif lines and lines[-1]:
+                        lines.append('')
+                    continue
+                if kind == STAT_BLOCK and (line.lower() in STAT_BLOCK_SECTIONS
+                                           or _ABILITY_HEADER.match(line)
+                                           or _STAT_BLOCK_FIELD.match(line)):
+                    append(line, page.page_number)
+                    continue
+                level = heading_level(line)
+                if level is not None and not (kind == TABLE and is_table_row(line)):
+                    pending = (level, line, page.page_number)
+                    continue
+                if kind == TEXT and is_table_row(line):
+                    # a table starts here; the text before it is its own paragraph
+                    yield from flush()
+                    kind = TABLE
+                elif kind == TABLE and not is_table_row(line) and len(line) > 60:
+                    yield from flush()
+                append(line, page.page_number)
+        if pending is not None:
+            append(pending[1], pending[2])
+        yield from flush()
+
+    def _pack(self, blocks: Iterable[Block]) -> Iterator[Tuple[str, str, int, int]]:
+        parts: List[str] = []
+        tokens = 0
+        heading_path: Optional[Tuple[str, ...]] = None
+        page_start = page_end = 0
+
+        def emit() -> Iterator[Tuple[str, str, int, int]]:
+            nonlocal parts, tokens
+            if parts:
+                yield HEADING_SEPARATOR.join(heading_path), '\n\n'.join(parts), page_start, page_end
+            parts = []
+            tokens = 0
+
+        for block in blocks:
+            block_tokens = count_tokens(block.text)
+            # entries, tables and new sections start a fresh chunk
+            if (block.heading_path != heading_path or block.kind != TEXT
+                    or tokens + block_tokens > self._max_tokens):
+                yield from emit()
+            heading_path = block.heading_path
+            if block_tokens > self._max_tokens:
+                breadcrumb = HEADING_SEPARATOR.join(heading_path)
+                for piece in self._split(block.text):
+                    yield breadcrumb, piece, block.page_start, block.page_end
+                continue
+            if not parts:
+                page_start = block.page_start
+            parts.append(block.text)
+            tokens += block_tokens
+            page_end = block.page_end
+            if block.kind != TEXT:
+                yield from emit()
+        yield from emit()
+
+    def _split(self, text: str) -> Iterator[str]:
+        """Break an oversized block on paragraph, then line, then word boundaries."""
+        for separator in ('\n\n', '\n', ' '):
+            units = text.split(separator)
+            if len(units) > 1:
+                break
+        else:
+            units = [text]
+        current: List[str] = []
+        tokens = 0
+        for unit in units:
+            unit_tokens = count_tokens(unit)
+            if current and tokens + unit_tokens > self._max_tokens:
+                yield separator.join(current)
+                current = []
+                tokens = 0
+            if unit_tokens > self._max_tokens and separator != ' ':
+                yield from self._split(unit)
+                continue
+            current.append(unit)
+            tokens += unit_tokens
+        if current:
+            yield separator.join(current)
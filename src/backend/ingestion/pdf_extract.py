@@ -0,0 +1,106 @@
+"""Page-level PDF text extraction.
+
+Everything here is safe to run inside worker processes: nothing touches the app database, and the
+OCR engine is only constructed the first time a worker meets an image-only page.
+"""
+import hashlib
+from collections import deque
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Deque, Dict, Iterator, NamedTuple, Optional, Union
+
+import fitz
+
+OCR_RENDER_DPI = 200
+
+_open_document: Optional[fitz.Document] = None
+_ocr_engine = None
+
+
+class ExtractedPage(NamedTuple):
+    page_number: int
+    # None when the page's source hash matched the one it was extracted from last time
+    text: Optional[str]
+    ocr_used: bool
+    source_sha256: Optional[str] = None
+
+
+def get_page_count(path: Union[str, Path]) -> int:
+    with fitz.open(str(path)) as doc:
+        return doc.page_count
+
+
+def _get_document(path: str) -> fitz.Document:
+    # keep the last opened document per process; page tasks for one book arrive back to back
+    global _open_document
+    if _open_document is None or _open_document.name != path:
+        if _open_document is not None:
+            _open_document.close()
+        _open_document = fitz.open(path)
+    return _open_document
+
+
+def _ocr_page(page: fitz.Page) -> str:
+    global _ocr_engine
+    if _ocr_engine is None:
+        from rapidocr_onnxruntime import RapidOCR
+        _ocr_engine = RapidOCR()
+    pixmap = page.get_pixmap(dpi=OCR_RENDER_DPI)
+    result, _ = _ocr_engine(pixmap.tobytes('png'))
+    if not result:
+        return ''
+    return '\n'.join(line[1] for line in result)
+
+
+def page_source_sha256(page: fitz.Page) -> str:
+    """Hash of the page's decoded content streams, the raw streams of the images it draws and
+    the definitions of its fonts: much cheaper than extracting, let alone OCRing, its text."""
+    doc = page.parent
+    digest = hashlib.sha256(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b'')
+    for font in page.get_fonts(full=True):
+        digest.update(doc.xref_object(font[0], compressed=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def extract_page(path: str, page_number: int, ocr: bool = True,
+        known_source_sha256: Optional[str] = None) -> ExtractedPage:
+    """Extract the page's text, unless its source hash equals ``known_source_sha256``."""
+    page = _get_document(path).load_page(page_number)
+    source_sha256 = page_source_sha256(page)
+    if source_sha256 == known_source_sha256:
+        return ExtractedPage(page_number, None, False, source_sha256)
+    text = page.get_text('text')
+    if text.strip() or not ocr or not page.get_images(full=False):
+        return ExtractedPage(page_number, text, False, source_sha256)
+    return ExtractedPage(page_number, _ocr_page(page), True, source_sha256)
+
+
+def iter_pdf_pages(path: Union[str, Path], ocr: bool = True) -> Iterator[ExtractedPage]:
+    path = str(path)
+    for page_number in range(get_page_count(path)):
+        yield extract_page(path, page_number, ocr)
+
+
+def iter_pdf_pages_parallel(
+    path: Union[str, Path],
+    executor: Executor,
+    window: int,
+    ocr: bool = True,
+    known_source_hashes: Optional[Dict[int, str]] = None,
+) -> Iterator[ExtractedPage]:
+    """Yield pages in order while extracting up to ``window`` of them concurrently on
+    ``executor``. Only the in-flight window is ever held in memory. Pages whose source hash is
+    the one in ``known_source_hashes`` come back without text."""
+    path = str(path)
+    page_count = get_page_count(path)
+    known_source_hashes = known_source_hashes or {}
+    pending: Deque[Future] = deque()
+    next_page = 0
+    while next_page < page_count or pending:
+        while next_page < page_count and len(pending) < window:
+            pending.append(executor.submit(extract_page, path, next_page, ocr,
+                    known_source_hashes.get(next_page)))
+            next_page += 1
+        yield pending.popleft().result()
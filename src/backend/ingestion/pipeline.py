@@ -0,0 +1,220 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from app_db.app_data_db import AppDataDB
+from app_db.compendium_entries import Monster, Spell
+from app_db.documents import DocumentChunk, DocumentPage, SourceDocument
+from backend.compendium.extract import parse_spell, parse_stat_block
+from backend.ingestion.chunker import SPELL, STAT_BLOCK, Block, RulebookChunker
+from backend.ingestion.pdf_extract import (
+    ExtractedPage,
+    extract_page,
+    get_page_count,
+    iter_pdf_pages_parallel,
+)
+from log.logger import logger
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def iter_pdf_paths(paths: Iterable[Path]) -> Iterator[Path]:
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob('*') if p.suffix.lower() == '.pdf')
+        else:
+            yield path
+
+
+class IngestionResult(NamedTuple):
+    document: SourceDocument
+    chunk_count: int
+    # chunks that did not exist before this ingest; only these need embedding
+    added_chunk_ids: List[str]
+    # chunks of the previous ingest that are gone; their rows and vectors were dropped
+    removed_chunk_ids: List[str]
+    monster_count: int = 0
+    spell_count: int = 0
+    # False when the file's hash matched its last ingest and nothing was read
+    changed: bool = True
+    # pages whose text was taken from the app DB instead of extracted again
+    reused_pages: int = 0
+
+
+class PdfIngestionPipeline:
+    """Extracts PDF pages on a process pool and writes them to the app DB in batches as they
+    come off the pool, so neither a whole book nor all of its pages' text is held at once.
+
+    The same page stream feeds the chunker; chunks are written in batches too. Chunk ids are
+    content hashes, so re-ingesting a book only adds chunks whose text or heading changed.
+    Spell entries and stat blocks the chunker finds also go into the spell and monster tables.
+
+    A file whose SHA-256 matches its last ingest is skipped. In a changed file, a page whose
+    source hash (content streams, images, fonts) matches is not extracted again: its stored
+    text is fed to the chunker instead, so an edit costs only the edited pages' extraction and
+    OCR, and the embedding of the chunks whose text changed. ``force`` re-extracts everything.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        workers: Optional[int] = None,
+        batch_size: int = 32,
+        ocr: bool = True,
+        chunker: Optional[RulebookChunker] = None,
+        force: bool = False,
+    ):
+        self._db = db
+        self._workers = workers or os.cpu_count() or 1
+        self._batch_size = batch_size
+        self._ocr = ocr
+        self._chunker = chunker or RulebookChunker()
+        self._force = force
+
+    def ingest_all(self, paths: Iterable[Path], skip_errors: bool = False
+            ) -> List[IngestionResult]:
+        """Ingest every PDF under ``paths``; with ``skip_errors`` a file that fails is logged
+        and left out of the results instead of stopping the rest."""
+        documents = []
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            for path in iter_pdf_paths(paths):
+                try:
+                    documents.append(self.ingest(path, executor))
+                except Exception as e:
+                    if not skip_errors:
+                        raise
+                    logger.error(f"Failed to ingest '{path}': {e}")
+        return documents
+
+    def remove_missing(self, paths: Iterable[Path]) -> Dict[str, List[str]]:
+        """Delete the documents under the directories (or at the files) in ``paths`` whose
+        file is gone; returns the removed chunk ids by source path."""
+        roots = [path.resolve() for path in paths]
+        removed = {}
+        for source_path in self._db.get_source_paths():
+            path = Path(source_path)
+            if path.is_file() or not any(path == root or path.is_relative_to(root)
+                                         for root in roots):
+                continue
+            logger.info(f"'{source_path}' is gone; deleting it from the app DB")
+            removed[source_path] = self._db.delete_source_document(source_path)
+        return removed
+
+    def ingest(self, path: Path, executor: ProcessPoolExecutor) -> IngestionResult:
+        path = path.resolve()
+        document = SourceDocument(
+            source_path=str(path),
+            title=path.stem,
+            file_sha256=file_sha256(path),
+            page_count=get_page_count(path),
+            ingested_at=datetime.now(),
+        )
+        previous = self._db.get_source_document(document.source_path)
+        if (not self._force and previous is not None
+                and previous.file_sha256 == document.file_sha256):
+            logger.info(f"'{document.title}' is unchanged since {previous.ingested_at}")
+            return IngestionResult(previous,
+                    len(self._db.get_document_chunk_ids(document.source_path)), [], [],
+                    changed=False)
+        logger.info(f"Ingesting '{document.title}' ({document.page_count} pages)")
+        known_source_hashes = ({} if self._force
+                               else self._db.get_page_source_hashes(document.source_path))
+        # no file hash until the ingest completes, so an interrupted one isn't taken as done
+        self._db.upsert_source_document(document.model_copy(update={'file_sha256': ''}))
+        previous_chunk_ids = set(self._db.get_document_chunk_ids(document.source_path))
+
+        reused_pages = []
+        pages = self._stored_pages(document, iter_pdf_pages_parallel(
+            path,
+            executor,
+            window=self._workers * 2,
+            ocr=self._ocr,
+            known_source_hashes=known_source_hashes,
+        ), reused_pages)
+        monsters: List[Monster] = []
+        spells: List[Spell] = []
+        blocks = self._entries(document, self._chunker.blocks(pages), monsters, spells)
+        chunk_ids = set()
+        added_chunk_ids = []
+        batch: List[DocumentChunk] = []
+        for chunk in self._chunker.chunk_blocks(document.source_path, blocks):
+            chunk_ids.add(chunk.chunk_id)
+            if chunk.chunk_id not in previous_chunk_ids:
+                added_chunk_ids.append(chunk.chunk_id)
+            # written either way: an unchanged chunk may have moved to another page
+            batch.append(chunk)
+            if len(batch) >= self._batch_size:
+                self._db.upsert_document_chunks(batch)
+                batch = []
+        if batch:
+            self._db.upsert_document_chunks(batch)
+        removed_chunk_ids = sorted(previous_chunk_ids - chunk_ids)
+        if removed_chunk_ids:
+            self._db.delete_document_chunks(removed_chunk_ids)
+        self._db.replace_compendium_entries(document.source_path, monsters, spells)
+        self._db.upsert_source_document(document)
+        logger.info(f"Chunked '{document.title}': {len(chunk_ids)} chunks, "
+                    f"{len(added_chunk_ids)} new, {len(removed_chunk_ids)} removed; "
+                    f"{len(monsters)} monsters, {len(spells)} spells")
+        return IngestionResult(document, len(chunk_ids), added_chunk_ids, removed_chunk_ids,
+                len(monsters), len(spells), reused_pages=len(reused_pages))
+
+    @staticmethod
+    def _entries(document: SourceDocument, blocks: Iterator[Block], monsters: List[Monster],
+            spells: List[Spell]) -> Iterator[Block]:
+        """Pass blocks through to the chunker, parsing spell entries and stat blocks on the way."""
+        for block in blocks:
+            if block.kind == SPELL:
+                spell = parse_spell(document.source_path, block.page_start, block.text)
+                if spell is not None:
+                    spells.append(spell)
+            elif block.kind == STAT_BLOCK:
+                monster = parse_stat_block(document.source_path, block.page_start, block.text)
+                if monster is not None:
+                    monsters.append(monster)
+            yield block
+
+    def _stored_pages(self, document: SourceDocument, pages: Iterator[ExtractedPage],
+            reused_pages: List[int]) -> Iterator[ExtractedPage]:
+        """Pass pages through to the chunker, writing them to the app DB on the way; pages that
+        came back unextracted get their stored text and are appended to ``reused_pages``."""
+        batch: List[DocumentPage] = []
+        ocr_pages = 0
+        for page in pages:
+            if page.text is None:
+                stored = self._db.get_document_page(document.source_path, page.page_number)
+                if stored is not None:
+                    reused_pages.append(page.page_number)
+                    yield page._replace(text=stored.page_text, ocr_used=stored.ocr_used)
+                    continue
+                page = extract_page(document.source_path, page.page_number, self._ocr)
+            ocr_pages += page.ocr_used
+            batch.append(DocumentPage(
+                source_path=document.source_path,
+                page_number=page.page_number,
+                page_text=page.text,
+                text_sha256=text_sha256(page.text),
+                ocr_used=page.ocr_used,
+                source_sha256=page.source_sha256,
+            ))
+            if len(batch) >= self._batch_size:
+                self._db.upsert_document_pages(batch)
+                batch = []
+            yield page
+        if batch:
+            self._db.upsert_document_pages(batch)
+        logger.info(f"Ingested '{document.title}': {document.page_count} pages, "
+                    f"{len(reused_pages)} unchanged, {ocr_pages} via OCR")
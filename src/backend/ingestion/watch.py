@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from backend.ingestion.pipeline import iter_pdf_paths
+
+FileSignature = Tuple[int, int]
+
+
+def scan_pdf_files(paths: Iterable[Path]) -> Dict[Path, FileSignature]:
+    """(modification time, size) of every PDF under ``paths``."""
+    signatures = {}
+    for path in iter_pdf_paths(paths):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        signatures[path.resolve()] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class PdfChangePoller:
+    """Reports the PDFs under ``paths`` that changed or disappeared between polls.
+
+    A file counts as changed once its size and modification time differ from when it was last
+    reported and have stayed the same for a whole poll interval, so a book still being saved
+    isn't picked up half written. Files present when the poller is created count as reported.
+    """
+
+    def __init__(self, paths: Iterable[Path]):
+        self._paths = list(paths)
+        self._last_scan = scan_pdf_files(self._paths)
+        self._reported = dict(self._last_scan)
+
+    def poll(self) -> Tuple[List[Path], List[Path]]:
+        """(changed, removed) since the previous poll."""
+        scan = scan_pdf_files(self._paths)
+        changed = sorted(path for path, signature in scan.items()
+                         if self._last_scan.get(path) == signature
+                         and self._reported.get(path) != signature)
+        removed = sorted(path for path in self._reported if path not in scan)
+        for path in changed:
+            self._reported[path] = scan[path]
+        for path in removed:
+            del self._reported[path]
+        self._last_scan = scan
+        return changed, removed
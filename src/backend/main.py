@@ -0,0 +1,94 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import click
+
+
+@click.command()
+@click.argument('pdf_paths', nargs=-1, required=True,
+        type=click.Path(exists=True, file_okay=True, dir_okay=True, path_type=Path))
+@click.option('--workers', default=os.cpu_count() or 1, help='Page extraction processes')
+@click.option('--batch_size', default=32, help='Pages written to the app DB per transaction')
+@click.option('--ocr/--no-ocr', default=True, help='OCR pages that have images but no text layer')
+@click.option('--max_chunk_tokens', default=400, help='Upper bound on the size of a chunk')
+@click.option('--force', is_flag=True,
+        help='Re-extract every page, even of files and pages whose hashes are unchanged')
+@click.option('--prune/--no-prune', default=True,
+        help='Delete documents under the given directories whose files are gone')
+@click.option('--index_dir', default=None, type=click.Path(file_okay=False, path_type=Path),
+        help='Then bring the retrieval indexes here up to date and publish them as a new '
+             'generation, which a running web app with the same --index_dir switches to')
+@click.option('--embedding_model', default=None,
+        help='With --index_dir: embed new chunks into the vector store with this model')
+@click.option('--llm_backend', 'llm_backends', multiple=True,
+        help='Base URL of an LLM server for the embeddings; repeat for a pool. '
+             'Default: http://localhost:1234')
+@click.option('--version_str', default='v1', help='LLM endpoint version str')
+@click.option('--keep_generations', default=3, help='Index generations kept on disk')
+@click.option('--watch', is_flag=True,
+        help='Keep running: re-ingest changed files and publish new index generations')
+@click.option('--poll_interval', default=5.0,
+        help='With --watch: seconds between scans; a file must be unchanged for one to count')
+def ingest_cli(pdf_paths: Tuple[Path, ...], workers: int, batch_size: int, ocr: bool,
+        max_chunk_tokens: int, force: bool, prune: bool, index_dir: Optional[Path],
+        embedding_model: Optional[str], llm_backends: Tuple[str, ...], version_str: str,
+        keep_generations: int, watch: bool, poll_interval: float):
+    # imported here so spawned extraction workers re-importing this module don't open the DB
+    from app_db.app_data_db import app_db
+    from backend.ingestion.chunker import RulebookChunker
+    from backend.ingestion.pipeline import PdfIngestionPipeline
+    from backend.ingestion.watch import PdfChangePoller
+    pipeline = PdfIngestionPipeline(app_db, workers=workers, batch_size=batch_size, ocr=ocr,
+            chunker=RulebookChunker(max_tokens=max_chunk_tokens), force=force)
+    index_sync = None
+    if index_dir is not None:
+        from backend.retrieval.index_sync import RetrievalIndexSync
+        embedder = None
+        if embedding_model is not None:
+            from llm_common.backend_pool import LLMBackendPool
+            from llm_common.embeddings import EmbeddingService
+            from llm_common.endpoints import LargeLanguageModelEndpoints
+            backends = LLMBackendPool([
+                LargeLanguageModelEndpoints(base_url=base_url.rstrip('/'), version_str=version_str)
+                for base_url in llm_backends or ['http://localhost:1234']
+            ])
+            embedder = EmbeddingService(backends, app_db, embedding_model)
+        index_sync = RetrievalIndexSync(app_db, index_dir, embedder,
+                keep_generations=keep_generations)
+
+    poller = PdfChangePoller(pdf_paths) if watch else None
+    changed_paths = list(pdf_paths)
+    removed = pipeline.remove_missing(pdf_paths) if prune else {}
+    while True:
+        # in watch mode a file that fails, e.g. half copied, is retried when it next changes
+        results = pipeline.ingest_all(changed_paths, skip_errors=watch)
+        changed = [r for r in results if r.changed]
+        click.echo(f"Ingested {len(changed)} changed document(s) of {len(results)}, "
+                   f"{sum(r.document.page_count for r in changed)} pages "
+                   f"({sum(r.reused_pages for r in changed)} unchanged), "
+                   f"{sum(r.chunk_count for r in changed)} chunks "
+                   f"({sum(len(r.added_chunk_ids) for r in changed)} new, "
+                   f"{sum(len(r.removed_chunk_ids) for r in changed)} removed); "
+                   f"{len(removed)} document(s) deleted")
+        if index_sync is not None:
+            chunks_changed = bool(removed) or any(r.added_chunk_ids or r.removed_chunk_ids
+                                                  for r in changed)
+            synced = index_sync.sync(chunks_changed)
+            if synced.generation is not None:
+                click.echo(f"Published index generation {synced.generation}: "
+                           f"{synced.indexed_chunks} chunks, {synced.embedded_chunks} embedded"
+                           f"{', IVF-PQ rebuilt' if synced.ann_rebuilt else ''}")
+        if poller is None:
+            return
+        app_db.remove_session()
+        changed_paths, removed_paths = poller.poll()
+        while not changed_paths and not removed_paths:
+            time.sleep(poll_interval)
+            changed_paths, removed_paths = poller.poll()
+        removed = pipeline.remove_missing(removed_paths) if prune and removed_paths else {}
+
+
+if __name__ == "__main__":
+    ingest_cli()
@@ -0,0 +1,40 @@
+from pathlib import Path
+from typing import Optional
+
+import click
+
+
+@click.command()
+@click.argument('index_dir', type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option('--nlist', default=None, type=int,
+        help='k-means partitions; default about 4 * sqrt(vectors)')
+@click.option('--m', default=48, help='PQ subspaces, i.e. bytes per vector; must divide the dim')
+@click.option('--nprobe', default=8, help='Partitions probed per query unless overridden')
+@click.option('--refine', default=4,
+        help='Re-rank the best k * refine candidates with the exact vectors; 0: off')
+@click.option('--train_rows', default=65536, help='Vectors sampled to train the index')
+def main_cli(index_dir: Path, nlist: Optional[int], m: int, nprobe: int, refine: int,
+        train_rows: int):
+    """(Re)build the IVF-PQ index of the vector store under INDEX_DIR from its embeddings."""
+    from app_db.app_data_db import app_db
+    from backend.retrieval.generations import IndexGenerations
+    from backend.retrieval.ivfpq_index import IVFPQ_INDEX_DIR, IvfPqIndex
+    from backend.retrieval.retriever import LEXICAL_INDEX_DIR, VECTOR_STORE_DIR
+    from backend.retrieval.vector_store import MemmapVectorStore
+    store = MemmapVectorStore(app_db, index_dir / VECTOR_STORE_DIR)
+    generations = IndexGenerations(index_dir)
+    if generations.current() is None:
+        index = IvfPqIndex.build(store, index_dir / VECTOR_STORE_DIR / IVFPQ_INDEX_DIR,
+                nlist=nlist, m=m, nprobe=nprobe, refine=refine, train_rows=train_rows)
+    else:
+        # published as a new generation, so running web apps switch to it without a restart
+        staging = generations.stage()
+        generations.carry_over(staging, LEXICAL_INDEX_DIR)
+        index = IvfPqIndex.build(store, staging / IVFPQ_INDEX_DIR, nlist=nlist, m=m,
+                nprobe=nprobe, refine=refine, train_rows=train_rows)
+        generations.publish(staging)
+        generations.prune()
+    click.echo(f"Indexed {index.indexed_rows} vectors: nlist={index.nlist}, m={index.m}")
+
+if __name__ == "__main__":
+    main_cli()
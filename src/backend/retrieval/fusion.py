@@ -0,0 +1,20 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(
+    *rankings: Sequence[str],
+    k: int = 60,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, float]]:
+    """Fuse ranked lists of chunk ids (best first) with RRF: ``sum(1 / (k + rank))``.
+
+    Scores from different retrievers are not comparable, ranks are; so e.g. BM25 hits and
+    vector hits can be merged without any score calibration.
+    """
+    fused: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] += 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:limit] if limit is not None else ordered
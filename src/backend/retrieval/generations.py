@@ -0,0 +1,104 @@
+"""Immutable generations of the retrieval indexes under one index directory.
+
+Each generation is a directory ``generations/gen-NNNNNN`` holding the lexical index and, once
+one has been built, the IVF-PQ index. ``CURRENT`` names the generation readers should use. A
+new generation is written in full under a staging name, renamed into place and only then made
+current by atomically replacing ``CURRENT``, so a reader sees either the old generation or the
+new one, never a mix. The vector store itself stays outside the generations: it is append-only
+with tombstones, which readers already follow without reloading.
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import List, Optional, Union
+
+from log.logger import logger
+
+GENERATIONS_DIR = 'generations'
+CURRENT_POINTER = 'CURRENT'
+GENERATION_PATTERN = re.compile(r'^gen-(\d{6})$')
+
+
+def generation_name(number: int) -> str:
+    return f'gen-{number:06d}'
+
+
+def _fsync_directory(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class IndexGenerations:
+    """Stages, publishes and prunes the index generations of ``index_dir``."""
+
+    def __init__(self, index_dir: Union[str, Path]):
+        self._index_dir = Path(index_dir)
+        self._root = self._index_dir / GENERATIONS_DIR
+
+    @property
+    def index_dir(self) -> Path:
+        return self._index_dir
+
+    def current_name(self) -> Optional[str]:
+        try:
+            name = (self._index_dir / CURRENT_POINTER).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return name or None
+
+    def current(self) -> Optional[Path]:
+        """Directory of the current generation; None before the first is published."""
+        name = self.current_name()
+        return self._root / name if name is not None else None
+
+    def names(self) -> List[str]:
+        if not self._root.exists():
+            return []
+        return sorted(p.name for p in self._root.iterdir() if GENERATION_PATTERN.match(p.name))
+
+    def stage(self) -> Path:
+        """An empty directory to write the next generation into; one left behind by an
+        interrupted writer is cleared. Only one process should stage at a time."""
+        numbers = [int(GENERATION_PATTERN.match(name)[1]) for name in self.names()]
+        staging = self._root / f'{generation_name(max(numbers, default=0) + 1)}.staging'
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        return staging
+
+    def carry_over(self, staging: Path, component: str) -> bool:
+        """Hard-link ``component`` (e.g. ``'ivfpq'``) of the current generation into
+        ``staging``; generations are immutable, so they can share its files. False if the
+        current generation has none."""
+        current = self.current()
+        if current is None or not (current / component).exists():
+            return False
+        shutil.copytree(current / component, staging / component, copy_function=os.link)
+        return True
+
+    def publish(self, staging: Path) -> Path:
+        """Move a staged generation into place and make it current."""
+        generation = staging.with_suffix('')
+        os.replace(staging, generation)
+        _fsync_directory(self._root)
+        pointer = self._index_dir / CURRENT_POINTER
+        temporary = pointer.with_name(CURRENT_POINTER + '.tmp')
+        with open(temporary, 'w') as f:
+            f.write(generation.name + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, pointer)
+        _fsync_directory(self._index_dir)
+        logger.info(f"Published index generation {generation.name}")
+        return generation
+
+    def prune(self, keep: int = 3):
+        """Delete all but the ``keep`` newest generations, never the current one. Readers that
+        still have an older one open keep their mapped files until they reload."""
+        current = self.current_name()
+        for name in self.names()[:-keep] if keep > 0 else self.names():
+            if name != current:
+                shutil.rmtree(self._root / name, ignore_errors=True)
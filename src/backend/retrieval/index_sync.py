@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+from app_db.app_data_db import AppDataDB
+from backend.retrieval.generations import IndexGenerations
+from backend.retrieval.ivfpq_index import IVFPQ_INDEX_DIR, IvfPqIndex
+from backend.retrieval.lexical_index import LexicalIndexBuilder
+from backend.retrieval.retriever import LEXICAL_INDEX_DIR, VECTOR_STORE_DIR
+from backend.retrieval.vector_store import MemmapVectorStore
+from llm_common.embeddings import EmbeddingService
+from log.logger import logger
+
+
+class IndexSyncResult(NamedTuple):
+    # None when the indexes were already up to date
+    generation: Optional[str]
+    embedded_chunks: int
+    indexed_chunks: int
+    ann_rebuilt: bool = False
+
+
+class RetrievalIndexSync:
+    """Brings the retrieval indexes under ``index_dir`` up to date with the chunk table.
+
+    Vectors are incremental: only chunks without a live row in the vector store are embedded
+    and appended, and rows of deleted chunks were already tombstoned when the chunks were. The
+    lexical index is rewritten from the stored chunk texts into a new generation, since BM25's
+    document frequencies and lengths are corpus-wide; that costs a tokenising pass over the
+    chunk table, no extraction or embedding. An existing IVF-PQ index is hard-linked into the
+    new generation, and rebuilt in it once rows appended or deleted since it was built exceed
+    ``ann_rebuild_ratio`` of the rows it covers.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        index_dir: Union[str, Path],
+        embedder: Optional[EmbeddingService] = None,
+        embed_batch_size: int = 256,
+        keep_generations: int = 3,
+        ann_rebuild_ratio: float = 0.2,
+    ):
+        self._db = db
+        self._index_dir = Path(index_dir)
+        self._embedder = embedder
+        self._embed_batch_size = embed_batch_size
+        self._keep_generations = keep_generations
+        self._ann_rebuild_ratio = ann_rebuild_ratio
+        self._generations = IndexGenerations(index_dir)
+
+    @property
+    def generations(self) -> IndexGenerations:
+        return self._generations
+
+    def sync(self, chunks_changed: bool = True) -> IndexSyncResult:
+        """Embed new chunks and publish a generation if anything changed, or if none has been
+        published yet."""
+        embedded = self.embed_new_chunks()
+        if not chunks_changed and not embedded and self._generations.current() is not None:
+            return IndexSyncResult(None, 0, 0)
+        return self.publish(embedded)
+
+    def embed_new_chunks(self) -> int:
+        if self._embedder is None:
+            return 0
+        store_dir = self._index_dir / VECTOR_STORE_DIR
+        store = None
+        if (store_dir / 'chunks.json').exists():
+            store = MemmapVectorStore(self._db, store_dir)
+        chunk_ids = self._db.get_unembedded_chunk_ids(store.name if store else 'chunks')
+        embedded = 0
+        for start in range(0, len(chunk_ids), self._embed_batch_size):
+            chunks = self._db.get_document_chunks(chunk_ids[start:start + self._embed_batch_size])
+            batch = sorted(chunks)
+            vectors = self._embedder.embed([chunks[chunk_id].chunk_text for chunk_id in batch])
+            if store is None:
+                store = MemmapVectorStore(self._db, store_dir, dim=vectors.shape[1])
+            store.append(batch, vectors)
+            embedded += len(batch)
+        if embedded:
+            logger.info(f"Embedded {embedded} new chunks into {store_dir}")
+        return embedded
+
+    def publish(self, embedded: int = 0) -> IndexSyncResult:
+        started = time.perf_counter()
+        staging = self._generations.stage()
+        builder = LexicalIndexBuilder().add_all(self._db.iter_chunk_texts())
+        indexed = builder.write(staging / LEXICAL_INDEX_DIR)
+        indexed_chunks = json.loads((indexed / 'meta.json').read_text())['doc_count']
+        ann_rebuilt = self._stage_ann_index(staging)
+        generation = self._generations.publish(staging)
+        self._generations.prune(self._keep_generations)
+        logger.info(f"Index generation {generation.name}: {indexed_chunks} chunks, "
+                    f"{embedded} newly embedded, in {time.perf_counter() - started:.2f} s")
+        return IndexSyncResult(generation.name, embedded, indexed_chunks, ann_rebuilt)
+
+    def _stage_ann_index(self, staging: Path) -> bool:
+        """Carry the IVF-PQ index into ``staging``, rebuilding it if it has fallen too far
+        behind the store; True if rebuilt."""
+        current = self._generations.current()
+        source = (current / IVFPQ_INDEX_DIR if current is not None
+                  else self._index_dir / VECTOR_STORE_DIR / IVFPQ_INDEX_DIR)
+        if not (source / 'ivfpq.json').exists():
+            return False
+        meta = json.loads((source / 'ivfpq.json').read_text())
+        store = MemmapVectorStore(self._db, self._index_dir / VECTOR_STORE_DIR)
+        dead_rows = store.dead_rows()
+        members = np.load(source / 'rows.npy', mmap_mode='r').shape[0]
+        # members deleted since the build; rows dead before it were left out of the index
+        deleted = members - (meta['indexed_rows'] - int((dead_rows < meta['indexed_rows']).sum()))
+        stale_rows = store.row_count - meta['indexed_rows'] + deleted
+        if stale_rows <= self._ann_rebuild_ratio * meta['indexed_rows']:
+            shutil.copytree(source, staging / IVFPQ_INDEX_DIR, copy_function=os.link)
+            return False
+        logger.info(f"Rebuilding the IVF-PQ index: {stale_rows} rows appended or deleted "
+                    f"since it covered {meta['indexed_rows']}")
+        IvfPqIndex.build(store, staging / IVFPQ_INDEX_DIR, m=meta['m'], nprobe=meta['nprobe'],
+                refine=meta['refine'])
+        return True
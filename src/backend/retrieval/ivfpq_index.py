@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from backend.retrieval.vector_store import MemmapVectorStore, VectorSearchHit, normalize_rows
+from log.logger import logger
+
+IVFPQ_INDEX_DIR = 'ivfpq'
+PQ_CENTROIDS = 256
+# rows per code the subspace codebooks are trained on; more adds build time, not accuracy
+PQ_TRAIN_ROWS_PER_CODE = 64
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 20, seed: int = 0,
+        block_rows: int = 16384) -> np.ndarray:
+    """Lloyd's k-means with centroids seeded from a random sample; empty clusters are reseeded
+    from the points currently furthest from their centroid."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment, distances = assign(vectors, centroids, block_rows)
+        counts = np.bincount(assignment, minlength=k)
+        nonempty = counts > 0
+        # per-cluster sums as contiguous runs of the rows sorted by cluster
+        order = np.argsort(assignment, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            furthest = np.argpartition(-distances, empty.size - 1)[:empty.size]
+            centroids[empty] = vectors[furthest]
+    return centroids
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray,
+        block_rows: int = 16384) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest centroid (L2) of every row, and the squared distance to it."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(vectors.shape[0], dtype=np.int64)
+    distances = np.empty(vectors.shape[0], dtype=np.float32)
+    for start in range(0, vectors.shape[0], block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        # ||x - c||^2 without the ||x||^2 term, which doesn't change the argmin
+        partial = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+        nearest = np.argmin(partial, axis=1)
+        assignment[start:start + block.shape[0]] = nearest
+        distances[start:start + block.shape[0]] = (
+            partial[np.arange(block.shape[0]), nearest] + (block ** 2).sum(axis=1))
+    return assignment, distances
+
+
+class IvfPqIndex:
+    """Approximate cosine search over a :class:`MemmapVectorStore`: an inverted file of
+    ``nlist`` k-means partitions whose members are stored as product-quantised residuals.
+
+    Each row costs ``m`` bytes (one uint8 code per subspace) instead of ``dim`` floats. A query
+    scores only the members of its ``nprobe`` nearest partitions, from one ``m x 256`` table of
+    query/codebook dot products, and can optionally re-rank the best ``k * refine`` of them
+    with the exact vectors. Rows appended to the store after the index was built are scanned
+    exactly, so the index only needs rebuilding once that tail grows large.
+
+    On disk: ``ivfpq.json`` plus ``.npy`` arrays, all loaded with ``mmap_mode='r'``. Members are
+    sorted by partition, so a partition is one contiguous slice of ``codes`` and ``rows``.
+    """
+
+    def __init__(self, store: MemmapVectorStore, directory: Union[str, Path],
+            nprobe: Optional[int] = None, refine: Optional[int] = None):
+        self._store = store
+        directory = Path(directory)
+        self._meta = json.loads((directory / 'ivfpq.json').read_text())
+        if self._meta['dim'] != store.dim:
+            raise ValueError(f"IVF-PQ index has dim {self._meta['dim']}, store has {store.dim}")
+        self._centroids = np.load(directory / 'centroids.npy', mmap_mode='r')
+        self._codebooks = np.load(directory / 'codebooks.npy', mmap_mode='r')
+        self._codes = np.load(directory / 'codes.npy', mmap_mode='r')
+        self._rows = np.load(directory / 'rows.npy', mmap_mode='r')
+        self._offsets = np.load(directory / 'offsets.npy')
+        self._centroid_norms = (np.asarray(self._centroids) ** 2).sum(axis=1)
+        self.nprobe = nprobe or self._meta['nprobe']
+        self.refine = refine if refine is not None else self._meta['refine']
+
+    @property
+    def store(self) -> MemmapVectorStore:
+        return self._store
+
+    @property
+    def indexed_rows(self) -> int:
+        """Store rows covered by the index; later ones are searched exactly."""
+        return self._meta['indexed_rows']
+
+    @property
+    def nlist(self) -> int:
+        return self._meta['nlist']
+
+    @property
+    def m(self) -> int:
+        return self._meta['m']
+
+    @classmethod
+    def build(
+        cls,
+        store: MemmapVectorStore,
+        directory: Union[str, Path],
+        nlist: Optional[int] = None,
+        m: int = 16,
+        nprobe: int = 8,
+        refine: int = 0,
+        train_rows: int = 65536,
+        iterations: int = 10,
+        seed: int = 0,
+        block_rows: int = 65536,
+    ) -> 'IvfPqIndex':
+        """Train on a sample of the live rows of ``store`` and encode all of them. ``nlist``
+        defaults to about ``4 * sqrt(rows)``."""
+        matrix = store.matrix
+        if matrix is None:
+            raise ValueError(f"Vector store '{store.name}' is empty")
+        if store.dim % m:
+            raise ValueError(f"m={m} does not divide the dimension {store.dim}")
+        indexed_rows = matrix.shape[0]
+        live = np.setdiff1d(np.arange(indexed_rows), store.dead_rows(), assume_unique=True)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(live.size)))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, size=min(train_rows, live.size), replace=False))
+        training = np.asarray(matrix[sample], dtype=np.float32)
+        logger.info(f"Training IVF-PQ on {training.shape[0]} of {live.size} vectors: "
+                    f"nlist={nlist}, m={m}")
+
+        centroids = kmeans(training, nlist, iterations, seed)
+        nlist = centroids.shape[0]
+        assignment, _ = assign(training, centroids)
+        residuals = training - centroids[assignment]
+        pq_sample = rng.permutation(residuals.shape[0])[:PQ_CENTROIDS * PQ_TRAIN_ROWS_PER_CODE]
+        residuals = residuals[pq_sample]
+        dsub = store.dim // m
+        # fewer training rows than codes leaves the tail of each codebook unused (zero)
+        ksub = min(PQ_CENTROIDS, residuals.shape[0])
+        codebooks = np.zeros((m, PQ_CENTROIDS, dsub), dtype=np.float32)
+        for sub in range(m):
+            codebooks[sub, :ksub] = kmeans(residuals[:, sub * dsub:(sub + 1) * dsub], ksub,
+                    iterations, seed + 1 + sub)
+
+        lists = np.empty(live.size, dtype=np.int64)
+        codes = np.empty((live.size, m), dtype=np.uint8)
+        for start in range(0, live.size, block_rows):
+            rows = live[start:start + block_rows]
+            block = np.asarray(matrix[rows], dtype=np.float32)
+            block_lists, _ = assign(block, centroids)
+            lists[start:start + rows.size] = block_lists
+            block_residuals = block - centroids[block_lists]
+            for sub in range(m):
+                block_codes, _ = assign(block_residuals[:, sub * dsub:(sub + 1) * dsub],
+                        codebooks[sub, :ksub])
+                codes[start:start + rows.size, sub] = block_codes
+        order = np.argsort(lists, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(lists, minlength=nlist))
+
+        directory = Path(directory)
+        staging = directory.with_name(directory.name + '.tmp')
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        np.save(staging / 'centroids.npy', centroids)
+        np.save(staging / 'codebooks.npy', codebooks)
+        np.save(staging / 'codes.npy', codes[order])
+        np.save(staging / 'rows.npy', live[order])
+        np.save(staging / 'offsets.npy', offsets)
+        (staging / 'ivfpq.json').write_text(json.dumps({
+            'dim': store.dim,
+            'nlist': nlist,
+            'm': m,
+            'nprobe': nprobe,
+            'refine': refine,
+            'indexed_rows': indexed_rows,
+            'store_name': store.name,
+        }))
+        # swap the whole directory so a reader never sees a half-written index
+        if directory.exists():
+            retired = directory.with_name(directory.name + '.old')
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(staging, directory)
+        logger.info(f"Wrote IVF-PQ index over {live.size} vectors to {directory}")
+        return cls(store, directory)
+
+    def search(self, queries: np.ndarray, k: int = 10) -> List[List[VectorSearchHit]]:
+        """Approximate cosine top-``k`` for each query row."""
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        matrix = self._store.matrix
+        if matrix is None or k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        dead_rows = self._store.dead_rows()
+        candidates = k * self.refine if self.refine else k
+        nprobe = min(self.nprobe, self.nlist)
+        dsub = self._meta['dim'] // self.m
+        subspaces = np.arange(self.m)
+
+        results = []
+        for query in queries:
+            # probe the partitions nearest to the query, the same metric rows were assigned by
+            coarse = query @ self._centroids.T
+            probes = np.argpartition(self._centroid_norms - 2.0 * coarse, nprobe - 1)[:nprobe]
+            table = np.einsum('mkd,md->mk', self._codebooks, query.reshape(self.m, dsub))
+            scores, rows = [], []
+            for probe in probes:
+                start, end = self._offsets[probe], self._offsets[probe + 1]
+                if start == end:
+                    continue
+                codes = self._codes[start:end]
+                scores.append(coarse[probe] + table[subspaces, codes].sum(axis=1))
+                rows.append(self._rows[start:end])
+            tail = matrix[self.indexed_rows:]
+            if tail.shape[0]:
+                scores.append(np.asarray(tail, dtype=np.float32) @ query)
+                rows.append(np.arange(self.indexed_rows, matrix.shape[0]))
+            if not scores:
+                results.append((np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)))
+                continue
+            scores = np.concatenate(scores).astype(np.float32, copy=False)
+            rows = np.concatenate(rows)
+            if dead_rows.size:
+                scores[np.isin(rows, dead_rows, assume_unique=True)] = -np.inf
+            top = np.argpartition(-scores, min(candidates, scores.size) - 1)[:candidates]
+            scores, rows = scores[top], rows[top]
+            if self.refine:
+                order = np.argsort(rows)
+                rows, scores = rows[order], scores[order]
+                finite = np.isfinite(scores)
+                scores[finite] = np.asarray(matrix[rows[finite]], dtype=np.float32) @ query
+            best = np.argsort(-scores)[:k]
+            results.append((scores[best], rows[best]))
+
+        live_rows = [rows[np.isfinite(scores)] for scores, rows in results]
+        chunk_ids = self._store.chunk_ids_for_rows(
+            np.unique(np.concatenate(live_rows)).tolist() if live_rows else [])
+        return [
+            [VectorSearchHit(chunk_ids[row], score, row)
+             for score, row in zip(scores.tolist(), rows.tolist())
+             if score != -np.inf and row in chunk_ids]
+            for scores, rows in results
+        ]
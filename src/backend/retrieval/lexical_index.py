@@ -0,0 +1,145 @@
+import heapq
+import json
+import math
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_POSSESSIVE = re.compile(r"['’]s\b")
+HEAP_PREFILTER = 4096
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(_POSSESSIVE.sub('', text.lower()))
+
+
+class LexicalSearchHit(NamedTuple):
+    chunk_id: str
+    score: float
+
+
+class LexicalIndexBuilder:
+    """Accumulates chunk texts into per-term ``array('I')`` postings, then writes them as one
+    flat set of NumPy arrays (CSR style: ``offsets[t]:offsets[t + 1]`` slices ``doc_ids``/``tfs``
+    for term ``t``)."""
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._postings_docs: List[array] = []
+        self._postings_tfs: List[array] = []
+        self._chunk_ids: List[str] = []
+        self._doc_lengths = array('I')
+
+    def add(self, chunk_id: str, text: str):
+        doc_id = len(self._chunk_ids)
+        self._chunk_ids.append(chunk_id)
+        tokens = tokenize(text)
+        self._doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                term_id = self._vocab[term] = len(self._vocab)
+                self._postings_docs.append(array('I'))
+                self._postings_tfs.append(array('I'))
+            self._postings_docs[term_id].append(doc_id)
+            self._postings_tfs[term_id].append(tf)
+
+    def add_all(self, chunks: Iterable[Tuple[str, str]]) -> 'LexicalIndexBuilder':
+        for chunk_id, text in chunks:
+            self.add(chunk_id, text)
+        return self
+
+    def write(self, directory: Union[str, Path], k1: float = 1.5, b: float = 0.75) -> Path:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        offsets = np.zeros(len(self._vocab) + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(p) for p in self._postings_docs], dtype=np.uint64)
+        doc_ids = np.empty(int(offsets[-1]), dtype=np.uint32)
+        tfs = np.empty(int(offsets[-1]), dtype=np.uint32)
+        for term_id, (docs, term_tfs) in enumerate(zip(self._postings_docs, self._postings_tfs)):
+            start, end = int(offsets[term_id]), int(offsets[term_id + 1])
+            doc_ids[start:end] = np.frombuffer(docs, dtype=np.uint32)
+            tfs[start:end] = np.frombuffer(term_tfs, dtype=np.uint32)
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+
+        np.save(directory / 'offsets.npy', offsets)
+        np.save(directory / 'doc_ids.npy', doc_ids)
+        np.save(directory / 'tfs.npy', tfs)
+        np.save(directory / 'doc_lengths.npy', doc_lengths)
+        (directory / 'vocab.json').write_text(json.dumps(self._vocab))
+        (directory / 'chunk_ids.json').write_text(json.dumps(self._chunk_ids))
+        (directory / 'meta.json').write_text(json.dumps({
+            'doc_count': len(self._chunk_ids),
+            'avg_doc_length': float(doc_lengths.mean()) if len(doc_lengths) else 0.0,
+            'k1': k1,
+            'b': b,
+        }))
+        return directory
+
+
+class LexicalIndex:
+    """Read-only BM25 index over a directory written by :class:`LexicalIndexBuilder`.
+
+    Posting arrays are memory-mapped; only the vocabulary and chunk id list are parsed into
+    Python objects. Per query, the postings of each query term are scored in one vectorised
+    pass, summed per candidate document and the top ``k`` picked with a heap.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        directory = Path(directory)
+        self._directory = directory
+        meta = json.loads((directory / 'meta.json').read_text())
+        self._doc_count: int = meta['doc_count']
+        self._avg_doc_length: float = meta['avg_doc_length'] or 1.0
+        self._k1: float = meta['k1']
+        self._b: float = meta['b']
+        self._vocab: Dict[str, int] = json.loads((directory / 'vocab.json').read_text())
+        self._chunk_ids: List[str] = json.loads((directory / 'chunk_ids.json').read_text())
+        self._offsets = np.load(directory / 'offsets.npy', mmap_mode='r')
+        self._doc_ids = np.load(directory / 'doc_ids.npy', mmap_mode='r')
+        self._tfs = np.load(directory / 'tfs.npy', mmap_mode='r')
+        doc_lengths = np.load(directory / 'doc_lengths.npy', mmap_mode='r')
+        # BM25 length normalisation per document, computed once instead of per posting per query
+        self._length_norm = (
+            self._k1 * (1.0 - self._b + self._b * doc_lengths / self._avg_doc_length)
+        ).astype(np.float32)
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def doc_count(self) -> int:
+        return self._doc_count
+
+    def search(self, query: str, k: int = 10) -> List[LexicalSearchHit]:
+        term_ids = {self._vocab[t] for t in tokenize(query) if t in self._vocab}
+        if not term_ids or k <= 0:
+            return []
+        docs_parts = []
+        scores_parts = []
+        for term_id in term_ids:
+            start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+            docs = np.asarray(self._doc_ids[start:end])
+            tfs = np.asarray(self._tfs[start:end], dtype=np.float32)
+            df = end - start
+            idf = math.log((self._doc_count - df + 0.5) / (df + 0.5) + 1.0)
+            docs_parts.append(docs)
+            scores_parts.append(idf * tfs * (self._k1 + 1.0) / (tfs + self._length_norm[docs]))
+        if len(docs_parts) == 1:
+            candidates, scores = docs_parts[0], scores_parts[0]
+        else:
+            all_docs = np.concatenate(docs_parts)
+            candidates, inverse = np.unique(all_docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(scores_parts))
+        if len(scores) > HEAP_PREFILTER:
+            # common terms: cut down to the k best in NumPy before going through Python objects
+            keep = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else slice(None)
+            candidates, scores = candidates[keep], scores[keep]
+        top = heapq.nlargest(k, zip(scores.tolist(), candidates.tolist()))
+        return [LexicalSearchHit(self._chunk_ids[doc], score) for score, doc in top]
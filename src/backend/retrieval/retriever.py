@@ -0,0 +1,172 @@
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Union
+
+from app_db.app_data_db import AppDataDB
+from app_db.documents import DocumentChunk
+from backend.retrieval.fusion import reciprocal_rank_fusion
+from backend.retrieval.generations import IndexGenerations
+from backend.retrieval.ivfpq_index import IVFPQ_INDEX_DIR, IvfPqIndex
+from backend.retrieval.lexical_index import LexicalIndex
+from backend.retrieval.vector_store import MemmapVectorStore
+from llm_common.embeddings import EmbeddingService
+from log.logger import logger
+from log.metrics import metrics
+
+LEXICAL_INDEX_DIR = 'lexical'
+VECTOR_STORE_DIR = 'vectors'
+
+INDEX_RELOADS = metrics.counter(
+    'dnd_retrieval_index_reloads_total',
+    'Index generations the retriever switched to, or failed to load.',
+    labels=('outcome',),
+)
+
+
+class RetrievalIndexes(NamedTuple):
+    # None for an index directory without generations
+    generation: Optional[str]
+    lexical_index: Optional[LexicalIndex]
+    vector_store: Optional[Union[MemmapVectorStore, IvfPqIndex]]
+
+
+def load_indexes(
+    db: AppDataDB,
+    index_dir: Union[str, Path],
+    embedder: Optional[EmbeddingService] = None,
+    nprobe: Optional[int] = None,
+    store: Optional[MemmapVectorStore] = None,
+) -> RetrievalIndexes:
+    """The indexes of the current generation under ``index_dir``, or of the directory itself
+    if it has no generations. ``store`` is the vector store to reuse, if already open."""
+    index_dir = Path(index_dir)
+    generation = IndexGenerations(index_dir).current()
+    indexes_dir = generation if generation is not None else index_dir
+    ann_dir = (generation / IVFPQ_INDEX_DIR if generation is not None
+               else index_dir / VECTOR_STORE_DIR / IVFPQ_INDEX_DIR)
+    lexical_index = None
+    if (indexes_dir / LEXICAL_INDEX_DIR / 'meta.json').exists():
+        lexical_index = LexicalIndex(indexes_dir / LEXICAL_INDEX_DIR)
+    vector_store = None
+    if embedder is not None and (index_dir / VECTOR_STORE_DIR / 'chunks.json').exists():
+        vector_store = store or MemmapVectorStore(db, index_dir / VECTOR_STORE_DIR)
+        if (ann_dir / 'ivfpq.json').exists():
+            vector_store = IvfPqIndex(vector_store, ann_dir, nprobe=nprobe)
+    return RetrievalIndexes(generation.name if generation is not None else None,
+            lexical_index, vector_store)
+
+
+class HybridRetriever:
+    """BM25 and vector search over ingested chunks, fused with reciprocal rank fusion.
+
+    Either side may be missing (no lexical index built yet, no embedding model configured);
+    the other is then used on its own. Vector search goes through the IVF-PQ index when one
+    has been built for the vector store, and scans the store exactly otherwise.
+
+    Made with :meth:`from_directory`, it follows the index directory's current generation:
+    every ``reload_interval`` seconds a query checks the ``CURRENT`` pointer, and a new
+    generation is loaded on a background thread while queries keep using the old one.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        lexical_index: Optional[LexicalIndex] = None,
+        vector_store: Optional[Union[MemmapVectorStore, IvfPqIndex]] = None,
+        embedder: Optional[EmbeddingService] = None,
+        candidates: int = 30,
+    ):
+        self._db = db
+        self._indexes = RetrievalIndexes(None, lexical_index,
+                vector_store if embedder is not None else None)
+        self._embedder = embedder
+        self._candidates = candidates
+        self._index_dir: Optional[Path] = None
+        self._nprobe: Optional[int] = None
+        self._reload_interval = 0.0
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+
+    @classmethod
+    def from_directory(
+        cls,
+        db: AppDataDB,
+        index_dir: Union[str, Path],
+        embedder: Optional[EmbeddingService] = None,
+        nprobe: Optional[int] = None,
+        reload_interval: float = 5.0,
+    ) -> 'HybridRetriever':
+        indexes = load_indexes(db, index_dir, embedder, nprobe)
+        if indexes.lexical_index is None and indexes.vector_store is None:
+            logger.warning(f"No retrieval indexes found under {index_dir}")
+        retriever = cls(db, indexes.lexical_index, indexes.vector_store, embedder)
+        retriever._indexes = indexes
+        retriever._index_dir = Path(index_dir)
+        retriever._nprobe = nprobe
+        retriever._reload_interval = reload_interval
+        retriever._checked_at = time.monotonic()
+        return retriever
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self._indexes.generation
+
+    def retrieve(self, query: str, k: int = 8) -> List[DocumentChunk]:
+        self._check_generation()
+        # one snapshot per query, so a swap in the middle can't mix generations
+        indexes = self._indexes
+        rankings = []
+        if indexes.lexical_index is not None:
+            rankings.append([h.chunk_id for h in indexes.lexical_index.search(query,
+                    self._candidates)])
+        if indexes.vector_store is not None:
+            query_vector = self._embedder.embed_query(query)
+            hits = indexes.vector_store.search(query_vector, self._candidates)[0]
+            rankings.append([h.chunk_id for h in hits])
+        if not rankings:
+            return []
+        fused = reciprocal_rank_fusion(*rankings, limit=k)
+        # chunks deleted since the generation was built are simply not found
+        chunks = self._db.get_document_chunks([chunk_id for chunk_id, _ in fused])
+        return [chunks[chunk_id] for chunk_id, _ in fused if chunk_id in chunks]
+
+    def _check_generation(self):
+        if self._index_dir is None or self._reloading:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self._reload_interval:
+            return
+        with self._reload_lock:
+            if self._reloading or now - self._checked_at < self._reload_interval:
+                return
+            self._checked_at = now
+            current = IndexGenerations(self._index_dir).current_name()
+            if current is None or current == self._indexes.generation:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(current,), name='retrieval-index-reload',
+                daemon=True).start()
+
+    def _reload(self, generation: str):
+        started = time.perf_counter()
+        try:
+            vector_store = self._indexes.vector_store
+            if isinstance(vector_store, IvfPqIndex):
+                vector_store = vector_store.store
+            if vector_store is not None:
+                # the ingester appended and tombstoned rows; drop the cached matrix and dead rows
+                vector_store.reload()
+            indexes = load_indexes(self._db, self._index_dir, self._embedder, self._nprobe,
+                    store=vector_store)
+            self._indexes = indexes
+            INDEX_RELOADS.inc('ok')
+            logger.info(f"Switched to index generation {indexes.generation} in "
+                        f"{time.perf_counter() - started:.3f} s")
+        except Exception as e:
+            # pruned or half-copied: keep serving the old one, try again next interval
+            INDEX_RELOADS.inc('error')
+            logger.error(f"Failed to load index generation {generation}: {e}")
+        finally:
+            self._reloading = False
@@ -0,0 +1,189 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from app_db.app_data_db import AppDataDB
+from log.logger import logger
+
+SUPPORTED_DTYPES = ('float32', 'float16')
+
+
+class VectorSearchHit(NamedTuple):
+    chunk_id: str
+    score: float
+    row_index: int
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class MemmapVectorStore:
+    """Append-only embedding matrix on disk, searched through ``numpy.memmap``.
+
+    ``<name>.json`` records the dimension and dtype; ``<name>.vec`` holds unit-normalised rows
+    back to back with no header, so appends are plain writes at the end of the file and the
+    row count is simply the file size over the row size. The matrix is only ever mapped
+    read-only, which lets every worker process share the same OS page cache. Row -> chunk id
+    mapping and tombstones live in the ``vector_rows`` table of the app DB.
+    """
+
+    def __init__(
+        self,
+        db: AppDataDB,
+        directory: Union[str, Path],
+        name: str = 'chunks',
+        dim: Optional[int] = None,
+        dtype: str = 'float32',
+        block_rows: int = 65536,
+    ):
+        self._db = db
+        self._name = name
+        self._block_rows = block_rows
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self._header_path = directory / f'{name}.json'
+        self._matrix_path = directory / f'{name}.vec'
+        if self._header_path.exists():
+            header = json.loads(self._header_path.read_text())
+            if dim is not None and dim != header['dim']:
+                raise ValueError(f"Vector store '{name}' has dim {header['dim']}, not {dim}")
+            dim, dtype = header['dim'], header['dtype']
+        else:
+            if dim is None:
+                raise ValueError(f"Vector store '{name}' does not exist; dim is required")
+            if dtype not in SUPPORTED_DTYPES:
+                raise ValueError(f"Unsupported dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+            self._header_path.write_text(json.dumps({'dim': dim, 'dtype': dtype}))
+        self._dim = dim
+        self._dtype = np.dtype(dtype)
+        self._row_bytes = self._dim * self._dtype.itemsize
+        self._matrix: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._dead_rows: Optional[np.ndarray] = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def matrix_path(self) -> Path:
+        return self._matrix_path
+
+    @property
+    def row_count(self) -> int:
+        try:
+            return os.path.getsize(self._matrix_path) // self._row_bytes
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def matrix(self) -> Optional[np.memmap]:
+        """Read-only view of every complete row currently on disk."""
+        rows = self.row_count
+        if rows != self._mapped_rows:
+            self._matrix = np.memmap(
+                self._matrix_path,
+                dtype=self._dtype,
+                mode='r',
+                shape=(rows, self._dim)
+            ) if rows else None
+            self._mapped_rows = rows
+            self._dead_rows = None
+        return self._matrix
+
+    def reload(self):
+        self._mapped_rows = -1
+        self._dead_rows = None
+
+    def append(self, chunk_ids: Sequence[str], vectors: np.ndarray) -> range:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self._dim:
+            raise ValueError(f"Expected vectors of shape (n, {self._dim}), got {vectors.shape}")
+        if len(chunk_ids) != vectors.shape[0]:
+            raise ValueError("chunk_ids and vectors differ in length")
+        rows = normalize_rows(vectors).astype(self._dtype, copy=False)
+        with open(self._matrix_path, 'ab') as f:
+            start_row = f.tell() // self._row_bytes
+            if f.tell() != start_row * self._row_bytes:
+                # a previous writer died mid-row; drop the torn row
+                logger.warning(f"Truncating partial trailing row in {self._matrix_path}")
+                f.truncate(start_row * self._row_bytes)
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._db.add_vector_rows(self._name, start_row, list(chunk_ids))
+        return range(start_row, start_row + len(chunk_ids))
+
+    def delete(self, chunk_ids: Sequence[str]):
+        self._db.mark_vector_rows_deleted(self._name, list(chunk_ids))
+        self._dead_rows = None
+
+    def dead_rows(self) -> np.ndarray:
+        """Sorted indices of tombstoned rows."""
+        if self._dead_rows is None:
+            self._dead_rows = np.asarray(
+                sorted(self._db.get_deleted_vector_rows(self._name)),
+                dtype=np.int64
+            )
+        return self._dead_rows
+
+    def chunk_ids_for_rows(self, row_indices: List[int]) -> Dict[int, str]:
+        """Chunk ids of the given rows, leaving out deleted ones."""
+        return self._db.get_vector_row_chunk_ids(self._name, row_indices)
+
+    def search(self, queries: np.ndarray, k: int = 10) -> List[List[VectorSearchHit]]:
+        """Cosine top-``k`` for each query row, scanning the matrix block by block."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = normalize_rows(queries)
+        matrix = self.matrix
+        if matrix is None or k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        dead_rows = self.dead_rows()
+
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+        best_rows = np.empty((queries.shape[0], 0), dtype=np.int64)
+        for start in range(0, matrix.shape[0], self._block_rows):
+            block = np.asarray(matrix[start:start + self._block_rows], dtype=np.float32)
+            scores = queries @ block.T
+            if dead_rows.size:
+                lo, hi = np.searchsorted(dead_rows, [start, start + block.shape[0]])
+                scores[:, dead_rows[lo:hi] - start] = -np.inf
+            block_k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+            best_scores = np.concatenate(
+                [best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        chunk_ids = self.chunk_ids_for_rows(
+            np.unique(best_rows[np.isfinite(best_scores)]).tolist()
+        )
+        results = []
+        for scores_row, rows_row in zip(best_scores, best_rows):
+            hits = []
+            for score, row in zip(scores_row.tolist(), rows_row.tolist()):
+                if score == -np.inf or row not in chunk_ids:
+                    continue
+                hits.append(VectorSearchHit(chunk_ids[row], score, row))
+            results.append(hits)
+        return results
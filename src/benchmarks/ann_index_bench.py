@@ -0,0 +1,100 @@
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import click
+import numpy as np
+
+from app_db.app_data_db import AppDataDB
+from backend.retrieval.ivfpq_index import IvfPqIndex
+from backend.retrieval.retriever import VECTOR_STORE_DIR
+from backend.retrieval.vector_store import MemmapVectorStore, normalize_rows
+
+
+def synthesize_vectors(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around ``clusters`` random directions, like embeddings of a few hundred
+    topics."""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dim)).astype(np.float32))
+    members = rng.integers(0, clusters, size=count)
+    noise = rng.standard_normal((count, dim)).astype(np.float32) / np.sqrt(dim)
+    return normalize_rows(centers[members] + 0.6 * noise)
+
+
+def parse_int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def recall_at_k(approximate: List[List[int]], exact: List[List[int]], k: int) -> float:
+    found = sum(len(set(a[:k]) & set(e[:k])) for a, e in zip(approximate, exact))
+    return found / sum(min(k, len(e)) for e in exact)
+
+
+def time_queries(search, queries: np.ndarray, k: int):
+    rows, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = search(query, k)[0]
+        timings.append(time.perf_counter() - start)
+        rows.append([hit.row_index for hit in hits])
+    return rows, np.asarray(timings) * 1000
+
+
+@click.command()
+@click.option('--index_dir', default=None, type=click.Path(exists=True, file_okay=False),
+        help='Benchmark the vector store of this retrieval index directory (its app DB is '
+             'DND_APP_DB_URL); default: a synthetic corpus')
+@click.option('--vectors', default=100_000, help='Synthetic corpus: vectors')
+@click.option('--dim', default=384, help='Synthetic corpus: dimension')
+@click.option('--clusters', default=500, help='Synthetic corpus: topics')
+@click.option('--queries', default=200, help='Timed queries')
+@click.option('--k', default=10, help='Top-k per query, recall@k is reported')
+@click.option('--nlist', default=None, type=int, help='Partitions; default ~4*sqrt(vectors)')
+@click.option('--m', default=48, help='PQ subspaces (bytes per vector); must divide dim')
+@click.option('--nprobe', default='1,2,4,8,16,32', help='Comma separated nprobe values')
+@click.option('--refine', default='0,4', help='Comma separated re-rank factors (0: none)')
+def main_cli(index_dir: Optional[str], vectors: int, dim: int, clusters: int, queries: int,
+        k: int, nlist: Optional[int], m: int, nprobe: str, refine: str):
+    """Recall@k and per-query latency of the IVF-PQ index against exact search, per
+    operating point."""
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        if index_dir is None:
+            db = AppDataDB(db_url=f"sqlite:///{directory / 'bench.db'}")
+            store = MemmapVectorStore(db, directory / VECTOR_STORE_DIR, dim=dim)
+            corpus = synthesize_vectors(vectors, dim, clusters)
+            store.append([f'chunk-{i}' for i in range(vectors)], corpus)
+        else:
+            from app_db.app_data_db import app_db
+            store = MemmapVectorStore(app_db, Path(index_dir) / VECTOR_STORE_DIR)
+        rng = np.random.default_rng(1)
+        sample = np.asarray(store.matrix[rng.choice(store.row_count, size=queries)],
+                dtype=np.float32)
+        # queries near, but not on, indexed vectors
+        query_vectors = normalize_rows(sample + 0.3 * rng.standard_normal(sample.shape)
+                .astype(np.float32) / np.sqrt(store.dim))
+
+        start = time.perf_counter()
+        index = IvfPqIndex.build(store, directory / 'ivfpq', nlist=nlist, m=m)
+        click.echo(f"built IVF-PQ over {store.row_count} x {store.dim} vectors in "
+                   f"{time.perf_counter() - start:.1f} s: nlist={index.nlist}, m={index.m}")
+        raw_mb = store.row_count * store.dim * store.dtype.itemsize / 2 ** 20
+        code_mb = store.row_count * (index.m + 8) / 2 ** 20
+        click.echo(f"codes + row ids: {code_mb:.1f} MiB vs {raw_mb:.1f} MiB of vectors")
+
+        exact, exact_ms = time_queries(store.search, query_vectors, k)
+        click.echo(f"exact: p50={np.percentile(exact_ms, 50):.2f} ms "
+                   f"p95={np.percentile(exact_ms, 95):.2f} ms")
+        click.echo(f"{'nprobe':>6} {'refine':>6} {f'recall@{k}':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for refine_factor in parse_int_list(refine):
+            for probes in parse_int_list(nprobe):
+                index.nprobe, index.refine = probes, refine_factor
+                approximate, ms = time_queries(index.search, query_vectors, k)
+                click.echo(f"{probes:>6} {refine_factor:>6} "
+                           f"{recall_at_k(approximate, exact, k):>10.3f} "
+                           f"{np.percentile(ms, 50):>8.2f} {np.percentile(ms, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,93 @@
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import click
+from sqlalchemy.exc import OperationalError
+
+from app_db.app_data_db import AppDataDB
+from llm_common.conversation import Conversation
+
+
+@click.command()
+@click.option('--readers', default=32, help='Concurrent reader threads')
+@click.option('--writers', default=1, help='Concurrent writer threads')
+@click.option('--seconds', default=5.0, help='How long to run')
+@click.option('--seed_rows', default=200, help='Conversation rows present before the run')
+def main_cli(readers: int, writers: int, seconds: float, seed_rows: int):
+    """Hammer one AppDataDB with simultaneous readers and writers; exits non-zero if any
+    operation failed (e.g. "database is locked")."""
+    with tempfile.TemporaryDirectory() as directory:
+        db = AppDataDB(db_url=f"sqlite:///{Path(directory) / 'concurrency.db'}")
+        session_id = uuid.uuid4()
+        for i in range(seed_rows):
+            db.upsert_conversation_entry(Conversation(
+                session_id=session_id,
+                persona_name='FeyCreature',
+                message_time=datetime.now(),
+                conversation_sender='user' if i % 2 == 0 else 'llm',
+                conversation_content=f'seed message {i}',
+            ))
+        db.remove_session()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        counts = {'reads': 0, 'writes': 0}
+        errors = []
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    db.get_conversation_history(session_id, 'FeyCreature')
+                    # one session per simulated request, as the web app's teardown does
+                    db.remove_session()
+                    with lock:
+                        counts['reads'] += 1
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                db.remove_session()
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    db.upsert_conversation_entry(Conversation(
+                        session_id=session_id,
+                        persona_name='FeyCreature',
+                        message_time=datetime.now(),
+                        conversation_sender='user',
+                        conversation_content='written during the run',
+                    ))
+                    db.remove_session()
+                    with lock:
+                        counts['writes'] += 1
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                db.remove_session()
+
+        threads = ([threading.Thread(target=reader) for _ in range(readers)]
+                   + [threading.Thread(target=writer) for _ in range(writers)])
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        db.engine.dispose()
+
+    click.echo(f"{readers} readers / {writers} writers over {seconds:.1f} s: "
+               f"{counts['reads']} reads ({counts['reads'] / seconds:,.0f}/s), "
+               f"{counts['writes']} writes ({counts['writes'] / seconds:,.0f}/s), "
+               f"{len(errors)} errors")
+    for error in errors[:5]:
+        click.echo(f"  {error}", err=True)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,267 @@
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional
+
+import click
+import httpx
+import numpy as np
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+
+class TurnResult(NamedTuple):
+    ok: bool
+    # seconds from sending /submit to the first streamed token, None if none arrived
+    ttft: Optional[float]
+    elapsed: float
+    tokens: int
+    # turned away by the app's LLM scheduler (429, or timed out in its queue)
+    rejected: bool = False
+
+
+class ChatEventDecoder:
+    """/submit streams JSON objects back to back with no separator; split them apart."""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+
+    def feed(self, text: str) -> Iterator[dict]:
+        self._buffer += text
+        while self._buffer:
+            try:
+                event, end = self._decoder.raw_decode(self._buffer)
+            except json.JSONDecodeError:
+                return
+            self._buffer = self._buffer[end:].lstrip()
+            yield event
+
+
+async def run_turn(client: httpx.AsyncClient, model: str, prompt: str) -> TurnResult:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    ok = True
+    rejected = False
+    try:
+        async with client.stream('POST', '/submit',
+                json={'model': model, 'chat_input': prompt}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return TurnResult(False, None, time.perf_counter() - start, 0,
+                        response.status_code == 429)
+            decoder = ChatEventDecoder()
+            async for text in response.aiter_text():
+                for event in decoder.feed(text):
+                    if event.get('role_name') == 'queue':
+                        continue
+                    if event.get('role_name') == 'system':
+                        ok = False
+                        rejected = rejected or 'busy' in event.get('text_content', '')
+                    elif event.get('text_content'):
+                        tokens += 1
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+    except httpx.HTTPError:
+        ok = False
+    return TurnResult(ok and tokens > 0, ttft, time.perf_counter() - start, tokens, rejected)
+
+
+async def run_session(base_url: str, model: str, prompts: List[str],
+        timeout: float) -> List[TurnResult]:
+    # one client per session so each keeps its own session cookie
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        await client.get('/list_personas')
+        return [await run_turn(client, model, prompt) for prompt in prompts]
+
+
+def session_prompts(prompt: str, session: int, turns: int, distinct_prompts: int) -> List[str]:
+    """Turn ``t`` of every session asks question ``t``, or with ``distinct_prompts`` set, the
+    sessions cycle through that many questions starting at different offsets."""
+    if distinct_prompts <= 0:
+        return [f'{prompt} ({turn})' for turn in range(turns)]
+    return [f'{prompt} ({(session + turn) % distinct_prompts})' for turn in range(turns)]
+
+
+async def run_load(base_url: str, sessions: int, turns: int, model: str, prompt: str,
+        timeout: float, distinct_prompts: int = 0) -> List[TurnResult]:
+    results = await asyncio.gather(*(
+        run_session(base_url, model, session_prompts(prompt, session, turns, distinct_prompts),
+                timeout)
+        for session in range(sessions)
+    ))
+    return [result for session_results in results for result in session_results]
+
+
+def wait_until_up(url: str, timeout: float, processes: List[subprocess.Popen]):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for process in processes:
+            if process.poll() is not None:
+                raise click.ClickException(f"{' '.join(process.args)} exited early")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise click.ClickException(f"{url} did not come up within {timeout:.0f} s")
+
+
+@contextlib.contextmanager
+def launched_stack(fake_args: List[List[str]], app_args: List[str], app_url: str,
+        log_dir: Path):
+    """Start the fake LLM servers and the web app as subprocesses, each in its own process
+    group so the Flask reloader's child goes down with it."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(SRC_DIR), env.get('PYTHONPATH')]))
+    env['DND_APP_DB_URL'] = f"sqlite:///{log_dir / 'load_bench.db'}"
+    processes = []
+    try:
+        launches = [(f'fake_llm_server_{i}', args) for i, args in enumerate(fake_args)]
+        for name, args in launches + [('web_app', app_args)]:
+            log = open(log_dir / f'{name}.log', 'wb')
+            processes.append(subprocess.Popen(
+                [sys.executable, '-m', *args],
+                cwd=log_dir,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            ))
+        wait_until_up(f'{app_url}/list_personas', 60.0, processes)
+        yield
+    finally:
+        for process in processes:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGTERM)
+        for process in processes:
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                process.wait(10)
+
+
+def report(results: List[TurnResult], wall_seconds: float) -> float:
+    """Print the summary and return the failure rate."""
+    ok = [r for r in results if r.ok]
+    failed = len(results) - len(ok)
+    rejected = sum(r.rejected for r in results)
+    click.echo(f"{len(results)} turns in {wall_seconds:.2f} s: {len(ok)} ok, {failed} failed "
+               f"({rejected} turned away by the scheduler)")
+    if ok:
+        ttft = np.asarray([r.ttft for r in ok]) * 1000
+        elapsed = np.asarray([r.elapsed for r in ok]) * 1000
+        rates = np.asarray([r.tokens / r.elapsed for r in ok])
+        for label, values in (('time to first token ms', ttft), ('end-to-end ms', elapsed)):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            click.echo(f"{label}: p50={p50:.1f} p95={p95:.1f} p99={p99:.1f}")
+        click.echo(f"tokens/s per stream: p50={np.percentile(rates, 50):.1f}, "
+                   f"aggregate: {sum(r.tokens for r in ok) / wall_seconds:,.0f}")
+    return failed / len(results) if results else 0.0
+
+
+def report_answer_cache(base_url: str):
+    """Print the answer cache hit rate from the app's /metrics, if it has one."""
+    try:
+        response = httpx.get(f'{base_url}/metrics', timeout=5.0)
+    except httpx.HTTPError:
+        return
+    if response.status_code != 200:
+        return
+    counts = {}
+    for line in response.text.splitlines():
+        if line.startswith('dnd_answer_cache_lookups_total{'):
+            labels, _, value = line.partition(' ')
+            counts[labels.split('"')[1]] = float(value)
+    lookups = sum(counts.values())
+    if lookups:
+        hits = counts.get('hit', 0) + counts.get('near_hit', 0)
+        click.echo(f"answer cache: {hits:.0f} of {lookups:.0f} lookups hit "
+                   f"({hits / lookups:.0%}, {counts.get('near_hit', 0):.0f} near hits)")
+
+
+@click.command()
+@click.option('--sessions', default=32, help='Concurrent chat sessions')
+@click.option('--turns', default=3, help='Sequential /submit turns per session')
+@click.option('--model', default='fake-model', help='Model name sent with each turn')
+@click.option('--prompt', default='What does the goblin do next?', help='User message to send')
+@click.option('--distinct_prompts', default=0,
+        help='Cycle sessions through this many questions (exercises the answer cache); '
+             '0: turn t of every session asks the same question t')
+@click.option('--timeout', default=120.0, help='Per-request timeout in seconds')
+@click.option('--max_error_rate', default=0.0,
+        help='Exit non-zero if more than this fraction of turns failed')
+@click.option('--target', default=None,
+        help='Base URL of an already running web app; if omitted the fake LLM server and the '
+             'web app are started here')
+@click.option('--serving_mode', default='async', type=click.Choice(['threaded', 'async']),
+        help='Serving mode of the launched web app')
+@click.option('--llm_max_concurrent', default=4, help='Launched web app: streams per model')
+@click.option('--llm_max_queue_depth', default=64, help='Launched web app: queue depth limit')
+@click.option('--app_port', default=18345, help='Port for the launched web app')
+@click.option('--llm_port', default=18234,
+        help='Port for the launched fake LLM server; further ones take the next ports')
+@click.option('--llm_backends', default=1, help='Fake LLM servers to launch behind the web app')
+@click.option('--reply_tokens', default=100, help='Fake server: tokens per reply')
+@click.option('--tokens_per_second', default=50.0, help='Fake server: streaming rate per reply')
+@click.option('--ttft', default=0.2, help='Fake server: seconds before the first token')
+@click.option('--max_fragment_bytes', default=0, help='Fake server: SSE frame fragmentation')
+@click.option('--error_rate', default=0.0, help='Fake server: fraction of HTTP 500 replies')
+def main_cli(sessions: int, turns: int, model: str, prompt: str, distinct_prompts: int,
+        timeout: float,
+        max_error_rate: float, target: Optional[str], serving_mode: str,
+        llm_max_concurrent: int, llm_max_queue_depth: int, app_port: int,
+        llm_port: int, llm_backends: int, reply_tokens: int, tokens_per_second: float, ttft: float,
+        max_fragment_bytes: int, error_rate: float):
+    """Drive /submit with concurrent sessions and report time to first token, tokens/s and
+    end-to-end latency percentiles."""
+    with contextlib.ExitStack() as stack:
+        if target is None:
+            target = f'http://localhost:{app_port}'
+            log_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            stack.enter_context(launched_stack(
+                fake_args=[
+                    [
+                        'benchmarks.fake_llm_server',
+                        '--port', str(llm_port + i),
+                        '--models', model,
+                        '--reply_tokens', str(reply_tokens),
+                        '--tokens_per_second', str(tokens_per_second),
+                        '--ttft', str(ttft),
+                        '--max_fragment_bytes', str(max_fragment_bytes),
+                        '--error_rate', str(error_rate),
+                        '--seed', str(i),
+                    ]
+                    for i in range(llm_backends)
+                ],
+                app_args=[
+                    'web_ui.app',
+                    *(arg for i in range(llm_backends)
+                      for arg in ('--llm_backend', f'http://localhost:{llm_port + i}')),
+                    '--port', str(app_port),
+                    '--serving_mode', serving_mode,
+                    '--llm_max_concurrent', str(llm_max_concurrent),
+                    '--llm_max_queue_depth', str(llm_max_queue_depth),
+                ],
+                app_url=target,
+                log_dir=log_dir,
+            ))
+            click.echo(f"launched {llm_backends} fake LLM server(s) and {serving_mode} web app, "
+                       f"logs in {log_dir}")
+        start = time.perf_counter()
+        results = asyncio.run(run_load(target, sessions, turns, model, prompt, timeout,
+                distinct_prompts))
+        failure_rate = report(results, time.perf_counter() - start)
+        report_answer_cache(target)
+    sys.exit(1 if failure_rate > max_error_rate else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
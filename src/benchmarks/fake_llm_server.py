@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import itertools
+import random
+import time
+from typing import AsyncIterator, List
+
+import click
+import numpy as np
+from quart import Quart, jsonify, request
+
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+from llm_common.sse import encode_sse_done, encode_sse_event
+
+WORDS = (
+    'the goblin rolls initiative and the wizard casts a spell of fire at the dragon while '
+    'the rogue hides behind a barrel of ale in the tavern near the old keep'
+).split()
+
+
+class FakeLLMSettings(DnDAppBaseModel):
+    """Knobs for the fake server. Everything random is drawn from ``seed`` and the request's
+    sequence number, so the same requests in the same order replay exactly."""
+    models: List[str] = ['fake-model']
+    reply_tokens: int = 200
+    tokens_per_second: float = 50.0
+    time_to_first_token: float = 0.2
+    max_fragment_bytes: int = 0
+    error_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    embedding_dim: int = 384
+    seed: int = 0
+
+
+def chunk_frame(model: str, delta: dict, finish_reason=None) -> bytes:
+    return encode_sse_event({
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion.chunk',
+        'created': 0,
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    })
+
+
+def fragment(frame: bytes, rng: random.Random, max_bytes: int) -> List[bytes]:
+    """Split one SSE frame at random points, as a proxy or a slow socket would."""
+    if max_bytes <= 0:
+        return [frame]
+    parts = []
+    start = 0
+    while start < len(frame):
+        end = start + rng.randint(1, max_bytes)
+        parts.append(frame[start:end])
+        start = end
+    return parts
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_fake_llm_app(settings: FakeLLMSettings) -> Quart:
+    app = Quart(__name__)
+    sequence = itertools.count()
+
+    def next_rng() -> random.Random:
+        return random.Random(f'{settings.seed}:{next(sequence)}')
+
+    @app.route('/v1/models')
+    async def models():
+        return jsonify({
+            'object': 'list',
+            'data': [{'id': name, 'object': 'model', 'owned_by': 'fake'}
+                     for name in settings.models],
+        })
+
+    @app.route('/v1/embeddings', methods=['POST'])
+    async def embeddings():
+        rng = next_rng()
+        if rng.random() < settings.error_rate:
+            return jsonify({'error': {'message': 'injected failure'}}), 500
+        body = await request.get_json()
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        return jsonify({
+            'object': 'list',
+            'model': body.get('model', settings.models[0]),
+            'data': [
+                {'object': 'embedding', 'index': i,
+                 'embedding': fake_embedding(text, settings.embedding_dim)}
+                for i, text in enumerate(inputs)
+            ],
+            'usage': {'prompt_tokens': sum(len(t.split()) for t in inputs),
+                      'total_tokens': sum(len(t.split()) for t in inputs)},
+        })
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    async def chat_completions():
+        rng = next_rng()
+        body = await request.get_json()
+        model = body.get('model', settings.models[0])
+        if rng.random() < settings.error_rate:
+            return jsonify({'error': {'message': 'injected failure'}}), 500
+        words = [rng.choice(WORDS) for _ in range(settings.reply_tokens)]
+        if not body.get('stream'):
+            await asyncio.sleep(settings.time_to_first_token
+                                + len(words) / settings.tokens_per_second)
+            return jsonify({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ' '.join(words)},
+                    'finish_reason': 'stop',
+                }],
+            })
+        disconnect_at = len(words) // 2 if rng.random() < settings.disconnect_rate else None
+
+        async def generate() -> AsyncIterator[bytes]:
+            await asyncio.sleep(settings.time_to_first_token)
+            started = time.monotonic()
+            for i, word in enumerate(words):
+                if i == disconnect_at:
+                    # end the body without a finish_reason or [DONE]
+                    return
+                delta = {'content': f'{word} '}
+                if i == 0:
+                    delta['role'] = 'assistant'
+                for part in fragment(chunk_frame(model, delta), rng, settings.max_fragment_bytes):
+                    yield part
+                # pace against the start time so sleep overshoot doesn't accumulate
+                delay = started + (i + 1) / settings.tokens_per_second - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk_frame(model, {}, 'stop')
+            yield encode_sse_done()
+
+        return generate(), 200, {'Content-Type': 'text/event-stream'}
+
+    return app
+
+
+@click.command()
+@click.option('--port', default=1234, help='Port to listen on (the web app defaults to 1234)')
+@click.option('--models', default='fake-model', help='Comma separated model ids to advertise')
+@click.option('--reply_tokens', default=200, help='Tokens in every streamed reply')
+@click.option('--tokens_per_second', default=50.0, help='Streaming rate per reply')
+@click.option('--ttft', default=0.2, help='Seconds before the first token')
+@click.option('--max_fragment_bytes', default=0,
+        help='Split SSE frames into random pieces of at most this many bytes (0: whole frames)')
+@click.option('--error_rate', default=0.0, help='Fraction of requests answered with HTTP 500')
+@click.option('--disconnect_rate', default=0.0,
+        help='Fraction of streams cut off halfway without [DONE]')
+@click.option('--embedding_dim', default=384, help='Dimension of the fake embeddings')
+@click.option('--seed', default=0, help='Seed for replies, fragmentation and injected errors')
+def main_cli(port: int, models: str, reply_tokens: int, tokens_per_second: float, ttft: float,
+        max_fragment_bytes: int, error_rate: float, disconnect_rate: float, embedding_dim: int,
+        seed: int):
+    """Deterministic stand-in for an OpenAI-compatible server (LM Studio, llama.cpp, ...)
+    serving /v1/models, streaming /v1/chat/completions and /v1/embeddings."""
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    app = create_fake_llm_app(FakeLLMSettings(
+        models=[name.strip() for name in models.split(',') if name.strip()],
+        reply_tokens=reply_tokens,
+        tokens_per_second=tokens_per_second,
+        time_to_first_token=ttft,
+        max_fragment_bytes=max_fragment_bytes,
+        error_rate=error_rate,
+        disconnect_rate=disconnect_rate,
+        embedding_dim=embedding_dim,
+        seed=seed,
+    ))
+    config = Config()
+    config.bind = [f'localhost:{port}']
+    config.accesslog = None
+    asyncio.run(serve(app, config))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import click
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+
+# none of these may be loaded by importing the web worker; they belong to the subsystems that
+# are built on first use
+DEFERRED_PACKAGES = ('sqlalchemy', 'numpy', 'fitz', 'quart', 'hypercorn')
+
+PROBE = '''
+import json, sys
+import {module}
+print(json.dumps(sorted({{name.partition('.')[0] for name in sys.modules}})))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) of each ``-X importtime`` line, indentation kept in the
+    name to show nesting."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+    return entries
+
+
+def cold_import(module: str, db_dir: str) -> Tuple[int, List[Tuple[str, int, int]], List[str]]:
+    """Import ``module`` in a fresh interpreter: its cumulative microseconds, the import tree
+    and the top-level packages left loaded."""
+    env = dict(os.environ, DND_APP_DB_URL=f'sqlite:///{db_dir}/app.db')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    entries = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative in entries if name.strip() == module)
+    return total, entries, json.loads(result.stdout.splitlines()[-1])
+
+
+@click.command()
+@click.option('--module', default='web_ui.app', help='Module the web worker imports')
+@click.option('--runs', default=5, help='Fresh interpreters; the fastest counts, after a warm-up '
+                                        'run that fills the bytecode cache')
+@click.option('--budget_ms', default=800.0, help='Cold import time the module must stay under')
+@click.option('--top', default=10, help='Slowest direct imports to list')
+def main_cli(module: str, runs: int, budget_ms: float, top: int):
+    """Cold import time of the web worker against a budget; also fails if the import loads a
+    deferred package or opens the app DB. Exits 1 on any failure."""
+    failures = []
+    with tempfile.TemporaryDirectory() as db_dir:
+        cold_import(module, db_dir)
+        timings: List[int] = []
+        for _ in range(runs):
+            total, entries, packages = cold_import(module, db_dir)
+            timings.append(total)
+        created = os.listdir(db_dir)
+    best_ms = min(timings) / 1000
+    click.echo(f"import {module}: best {best_ms:.1f} ms, worst {max(timings) / 1000:.1f} ms "
+               f"over {runs} runs (budget {budget_ms:.0f} ms)")
+
+    direct: Dict[str, int] = {}
+    # importtime lists a module's imports before the module itself, one indent level deeper
+    position = next(i for i, (name, _, _) in enumerate(entries) if name.strip() == module)
+    depth = len(entries[position][0]) - len(entries[position][0].lstrip())
+    for name, _, cumulative in reversed(entries[:position]):
+        indent = len(name) - len(name.lstrip())
+        if indent <= depth:
+            break
+        if indent == depth + 2:
+            direct[name.strip()] = cumulative
+    for name, cumulative in sorted(direct.items(), key=lambda item: -item[1])[:top]:
+        click.echo(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if best_ms > budget_ms:
+        failures.append(f"cold import took {best_ms:.1f} ms, over the {budget_ms:.0f} ms budget")
+    loaded = sorted(set(DEFERRED_PACKAGES) & set(packages))
+    if loaded:
+        failures.append(f"import loaded {', '.join(loaded)}")
+    if created:
+        failures.append(f"import opened the app DB ({', '.join(created)})")
+    for failure in failures:
+        click.echo(f"FAIL: {failure}", err=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,53 @@
+import random
+import tempfile
+import time
+
+import click
+import numpy as np
+
+from backend.retrieval.lexical_index import LexicalIndex, LexicalIndexBuilder
+
+QUERIES = [
+    "fireball", "bigby's hand", "cr 5 undead", "grapple contest athletics",
+    "opportunity attack reaction", "concentration saving throw constitution",
+    "dragon breath weapon recharge", "3rd level evocation spell",
+]
+
+
+def synthesize_corpus(chunks: int, words_per_chunk: int, vocab_size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocab = [f'w{i}' for i in range(vocab_size)]
+    # sprinkle the query terms in so they have realistic, non-empty postings
+    extra = sorted({t for q in QUERIES for t in q.replace("'s", '').split()})
+    vocab[:len(extra)] = extra
+    ranks = rng.zipf(1.2, size=(chunks, words_per_chunk)) % vocab_size
+    for i, row in enumerate(ranks):
+        yield f'chunk-{i}', ' '.join(vocab[j] for j in row)
+
+
+@click.command()
+@click.option('--chunks', default=20000, help='Chunks in the synthetic corpus')
+@click.option('--words_per_chunk', default=250, help='Words per chunk')
+@click.option('--vocab_size', default=60000, help='Distinct words in the corpus')
+@click.option('--queries', default=2000, help='Timed queries')
+@click.option('--k', default=10, help='Top-k per query')
+def main_cli(chunks: int, words_per_chunk: int, vocab_size: int, queries: int, k: int):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        LexicalIndexBuilder().add_all(
+            synthesize_corpus(chunks, words_per_chunk, vocab_size)
+        ).write(directory)
+        click.echo(f"built index over {chunks} chunks in {time.perf_counter() - start:.2f} s")
+        index = LexicalIndex(directory)
+        timings = []
+        for _ in range(queries):
+            query = random.choice(QUERIES)
+            start = time.perf_counter()
+            index.search(query, k=k)
+            timings.append(time.perf_counter() - start)
+        p50, p95, p99 = np.percentile(np.asarray(timings) * 1000, [50, 95, 99])
+        click.echo(f"query latency ms: p50={p50:.3f} p95={p95:.3f} p99={p99:.3f}")
+
+
+if __name__ == "__main__":
+    main_cli()
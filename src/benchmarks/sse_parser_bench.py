@@ -0,0 +1,89 @@
+import json
+import re
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+import click
+
+from llm_common.sse import encode_sse_done, encode_sse_event, iter_chat_deltas
+
+
+def synthesize_stream(num_tokens: int, model: str = 'bench-model') -> bytes:
+    """Build a chat-completion SSE body shaped like the ones LM Studio / OpenAI stream back."""
+    frames = []
+    for i in range(num_tokens):
+        frames.append(encode_sse_event({
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion.chunk',
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'delta': {'role': 'assistant', 'content': f'tok{i} '},
+                'finish_reason': None,
+            }],
+        }))
+    frames.append(encode_sse_event({
+        'id': 'chatcmpl-bench',
+        'object': 'chat.completion.chunk',
+        'model': model,
+        'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+    }))
+    frames.append(encode_sse_done())
+    return b''.join(frames)
+
+
+def split_chunks(raw: bytes, chunk_size: int) -> List[bytes]:
+    return [raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)]
+
+
+def parse_incremental(chunks: Iterable[bytes]) -> int:
+    return sum(1 for delta in iter_chat_deltas(chunks) if delta.content)
+
+
+def parse_legacy_regex(chunks: Iterable[bytes]) -> int:
+    """The per-chunk regex match ``generate_response`` used before the incremental parser."""
+    tokens = 0
+    for chunk in chunks:
+        mobj = re.match("^data[:] ([{].+[}])$", chunk.decode('utf-8', errors='replace').strip())
+        if not mobj:
+            continue
+        try:
+            delta = json.loads(mobj.group(1))['choices'][0]['delta']
+        except json.JSONDecodeError:
+            continue
+        if delta.get('content'):
+            tokens += 1
+    return tokens
+
+
+def run(parse_func: Callable[[Iterable[bytes]], int], chunks: List[bytes], repeat: int):
+    best = float('inf')
+    tokens = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = parse_func(chunks)
+        best = min(best, time.perf_counter() - start)
+    return tokens, best
+
+
+@click.command()
+@click.option('--recording', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              default=None, help='Raw SSE body captured from /v1/chat/completions '
+                                 '(e.g. curl -N ... > stream.txt)')
+@click.option('--tokens', default=20000, help='Tokens to synthesize when no recording is given')
+@click.option('--chunk_size', default=1024, help='Transport chunk size to replay with')
+@click.option('--repeat', default=5, help='Runs per parser, best time is reported')
+def main_cli(recording: Optional[Path], tokens: int, chunk_size: int, repeat: int):
+    raw = recording.read_bytes() if recording is not None else synthesize_stream(tokens)
+    chunks = split_chunks(raw, chunk_size)
+    click.echo(f"stream: {len(raw)} bytes in {len(chunks)} chunks of {chunk_size} bytes")
+    for name, func in (('incremental', parse_incremental), ('legacy_regex', parse_legacy_regex)):
+        parsed, elapsed = run(func, chunks, repeat)
+        rate = parsed / elapsed if elapsed else float('inf')
+        click.echo(f"{name:>14}: {parsed:>8} tokens parsed in {elapsed * 1000:9.2f} ms "
+                   f"({rate:,.0f} tokens/sec)")
+
+
+if __name__ == "__main__":
+    main_cli()
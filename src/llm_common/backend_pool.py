@@ -0,0 +1,321 @@
+import itertools
+import threading
+from typing import (Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence,
+        Tuple)
+
+import requests
+
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+from llm_common.endpoints import LargeLanguageModelEndpoints
+from llm_common.sse import ChatCompletionDelta, aiter_chat_deltas, iter_chat_deltas
+from log.logger import logger
+from log.metrics import metrics
+
+# statuses meaning "not this server, not now" rather than "bad request"
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+BACKEND_FAILURES = metrics.counter(
+    'dnd_llm_backend_failures_total',
+    'LLM requests that failed on a backend and moved on to the next one if any was left.',
+    labels=('backend',),
+)
+BACKEND_EJECTIONS = metrics.counter(
+    'dnd_llm_backend_ejections_total',
+    'Times an LLM backend was taken out of rotation.',
+    labels=('backend',),
+)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class NoBackendAvailable(UpstreamError):
+    def __init__(self, model: str):
+        super().__init__(503, f"No LLM backend serves model '{model}'")
+
+
+class BackendPoolSettings(DnDAppBaseModel):
+    health_check_interval: float = 10.0
+    health_check_timeout: float = 2.0
+    # consecutive failures, of requests or health checks, that take a backend out of rotation
+    eject_after_failures: int = 2
+    # backends a request is tried on before its last error is returned
+    max_attempts: int = 3
+
+
+class LLMBackend:
+    """One model server: its endpoints, the models it last listed and its health."""
+
+    def __init__(self, endpoints: LargeLanguageModelEndpoints):
+        self.endpoints = endpoints
+        # None until its /models has been fetched; it is then assumed to serve anything
+        self.models: Optional[Tuple[str, ...]] = None
+        self.healthy = True
+        self.failures = 0
+        self.outstanding = 0
+
+    @property
+    def name(self) -> str:
+        return self.endpoints.base_url
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+
+class LLMBackendPool:
+    """Routes LLM requests over several model servers.
+
+    A request goes to a healthy backend whose ``/models`` list has the requested model, the one
+    with the fewest requests outstanding (ties rotate). A connection error or a retryable
+    status moves it on to the next backend, as does a stream that ends before its first token;
+    once tokens have been relayed, errors are the caller's. ``eject_after_failures`` failures in
+    a row take a backend out of rotation, and the next health check it passes puts it back.
+    Health checks refetch every backend's ``/models`` each ``health_check_interval`` seconds.
+    """
+
+    def __init__(self, endpoints: Sequence[LargeLanguageModelEndpoints],
+            settings: Optional[BackendPoolSettings] = None):
+        if not endpoints:
+            raise ValueError("An LLM backend pool needs at least one backend")
+        self._settings = settings if settings is not None else BackendPoolSettings()
+        self._backends = [LLMBackend(e) for e in endpoints]
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        # health checks get their own connections so they never wait behind streams for a slot
+        self._health_session = requests.Session()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def settings(self) -> BackendPoolSettings:
+        return self._settings
+
+    @property
+    def backends(self) -> List[LLMBackend]:
+        return list(self._backends)
+
+    def backend_count(self, model: str) -> int:
+        """Healthy backends serving ``model``."""
+        with self._lock:
+            return sum(1 for b in self._backends if b.healthy and b.serves(model))
+
+    def models(self) -> List[str]:
+        """Models of the healthy backends, in listing order, after a fresh health check."""
+        self.check_health()
+        with self._lock:
+            listed = [b.models for b in self._backends if b.healthy and b.models is not None]
+        if not listed:
+            raise UpstreamError(503, "No LLM backend answered /models")
+        return list(dict.fromkeys(model for models in listed for model in models))
+
+    def check_health(self):
+        for backend in self._backends:
+            try:
+                response = self._health_session.get(str(backend.endpoints.models),
+                        timeout=self._settings.health_check_timeout)
+                if response.status_code != 200:
+                    raise UpstreamError(response.status_code, response.text)
+                models = tuple(item['id'] for item in response.json()['data'])
+            except (requests.exceptions.RequestException, UpstreamError, ValueError,
+                    KeyError) as e:
+                self._record(backend, f"health check failed: {e}")
+                continue
+            with self._lock:
+                backend.models = models
+            self._record(backend, None)
+
+    def start_health_checks(self):
+        if self._health_thread is not None:
+            return
+        self._health_thread = threading.Thread(target=self._health_loop,
+                name='llm-health-check', daemon=True)
+        self._health_thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._health_session.close()
+        for backend in self._backends:
+            backend.endpoints.client.close()
+
+    async def aclose(self):
+        for backend in self._backends:
+            await backend.endpoints.async_client.aclose()
+
+    def post(self, endpoint: str, model: str, **kwargs) -> requests.Response:
+        """POST to ``endpoint``, a :class:`LargeLanguageModelEndpoints` property name such as
+        ``'embeddings'``, on a backend serving ``model``. A retryable status that every attempt
+        got is returned as the response; raises :class:`NoBackendAvailable`."""
+        tried: List[LLMBackend] = []
+        response: Optional[requests.Response] = None
+        error: Optional[Exception] = None
+        while len(tried) < self._settings.max_attempts:
+            backend = self._acquire(model, tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            try:
+                response = backend.endpoints.client.post(getattr(backend.endpoints, endpoint),
+                        **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+                self._release(backend, str(e))
+                continue
+            if response.status_code in RETRYABLE_STATUSES:
+                self._release(backend, f"HTTP {response.status_code}", response.status_code)
+                continue
+            self._release(backend, None)
+            return response
+        if response is not None:
+            return response
+        raise error if error is not None else NoBackendAvailable(model)
+
+    def stream_chat(self, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+            on_connected: Optional[Callable[[], None]] = None) -> Iterator[ChatCompletionDelta]:
+        """Stream a chat completion's deltas, failing over until the first token. Raises
+        :class:`UpstreamError` or the transport's ``RequestException``."""
+        model = payload['model']
+        tried: List[LLMBackend] = []
+        error: Optional[Exception] = None
+        while len(tried) < self._settings.max_attempts:
+            backend = self._acquire(model, tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            failure = None
+            status_code = None
+            streamed = False
+            try:
+                with backend.endpoints.client.stream('POST', backend.endpoints.chat_completions,
+                        headers=headers, json=payload) as response:
+                    if on_connected is not None:
+                        on_connected()
+                    if response.status_code != 200:
+                        error = UpstreamError(response.status_code, response.text)
+                        if response.status_code not in RETRYABLE_STATUSES:
+                            raise error
+                        failure = f"HTTP {response.status_code}"
+                        status_code = response.status_code
+                        continue
+                    for delta in iter_chat_deltas(response.iter_content(chunk_size=1024)):
+                        if not streamed and delta.done:
+                            error = UpstreamError(502, "stream ended before the first token")
+                            failure = error.text
+                            break
+                        streamed = streamed or not delta.is_terminal
+                        yield delta
+            except requests.exceptions.RequestException as e:
+                failure = str(e)
+                if streamed:
+                    raise
+                error = e
+            finally:
+                self._release(backend, failure, status_code)
+            if failure is None:
+                return
+        raise error if error is not None else NoBackendAvailable(model)
+
+    async def astream_chat(self, payload: Dict[str, Any],
+            headers: Optional[Dict[str, str]] = None,
+            on_connected: Optional[Callable[[], None]] = None
+            ) -> AsyncIterator[ChatCompletionDelta]:
+        """asyncio counterpart of :meth:`stream_chat`; raises ``httpx.HTTPError``."""
+        import httpx
+        model = payload['model']
+        tried: List[LLMBackend] = []
+        error: Optional[Exception] = None
+        while len(tried) < self._settings.max_attempts:
+            backend = self._acquire(model, tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            failure = None
+            status_code = None
+            streamed = False
+            try:
+                async with backend.endpoints.async_client.stream('POST',
+                        backend.endpoints.chat_completions, headers=headers,
+                        json=payload) as response:
+                    if on_connected is not None:
+                        on_connected()
+                    if response.status_code != 200:
+                        await response.aread()
+                        error = UpstreamError(response.status_code, response.text)
+                        if response.status_code not in RETRYABLE_STATUSES:
+                            raise error
+                        failure = f"HTTP {response.status_code}"
+                        status_code = response.status_code
+                        continue
+                    async for delta in aiter_chat_deltas(response.aiter_bytes()):
+                        if not streamed and delta.done:
+                            error = UpstreamError(502, "stream ended before the first token")
+                            failure = error.text
+                            break
+                        streamed = streamed or not delta.is_terminal
+                        yield delta
+            except httpx.HTTPError as e:
+                failure = str(e)
+                if streamed:
+                    raise
+                error = e
+            finally:
+                self._release(backend, failure, status_code)
+            if failure is None:
+                return
+        raise error if error is not None else NoBackendAvailable(model)
+
+    def _health_loop(self):
+        while not self._stop.wait(self._settings.health_check_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"LLM backend health check failed: {e}")
+
+    def _acquire(self, model: str, tried: List[LLMBackend]) -> Optional[LLMBackend]:
+        with self._lock:
+            serving = [b for b in self._backends if b.serves(model) and b not in tried]
+            candidates = [b for b in serving if b.healthy]
+            if not any(b.healthy for b in self._backends):
+                # with every backend ejected, trying one beats failing without a try
+                candidates = serving
+            if not candidates:
+                return None
+            fewest = min(b.outstanding for b in candidates)
+            tied = [b for b in candidates if b.outstanding == fewest]
+            backend = tied[next(self._rotation) % len(tied)]
+            backend.outstanding += 1
+            return backend
+
+    def _release(self, backend: LLMBackend, failure: Optional[str],
+            status_code: Optional[int] = None):
+        with self._lock:
+            backend.outstanding -= 1
+        if failure is not None:
+            BACKEND_FAILURES.inc(backend.name)
+        # a busy server is no sign of a broken one
+        if status_code != 429:
+            self._record(backend, failure)
+
+    def _record(self, backend: LLMBackend, failure: Optional[str]):
+        with self._lock:
+            if failure is None:
+                backend.failures = 0
+                reinstated, ejected = not backend.healthy, False
+                backend.healthy = True
+            else:
+                backend.failures += 1
+                reinstated = False
+                ejected = (backend.healthy
+                           and backend.failures >= self._settings.eject_after_failures)
+                if ejected:
+                    backend.healthy = False
+        if ejected:
+            BACKEND_EJECTIONS.inc(backend.name)
+            logger.warning(f"Ejected LLM backend {backend.name}: {failure}")
+        elif reinstated:
+            logger.info(f"Reinstated LLM backend {backend.name}")
+        elif failure is not None:
+            logger.warning(f"LLM backend {backend.name}: {failure}")
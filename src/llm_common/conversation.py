@@ -1,7 +1,8 @@
 import datetime
 import uuid
+from typing import Optional, Union
 
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Column, DateTime, Integer, String
 
 from app_db.decl_base import DeclarativeBaseDnDAppDB
 from dnd_pydantic_base.base_model import DnDAppBaseModel
@@ -14,17 +15,107 @@ class Conversation(DnDAppBaseModel):
     message_time: datetime.datetime
     conversation_sender: str
     conversation_content: str
+    token_count: Optional[int] = None
+
+
+class ConversationRecord:
+    """Plain row holder for hot read paths that don't need ORM hydration or validation."""
+    __slots__ = (
+        'session_id',
+        'persona_name',
+        'message_time',
+        'conversation_sender',
+        'conversation_content',
+        'token_count',
+    )
+
+    def __init__(
+        self,
+        session_id: uuid.UUID,
+        persona_name: str,
+        message_time: datetime.datetime,
+        conversation_sender: str,
+        conversation_content: str,
+        token_count: Optional[int],
+    ):
+        self.session_id = session_id
+        self.persona_name = persona_name
+        self.message_time = message_time
+        self.conversation_sender = conversation_sender
+        self.conversation_content = conversation_content
+        self.token_count = token_count
+
+    def __repr__(self):
+        parts = [f'{name}={getattr(self, name)}' for name in self.__slots__]
+        return f"<ConversationRecord({', '.join(parts)})>"
+
+
+ConversationTurn = Union[Conversation, ConversationRecord]
 
 
 class ConversationTable(DeclarativeBaseDnDAppDB):
     __tablename__ = 'conversations'
-    
+
+    # keyset pagination of (session, persona) history by time walks the primary key's index
     session_id = Column(UUIDType, nullable=False, primary_key=True)
     persona_name = Column(String, nullable=False, primary_key=True)
     message_time = Column(DateTime, nullable=False, primary_key=True)
     conversation_sender = Column(String, nullable=False, primary_key=True)
     conversation_content = Column(String, nullable=False)
+    token_count = Column(Integer, nullable=True)
     
     def __repr__(self):
         parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
         return f"<Conversation({', '.join(parts)})>"
+
+
+class ConversationSummary(DnDAppBaseModel):
+    session_id: uuid.UUID
+    persona_name: str
+    summarized_through: datetime.datetime
+    summary_text: str
+    token_count: int
+
+
+class ConversationSummaryTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'conversation_summaries'
+
+    session_id = Column(UUIDType, nullable=False, primary_key=True)
+    persona_name = Column(String, nullable=False, primary_key=True)
+    summarized_through = Column(DateTime, nullable=False)
+    summary_text = Column(String, nullable=False)
+    token_count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<ConversationSummary({', '.join(parts)})>"
+
+
+class ArchivedSession(DnDAppBaseModel):
+    """Where a session's turns went in the conversation archive: ``length`` compressed bytes at
+    ``offset`` of archive segment ``segment``."""
+    session_id: uuid.UUID
+    segment: str
+    offset: int
+    length: int
+    turn_count: int
+    raw_bytes: int
+    last_message_time: datetime.datetime
+    archived_at: datetime.datetime
+
+
+class ArchivedSessionTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'archived_sessions'
+
+    session_id = Column(UUIDType, nullable=False, primary_key=True)
+    segment = Column(String, nullable=False)
+    offset = Column(Integer, nullable=False)
+    length = Column(Integer, nullable=False)
+    turn_count = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)
+    last_message_time = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        parts = [f'{x.name}={getattr(self, x.name)}' for x in self.__table__.columns]
+        return f"<ArchivedSession({', '.join(parts)})>"
@@ -0,0 +1,28 @@
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+
+from app_db.decl_base import DeclarativeBaseDnDAppDB
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+
+class EmbeddingCacheEntry(DnDAppBaseModel):
+    cache_key: str
+    model: str
+    dim: int
+    vector: bytes
+    last_used: datetime.datetime
+
+
+class EmbeddingCacheTable(DeclarativeBaseDnDAppDB):
+    __tablename__ = 'embedding_cache'
+
+    cache_key = Column(String(64), nullable=False, primary_key=True)
+    model = Column(String, nullable=False)
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)
+    last_used = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return (f"<EmbeddingCacheEntry(cache_key={self.cache_key}, model={self.model}, "
+                f"dim={self.dim}, last_used={self.last_used})>")
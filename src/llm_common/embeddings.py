@@ -0,0 +1,129 @@
+import hashlib
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+from app_db.app_data_db import AppDataDB
+from llm_common.backend_pool import LLMBackendPool
+from llm_common.embedding_cache import EmbeddingCacheEntry
+from llm_common.tokens import count_tokens
+from log.logger import logger
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def embedding_cache_key(model: str, normalized_text: str) -> str:
+    return hashlib.sha256(f'{model}\0{normalized_text}'.encode('utf-8')).hexdigest()
+
+
+class EmbeddingService:
+    """Embeds text through the ``/embeddings`` endpoint, consulting a content-addressed cache
+    in the app DB first.
+
+    Texts are normalised, deduplicated by ``(model, normalised text)`` and only the misses are
+    sent upstream, packed into requests of at most ``batch_size`` inputs / ``max_batch_tokens``
+    estimated tokens with up to ``concurrency`` requests in flight. The cache keeps at most
+    ``max_cache_entries`` vectors, evicting the least recently used.
+    """
+
+    def __init__(
+        self,
+        backends: LLMBackendPool,
+        db: AppDataDB,
+        model: str,
+        batch_size: int = 64,
+        max_batch_tokens: int = 8192,
+        concurrency: int = 4,
+        max_cache_entries: int = 500_000,
+    ):
+        self._backends = backends
+        self._db = db
+        self._model = model
+        self._batch_size = batch_size
+        self._max_batch_tokens = max_batch_tokens
+        self._concurrency = concurrency
+        self._max_cache_entries = max_cache_entries
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        normalized = [normalize_text(t) for t in texts]
+        keys = [embedding_cache_key(self._model, t) for t in normalized]
+        unique: Dict[str, str] = dict(zip(keys, normalized))
+
+        vectors: Dict[str, np.ndarray] = {
+            key: np.frombuffer(blob, dtype=np.float32)
+            for key, blob in self._db.get_cached_embeddings(list(unique)).items()
+        }
+        if vectors:
+            self._db.touch_cached_embeddings(list(vectors))
+        missing = [key for key in unique if key not in vectors]
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(unique)} unique texts "
+                        f"({len(unique) - len(missing)} cached)")
+            vectors.update(self._embed_missing(missing, unique))
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), np.float32)
+
+    def _embed_missing(self, keys: List[str], texts: Dict[str, str]) -> Dict[str, np.ndarray]:
+        batches = list(self._pack_batches(keys, texts))
+        with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
+            results = list(executor.map(
+                lambda batch: self._request([texts[key] for key in batch]),
+                batches
+            ))
+        now = datetime.now()
+        vectors: Dict[str, np.ndarray] = {}
+        entries: List[EmbeddingCacheEntry] = []
+        for batch, batch_vectors in zip(batches, results):
+            for key, vector in zip(batch, batch_vectors):
+                vectors[key] = vector
+                entries.append(EmbeddingCacheEntry(
+                    cache_key=key,
+                    model=self._model,
+                    dim=vector.shape[0],
+                    vector=vector.tobytes(),
+                    last_used=now,
+                ))
+        self._db.put_cached_embeddings(entries)
+        self._db.evict_cached_embeddings(self._max_cache_entries)
+        return vectors
+
+    def _pack_batches(self, keys: List[str], texts: Dict[str, str]) -> Iterator[List[str]]:
+        batch: List[str] = []
+        batch_tokens = 0
+        for key in keys:
+            tokens = count_tokens(texts[key])
+            if batch and (len(batch) >= self._batch_size
+                          or batch_tokens + tokens > self._max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(key)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _request(self, inputs: List[str]) -> List[np.ndarray]:
+        response = self._backends.post(
+            'embeddings',
+            self._model,
+            json={'model': self._model, 'input': inputs}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Failed to fetch embeddings: {response.status_code} - {response.text}"
+            )
+        data = sorted(response.json()['data'], key=lambda item: item['index'])
+        return [np.asarray(item['embedding'], dtype=np.float32) for item in data]
@@ -1,27 +1,48 @@
+from typing import Optional
+
+from pydantic import PrivateAttr
 from urlpath import URL
 from dnd_pydantic_base.base_model import DnDAppBaseModel
+from llm_common.http_client import AsyncLLMHttpClient, HttpClientSettings, LLMHttpClient
 
 
 class LargeLanguageModelEndpoints(DnDAppBaseModel):
     base_url: str
     version_str: str
-    
+    http_settings: HttpClientSettings = HttpClientSettings()
+
+    _client: Optional[LLMHttpClient] = PrivateAttr(default=None)
+    _async_client: Optional[AsyncLLMHttpClient] = PrivateAttr(default=None)
+
+    @property
+    def client(self) -> LLMHttpClient:
+        if self._client is None:
+            self._client = LLMHttpClient(self.http_settings)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncLLMHttpClient:
+        # must first be touched from inside the event loop that will use it
+        if self._async_client is None:
+            self._async_client = AsyncLLMHttpClient(self.http_settings)
+        return self._async_client
+
     @property
     def base(self) -> URL:
         return URL(self.base_url) / self.version_str
-    
+
     @property
     def models(self) -> URL:
         return self.base / 'models'
-    
+
     @property
     def chat_completions(self) -> URL:
         return self.base / 'chat' / 'completions'
-    
+
     @property
     def completions(self) -> URL:
         return self.base / 'completions'
-    
+
     @property
     def embeddings(self) -> URL:
         return self.base / 'embeddings'
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class HttpClientSettings(DnDAppBaseModel):
+    pool_maxsize: int = 16
+    max_in_flight: int = 32
+    connect_timeout: float = 3.05
+    read_timeout: float = 300.0
+    connect_retries: int = 3
+    backoff_factor: float = 0.25
+    keep_alive_expiry: float = 60.0
+
+
+class LLMHttpClient:
+    """Keep-alive connection pool to a single LLM host.
+
+    Connect failures are retried with exponential backoff (nothing has reached the server yet,
+    so this is safe for POST as well). At most ``max_in_flight`` requests are outstanding at once;
+    callers block waiting for a slot rather than opening more sockets than the pool holds.
+    """
+
+    def __init__(self, settings: Optional[HttpClientSettings] = None):
+        self._settings = settings if settings is not None else HttpClientSettings()
+        self._slots = threading.BoundedSemaphore(self._settings.max_in_flight)
+        self._session = requests.Session()
+        retry = Retry(
+            total=None,
+            connect=self._settings.connect_retries,
+            read=0,
+            status=0,
+            other=0,
+            allowed_methods=None,
+            backoff_factor=self._settings.backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self._settings.pool_maxsize,
+            pool_block=True,
+            max_retries=retry,
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @property
+    def settings(self) -> HttpClientSettings:
+        return self._settings
+
+    @property
+    def timeout(self):
+        return self._settings.connect_timeout, self._settings.read_timeout
+
+    def request(self, method: str, url: Any, **kwargs) -> requests.Response:
+        """Send a request and read the whole body before giving the slot back."""
+        kwargs.pop('stream', None)
+        kwargs.setdefault('timeout', self.timeout)
+        with self._slots:
+            return self._session.request(method, str(url), **kwargs)
+
+    def get(self, url: Any, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: Any, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: Any, **kwargs) -> Iterator[requests.Response]:
+        """Streamed request; the in-flight slot and connection are held until the block exits."""
+        kwargs['stream'] = True
+        kwargs.setdefault('timeout', self.timeout)
+        with self._slots:
+            response = self._session.request(method, str(url), **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def close(self):
+        self._session.close()
+
+
+class AsyncLLMHttpClient:
+    """asyncio counterpart of :class:`LLMHttpClient` so streamed calls wait on a coroutine
+    instead of pinning a thread."""
+
+    def __init__(self, settings: Optional[HttpClientSettings] = None):
+        import httpx  # only the async server needs it, keep it off the threaded app's import
+        self._settings = settings if settings is not None else HttpClientSettings()
+        self._slots = asyncio.BoundedSemaphore(self._settings.max_in_flight)
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self._settings.pool_maxsize,
+                max_keepalive_connections=self._settings.pool_maxsize,
+                keepalive_expiry=self._settings.keep_alive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                self._settings.read_timeout,
+                connect=self._settings.connect_timeout,
+                pool=None,
+            ),
+            # httpx transports only retry ConnectError/ConnectTimeout, with backoff
+            transport=httpx.AsyncHTTPTransport(retries=self._settings.connect_retries),
+        )
+
+    @property
+    def settings(self) -> HttpClientSettings:
+        return self._settings
+
+    async def request(self, method: str, url: Any, **kwargs) -> 'httpx.Response':
+        async with self._slots:
+            return await self._client.request(method, str(url), **kwargs)
+
+    async def get(self, url: Any, **kwargs) -> 'httpx.Response':
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: Any, **kwargs) -> 'httpx.Response':
+        return await self.request('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: Any, **kwargs) -> AsyncIterator['httpx.Response']:
+        async with self._slots:
+            async with self._client.stream(method, str(url), **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        await self._client.aclose()
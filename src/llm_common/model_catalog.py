@@ -0,0 +1,115 @@
+import threading
+import time
+from typing import List, Optional
+
+from llm_common.backend_pool import LLMBackendPool
+from log.logger import logger
+
+
+class ModelCatalogUnavailable(RuntimeError):
+    pass
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[List[str]] = None
+        self.error: Optional[BaseException] = None
+
+
+class ModelCatalog:
+    """In-process cache of the models the LLM backends serve (their merged ``/models`` lists).
+
+    * within ``ttl`` seconds of the last successful fetch the cached list is served as-is
+    * after that and up to ``stale_ttl`` the stale list is served while one background refresh runs
+    * beyond ``stale_ttl`` callers wait for a refresh, but concurrent callers share a single
+      upstream fetch
+    * if the upstream is down, the last good list is served regardless of age
+    """
+
+    def __init__(
+        self,
+        backends: LLMBackendPool,
+        ttl: float = 30.0,
+        stale_ttl: float = 600.0,
+    ):
+        self._backends = backends
+        self._ttl = ttl
+        self._stale_ttl = max(stale_ttl, ttl)
+        self._lock = threading.Lock()
+        self._models: Optional[List[str]] = None
+        self._fetched_at = 0.0
+        self._failed_at = float('-inf')
+        self._flight: Optional[_Flight] = None
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._fetched_at = 0.0
+
+    def get_models(self) -> List[str]:
+        with self._lock:
+            models = self._models
+            now = time.monotonic()
+            age = now - self._fetched_at
+            recently_failed = now - self._failed_at < self._ttl
+        if models is not None and age < self._ttl:
+            return models
+        # right after a failed fetch don't make every caller wait on another doomed one
+        if models is not None and (age < self._stale_ttl or recently_failed):
+            self._refresh(wait=False)
+            return models
+        try:
+            return self._refresh(wait=True)
+        except Exception as e:
+            if models is not None:
+                logger.warning(f"Model list refresh failed, serving last good list: {e}")
+                return models
+            raise ModelCatalogUnavailable(f"Failed to fetch models: {e}") from e
+
+    def _refresh(self, wait: bool) -> Optional[List[str]]:
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+        if leader:
+            if wait:
+                self._run_flight(flight)
+            else:
+                threading.Thread(
+                    target=self._run_flight,
+                    args=(flight,),
+                    name='model-catalog-refresh',
+                    daemon=True,
+                ).start()
+        if not wait:
+            return None
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _run_flight(self, flight: _Flight):
+        try:
+            flight.result = self._fetch()
+            with self._lock:
+                self._models = flight.result
+                self._fetched_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Failed to refresh model list: {e}")
+            flight.error = e
+            with self._lock:
+                self._failed_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def _fetch(self) -> List[str]:
+        return self._backends.models()
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app_db.app_data_db import AppDataDB, PERSONA_REGISTRY
+from llm_common.persona import Persona
+from log.logger import logger
+
+
+class PersonaRegistry:
+    """All personas held in memory, loaded once and served without touching the DB.
+
+    Writes go through :meth:`upsert`, which writes to the DB and, once that committed, updates
+    the local copy. Other worker processes notice through the ``personas`` counter in
+    ``registry_versions``, which every persona write bumps; each process polls that single row
+    at most once per ``check_interval`` seconds and reloads only when it moved.
+    """
+
+    def __init__(self, db: AppDataDB, check_interval: float = 2.0):
+        self._db = db
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._personas: Optional[Dict[str, Persona]] = None
+        self._version = -1
+        self._checked_at = 0.0
+
+    def _current(self) -> Dict[str, Persona]:
+        now = time.monotonic()
+        personas = self._personas
+        if personas is not None and now - self._checked_at < self._check_interval:
+            return personas
+        with self._lock:
+            if self._personas is not None and now - self._checked_at < self._check_interval:
+                return self._personas
+            version = self._db.get_registry_version(PERSONA_REGISTRY)
+            if self._personas is None or version != self._version:
+                self._personas = {p.name: p for p in self._db.get_personas()}
+                self._version = version
+                logger.info(f"Loaded {len(self._personas)} personas (version {version})")
+            self._checked_at = now
+            return self._personas
+
+    def get(self, name: str) -> Optional[Persona]:
+        return self._current().get(name)
+
+    def contains(self, name: str) -> bool:
+        return name in self._current()
+
+    def all(self) -> List[Persona]:
+        return list(self._current().values())
+
+    def upsert(self, persona: Persona) -> bool:
+        """False, leaving the local copy alone, if the DB write failed."""
+        if not self._db.upsert_persona(persona):
+            return False
+        with self._lock:
+            if self._personas is not None:
+                self._personas = {**self._personas, persona.name: persona}
+            # pick up our own bump (and any concurrent ones) on the next lookup
+            self._checked_at = 0.0
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+            self._version = -1
@@ -0,0 +1,278 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, suppress
+from typing import AsyncIterator, Callable, Deque, Dict, Hashable, Iterator, Optional
+
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+from log.metrics import CHAT_STAGE_SECONDS, metrics
+
+# lower runs first
+INTERACTIVE_PRIORITY = 0
+BACKGROUND_PRIORITY = 10
+
+SCHEDULER_REJECTIONS = metrics.counter(
+    'dnd_llm_scheduler_rejections_total',
+    'LLM requests turned away by the scheduler, by reason.',
+    labels=('reason',),
+)
+
+
+class SchedulerRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM scheduler busy ({reason}); retry after {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class SchedulerSettings(DnDAppBaseModel):
+    # per backend serving the model
+    max_concurrent_per_model: int = 4
+    # overrides of the cap for particular models, also per backend
+    model_concurrency: Dict[str, int] = {}
+    # waiting requests per model beyond which new ones are rejected
+    max_queue_depth: int = 64
+    max_queued_per_session: int = 2
+    # seconds a request may wait; also the bound on the estimated wait at admission
+    max_wait: float = 60.0
+    position_interval: float = 0.5
+
+
+class Ticket:
+    """One request's place in the scheduler: queued, then running once admitted, then done.
+
+    Iterate :meth:`positions` (or :meth:`apositions`) to wait for admission; they yield the
+    1-based queue position whenever it changes and raise :class:`SchedulerRejected` once the
+    wait exceeds ``max_wait``. :meth:`release` must be called in every case.
+    """
+
+    def __init__(self, scheduler: 'LLMScheduler', model: str, session_key: Hashable,
+            priority: int):
+        self.model = model
+        self.session_key = session_key
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.admitted_at: Optional[float] = None
+        self.state = 'queued'
+        self._scheduler = scheduler
+        self._admitted = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_admitted: Optional[asyncio.Event] = None
+
+    @property
+    def admitted(self) -> bool:
+        return self._admitted.is_set()
+
+    def _notify(self):
+        # called with the scheduler lock held
+        self._admitted.set()
+        if self._loop is not None:
+            # a closed loop means the waiting request is gone; nothing left to wake
+            with suppress(RuntimeError):
+                self._loop.call_soon_threadsafe(self._async_admitted.set)
+
+    def positions(self) -> Iterator[int]:
+        settings = self._scheduler.settings
+        deadline = self.enqueued_at + settings.max_wait
+        last = None
+        while not self._admitted.is_set():
+            position = self._scheduler.position(self)
+            if position and position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and self._scheduler.expire(self):
+                raise SchedulerRejected('wait_timeout', self._scheduler.retry_after(self.model))
+            self._admitted.wait(max(0.0, min(settings.position_interval, remaining)))
+
+    async def apositions(self) -> AsyncIterator[int]:
+        settings = self._scheduler.settings
+        self._async_admitted = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        deadline = self.enqueued_at + settings.max_wait
+        last = None
+        while not self._admitted.is_set():
+            position = self._scheduler.position(self)
+            if position and position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and self._scheduler.expire(self):
+                raise SchedulerRejected('wait_timeout', self._scheduler.retry_after(self.model))
+            try:
+                await asyncio.wait_for(self._async_admitted.wait(),
+                        max(0.0, min(settings.position_interval, remaining)))
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, used: bool = True):
+        """Idempotent; ``used=False`` for a request answered without the model, whose hold time
+        says nothing about how long requests take."""
+        self._scheduler.release(self, used)
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM servers.
+
+    At most ``max_concurrent_per_model`` requests per model run at once; the rest wait in a
+    queue per model. The lowest priority value goes first, and within a priority sessions take
+    turns, so one player sending several messages can't starve the table. Requests are turned
+    away with a retry hint, rather than queued, when the queue is full, the session already has
+    ``max_queued_per_session`` waiting, or the wait estimated from recent request durations
+    exceeds ``max_wait``. With ``backend_count``, the cap is multiplied by the number of
+    healthy backends serving the model.
+    """
+
+    def __init__(self, settings: Optional[SchedulerSettings] = None,
+            backend_count: Optional[Callable[[str], int]] = None):
+        self._settings = settings if settings is not None else SchedulerSettings()
+        self._backend_count = backend_count
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {}
+        # model -> priority -> session -> waiting tickets, sessions in round-robin order
+        self._queues: Dict[str, Dict[int, 'OrderedDict[Hashable, Deque[Ticket]]']] = {}
+        # model -> moving average of seconds a request holds its slot
+        self._service_seconds: Dict[str, float] = {}
+
+    @property
+    def settings(self) -> SchedulerSettings:
+        return self._settings
+
+    def capacity(self, model: str) -> int:
+        per_backend = self._settings.model_concurrency.get(model,
+                self._settings.max_concurrent_per_model)
+        if self._backend_count is None:
+            return per_backend
+        return per_backend * max(1, self._backend_count(model))
+
+    def enqueue(self, model: str, session_id: Optional[Hashable] = None,
+            priority: int = INTERACTIVE_PRIORITY) -> Ticket:
+        """Queue a request, admitting it at once if a slot is free. Raises
+        :class:`SchedulerRejected`."""
+        session_key = session_id if session_id is not None else object()
+        with self._lock:
+            self._check(model, session_id)
+            ticket = Ticket(self, model, session_key, priority)
+            sessions = self._queues.setdefault(model, {}).setdefault(priority, OrderedDict())
+            sessions.setdefault(session_key, deque()).append(ticket)
+            self._dispatch(model)
+        return ticket
+
+    @contextmanager
+    def slot(self, model: str, session_id: Optional[Hashable] = None,
+            priority: int = INTERACTIVE_PRIORITY) -> Iterator[Ticket]:
+        """Block until admitted and hold the slot for the ``with`` block."""
+        ticket = self.enqueue(model, session_id, priority)
+        try:
+            for _ in ticket.positions():
+                pass
+            yield ticket
+        finally:
+            ticket.release()
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the order queued tickets will be admitted; 0 once admitted."""
+        with self._lock:
+            if ticket.state != 'queued':
+                return 0
+            ahead = 0
+            levels = self._queues.get(ticket.model, {})
+            for priority, sessions in levels.items():
+                if priority < ticket.priority:
+                    ahead += sum(len(waiting) for waiting in sessions.values())
+            sessions = levels[ticket.priority]
+            own = sessions[ticket.session_key]
+            index = own.index(ticket)
+            before_in_rotation = True
+            for session_key, waiting in sessions.items():
+                if session_key == ticket.session_key:
+                    before_in_rotation = False
+                    continue
+                # round robin: every session earlier in the rotation gets one more turn
+                ahead += min(len(waiting), index + (1 if before_in_rotation else 0))
+            return ahead + index + 1
+
+    def expire(self, ticket: Ticket) -> bool:
+        """Drop a ticket that waited too long; False if it was admitted in the meantime."""
+        with self._lock:
+            if ticket.state != 'queued':
+                return False
+            self._remove(ticket)
+            ticket.state = 'done'
+        SCHEDULER_REJECTIONS.inc('wait_timeout')
+        return True
+
+    def release(self, ticket: Ticket, used: bool = True):
+        """Give the ticket's slot back, or leave the queue if it was never admitted."""
+        with self._lock:
+            if ticket.state == 'queued':
+                self._remove(ticket)
+            elif ticket.state == 'running':
+                self._running[ticket.model] -= 1
+                if used:
+                    held = time.monotonic() - ticket.admitted_at
+                    previous = self._service_seconds.get(ticket.model)
+                    self._service_seconds[ticket.model] = (
+                        held if previous is None else 0.8 * previous + 0.2 * held)
+                self._dispatch(ticket.model)
+            ticket.state = 'done'
+
+    def retry_after(self, model: str) -> int:
+        with self._lock:
+            return self._retry_after(model)
+
+    def _queued(self, model: str) -> int:
+        return sum(len(waiting) for sessions in self._queues.get(model, {}).values()
+                   for waiting in sessions.values())
+
+    def _estimated_wait(self, model: str) -> float:
+        """Seconds a request queued now would wait, from how long slots have been held."""
+        if self._running.get(model, 0) < self.capacity(model) and not self._queued(model):
+            return 0.0
+        rounds = math.ceil((self._queued(model) + 1) / self.capacity(model))
+        return rounds * self._service_seconds.get(model, 0.0)
+
+    def _retry_after(self, model: str) -> int:
+        return max(1, math.ceil(self._estimated_wait(model)))
+
+    def _check(self, model: str, session_id: Optional[Hashable]):
+        reason = None
+        if self._queued(model) >= self._settings.max_queue_depth:
+            reason = 'queue_full'
+        elif session_id is not None and sum(
+            len(sessions.get(session_id, ())) for sessions in self._queues.get(model, {}).values()
+        ) >= self._settings.max_queued_per_session:
+            reason = 'session_queue_full'
+        elif self._estimated_wait(model) > self._settings.max_wait:
+            reason = 'wait_too_long'
+        if reason is not None:
+            SCHEDULER_REJECTIONS.inc(reason)
+            raise SchedulerRejected(reason, self._retry_after(model))
+
+    def _remove(self, ticket: Ticket):
+        sessions = self._queues[ticket.model][ticket.priority]
+        waiting = sessions[ticket.session_key]
+        waiting.remove(ticket)
+        if not waiting:
+            del sessions[ticket.session_key]
+
+    def _dispatch(self, model: str):
+        levels = self._queues.get(model, {})
+        while self._running.get(model, 0) < self.capacity(model):
+            pending = [priority for priority, sessions in levels.items() if sessions]
+            if not pending:
+                return
+            sessions = levels[min(pending)]
+            session_key, waiting = next(iter(sessions.items()))
+            ticket = waiting.popleft()
+            if waiting:
+                sessions.move_to_end(session_key)
+            else:
+                del sessions[session_key]
+            ticket.state = 'running'
+            ticket.admitted_at = time.monotonic()
+            self._running[model] = self._running.get(model, 0) + 1
+            CHAT_STAGE_SECONDS.observe(ticket.admitted_at - ticket.enqueued_at, 'queue_wait')
+            ticket._notify()
@@ -0,0 +1,72 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from app_db.app_data_db import AppDataDB
+from llm_common.session_settings import SessionSettings
+
+
+def default_session_settings(session_id: uuid.UUID) -> SessionSettings:
+    return SessionSettings(
+        session_id=session_id,
+        selected_persona_name=None,
+        custom_mode_model='',
+        custom_mode_system_prompt='',
+    )
+
+
+class SessionSettingsStore:
+    """Per-session settings behind an in-memory LRU of at most ``max_entries`` sessions.
+
+    Settings are loaded from the app DB on first use and written through on every change. A
+    session that never changed anything is never written, so first visits cost no write.
+    """
+
+    def __init__(self, db: AppDataDB, max_entries: int = 10_000):
+        self._db = db
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[uuid.UUID, SessionSettings]' = OrderedDict()
+
+    def get(self, session_id: uuid.UUID) -> SessionSettings:
+        with self._lock:
+            settings = self._cache.get(session_id)
+            if settings is not None:
+                self._cache.move_to_end(session_id)
+                return settings
+        settings = self._db.get_session_settings(session_id)
+        if settings is None:
+            settings = default_session_settings(session_id)
+        self._remember(settings)
+        return settings
+
+    def update(
+        self,
+        session_id: uuid.UUID,
+        selected_persona_name: Optional[str] = None,
+        custom_mode_model: Optional[str] = None,
+        custom_mode_system_prompt: Optional[str] = None,
+    ) -> SessionSettings:
+        """Change the given fields; a no-op change skips the write."""
+        current = self.get(session_id)
+        changes = {
+            name: value for name, value in (
+                ('selected_persona_name', selected_persona_name),
+                ('custom_mode_model', custom_mode_model),
+                ('custom_mode_system_prompt', custom_mode_system_prompt),
+            ) if value is not None and getattr(current, name) != value
+        }
+        if not changes:
+            return current
+        settings = current.model_copy(update=changes)
+        self._db.upsert_session_settings(settings)
+        self._remember(settings)
+        return settings
+
+    def _remember(self, settings: SessionSettings):
+        with self._lock:
+            self._cache[settings.session_id] = settings
+            self._cache.move_to_end(settings.session_id)
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,168 @@
+import json
+from typing import (Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple,
+        Optional, Union)
+
+from log.logger import logger
+
+SSE_DONE_PAYLOAD = b'[DONE]'
+
+
+class ChatCompletionDelta(NamedTuple):
+    role: Optional[str]
+    content: str
+    finish_reason: Optional[str]
+    done: bool = False
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.done or (self.finish_reason is not None and not self.content)
+
+
+class SSEStreamParser:
+    """Incremental parser for a ``text/event-stream`` body.
+
+    Bytes are fed in whatever chunks the transport hands over; complete event payloads (the
+    joined ``data:`` lines of an event) are yielded as soon as their terminating blank line
+    arrives. Partial lines stay buffered between calls and only newly received bytes are
+    scanned for line breaks.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._data_lines: List[bytes] = []
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        if not chunk or self._done:
+            return
+        self._buffer += chunk
+        start = 0
+        while True:
+            end = self._buffer.find(b'\n', self._scan_from)
+            if end < 0:
+                break
+            line = bytes(self._buffer[start:end])
+            start = self._scan_from = end + 1
+            payload = self._process_line(line.rstrip(b'\r'))
+            if payload is not None:
+                yield payload
+                if self._done:
+                    break
+        if start:
+            del self._buffer[:start]
+        self._scan_from = len(self._buffer)
+
+    def close(self) -> Iterator[bytes]:
+        """Flush a trailing event that was not terminated by a blank line."""
+        if self._done:
+            return
+        if self._buffer:
+            line = bytes(self._buffer).rstrip(b'\r')
+            self._buffer.clear()
+            self._scan_from = 0
+            payload = self._process_line(line)
+            if payload is not None:
+                yield payload
+        payload = self._dispatch()
+        if payload is not None:
+            yield payload
+
+    def _process_line(self, line: bytes) -> Optional[bytes]:
+        if not line:
+            return self._dispatch()
+        if line[0] == 0x3A:  # ':' comment / keep-alive
+            return None
+        field, sep, value = line.partition(b':')
+        if field != b'data':
+            # event/id/retry fields carry nothing the chat stream needs
+            return None
+        if sep and value[:1] == b' ':
+            value = value[1:]
+        self._data_lines.append(value)
+        return None
+
+    def _dispatch(self) -> Optional[bytes]:
+        if not self._data_lines:
+            return None
+        if len(self._data_lines) == 1:
+            payload = self._data_lines[0]
+        else:
+            payload = b'\n'.join(self._data_lines)
+        self._data_lines = []
+        if payload.strip() == SSE_DONE_PAYLOAD:
+            self._done = True
+        return payload
+
+
+def parse_chat_completion_payload(payload: Dict[str, Any]) -> Optional[ChatCompletionDelta]:
+    choices = payload.get('choices')
+    if not choices:
+        return None
+    choice = choices[0]
+    delta = choice.get('delta') or {}
+    return ChatCompletionDelta(
+        role=delta.get('role'),
+        content=delta.get('content') or '',
+        finish_reason=choice.get('finish_reason'),
+    )
+
+
+def _parse_payloads(parser: SSEStreamParser,
+                    payloads: Iterable[bytes]) -> Iterator[ChatCompletionDelta]:
+    for payload in payloads:
+        if parser.done:
+            return
+        try:
+            parsed = parse_chat_completion_payload(json.loads(payload))
+        except (json.JSONDecodeError, AttributeError, IndexError) as e:
+            logger.error(f"Failed to parse stream event: {payload!r} exception: {e}")
+            continue
+        if parsed is not None:
+            yield parsed
+
+
+def iter_chat_deltas(chunks: Iterable[bytes]) -> Iterator[ChatCompletionDelta]:
+    """Turn the raw byte chunks of a streamed chat completion into parsed deltas.
+
+    The final delta always has ``done`` set, whether the upstream sent ``[DONE]`` or simply
+    closed the connection.
+    """
+    parser = SSEStreamParser()
+    for chunk in chunks:
+        yield from _parse_payloads(parser, parser.feed(chunk))
+        if parser.done:
+            break
+    else:
+        yield from _parse_payloads(parser, parser.close())
+    yield ChatCompletionDelta(role=None, content='', finish_reason=None, done=True)
+
+
+async def aiter_chat_deltas(chunks: AsyncIterable[bytes]) -> AsyncIterator[ChatCompletionDelta]:
+    """:func:`iter_chat_deltas` for an async byte stream such as ``httpx``'s ``aiter_bytes``."""
+    parser = SSEStreamParser()
+    async for chunk in chunks:
+        for delta in _parse_payloads(parser, parser.feed(chunk)):
+            yield delta
+        if parser.done:
+            break
+    else:
+        for delta in _parse_payloads(parser, parser.close()):
+            yield delta
+    yield ChatCompletionDelta(role=None, content='', finish_reason=None, done=True)
+
+
+def encode_sse_event(payload: Union[Dict[str, Any], bytes, str]) -> bytes:
+    if isinstance(payload, dict):
+        payload = json.dumps(payload)
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return b'data: ' + payload + b'\n\n'
+
+
+def encode_sse_done() -> bytes:
+    return encode_sse_event(SSE_DONE_PAYLOAD)
@@ -0,0 +1,14 @@
+import re
+
+# words and numbers, or single other non-space characters; spaces fold into the next token
+_PIECES = re.compile(r'[^\W_]+|[^\w\s]|_')
+
+
+def count_tokens(text: str) -> int:
+    """Approximate BPE token count, the same in every environment.
+
+    Served models bring their own tokenizers, so an exact count would need one per model; this
+    tracks cl100k-style tokenizers closely enough for budgeting: a word of up to 6 characters
+    is one token and longer ones split every 5, punctuation is one token each.
+    """
+    return sum(1 + max(0, len(piece) - 2) // 5 for piece in _PIECES.findall(text))
@@ -1,21 +1,53 @@
+import os
 import uuid
-from typing import Any, Optional, Type
+from typing import Any, Optional, Type, Union
 
 from sqlalchemy import CHAR, Dialect, TypeDecorator
 
+# store UUIDs as 16-byte BLOBs rather than 36-character strings, less than half the key size in
+# every row and index page; an existing database has to be converted first, with
+# ``python -m app_db.compact_conversations --uuid_storage blob``
+_uuid_as_blob = os.environ.get('DND_APP_DB_UUID_BLOB', '').lower() in {'1', 'true', 'yes'}
+
+
+def uuid_as_blob() -> bool:
+    return _uuid_as_blob
+
+
+def set_uuid_as_blob(as_blob: bool):
+    """Switch how this process binds UUIDs, e.g. right after converting the database."""
+    global _uuid_as_blob
+    _uuid_as_blob = as_blob
+
+
+def uuid_db_value(value: Union[uuid.UUID, str, bytes], as_blob: Optional[bool] = None
+        ) -> Union[str, bytes]:
+    if as_blob is None:
+        as_blob = _uuid_as_blob
+    if isinstance(value, bytes):
+        value = uuid.UUID(bytes=value)
+    elif not isinstance(value, uuid.UUID):
+        value = uuid.UUID(value)
+    return value.bytes if as_blob else str(value)
+
 
 class UUIDType(TypeDecorator):
+    # the declared type stays CHAR(36) either way: SQLite keeps bound bytes as BLOBs regardless
     impl = CHAR(36)
+    cache_ok = True
     
-    def process_bind_param(self, value: Optional[Any], dialect: Dialect) -> Optional[str]:
+    def process_bind_param(self, value: Optional[Any],
+            dialect: Dialect) -> Optional[Union[str, bytes]]:
         if value is None:
             return None
-        return str(value) if isinstance(value, uuid.UUID) else str(uuid.UUID(value))
+        return uuid_db_value(value)
     
-    def process_result_value(self, value: Optional[str], dialect: Dialect) -> Optional[uuid.UUID]:
+    def process_result_value(self, value: Optional[Union[str, bytes]],
+            dialect: Dialect) -> Optional[uuid.UUID]:
         if value is None:
             return None
-        return uuid.UUID(value)
+        # both storages read back, so rows a conversion hasn't reached yet still load
+        return uuid.UUID(bytes=value) if isinstance(value, bytes) else uuid.UUID(value)
     
     def process_literal_param(self, value: Optional[uuid.UUID], dialect: Dialect) -> Optional[str]:
         if value is None:
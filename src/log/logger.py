@@ -1,8 +1,19 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Adjust logging level as needed
+# Adjust logging level as needed
+logger.setLevel(os.environ.get('DND_APP_LOG_LEVEL', 'DEBUG').upper())
 handler = logging.StreamHandler()
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+# callers only enqueue the record; a listener thread does the formatting and the (possibly slow)
+# console write, so logging never stalls a request or a streaming response
+log_queue: queue.Queue = queue.Queue(-1)
+listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+listener.start()
+atexit.register(listener.stop)
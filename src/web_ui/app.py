@@ -1,42 +1,27 @@
 from datetime import datetime
 
 import flask
-import re
 import requests
-from requests import Response
-from typing import List, Union
+from contextlib import closing
+from typing import List, Optional
 import json
 
 import click
 from flask import Flask, render_template, request, jsonify, session
-from flask_session import Session
+import os
 import uuid
-from flask_sqlalchemy import SQLAlchemy
 
 
-from llm_common.endpoints import  LargeLanguageModelEndpoints
-from app_db.app_data_db import app_db
-from llm_common.persona import Persona
-from llm_common.conversation import Conversation
+from backend.chat_app.chat_events import (TurnTimer, answer_events, chat_event, delta_event,
+        parse_history_cursor, persona_listing, queue_event, rejection_body, session_id_from)
+from llm_common.backend_pool import UpstreamError
+from llm_common.model_catalog import ModelCatalogUnavailable
+from llm_common.scheduler import SchedulerRejected
 from log.logger import logger
+from log.metrics import PROMETHEUS_CONTENT_TYPE, metrics, span
+from web_ui.services import AppServices, WebAppSettings
 
 
-# app_db = AppDataDB()
-
-app = Flask(__name__)
-
-app.secret_key = 'your_secret_key'  # Required for sessions
-
-# Set up SQLAlchemy for SQLite
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///flask.db'
-db = SQLAlchemy(app)
-
-app.config['SESSION_TYPE'] = 'sqlalchemy'
-app.config['SESSION_SQLALCHEMY'] = db  # SQLite session storage
-app.config['SESSION_PERMANENT'] = False  # Set permanent session (optional)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-Session(app)
-
 def show_request():
     # Dictionary to hold all received data
     received_data = {"method": request.method, "headers": dict(request.headers),
@@ -49,208 +34,308 @@ def show_request():
     logger.info(jsonify(received_data))
 
 
-def get_model_list() -> Union[List[str], Response]:
-    llm_endpoints: LargeLanguageModelEndpoints = globals()['llm_endpoints']
-    models_path = llm_endpoints.models
-    endpoint_response = models_path.get()
-    if endpoint_response.status_code == 200:
-        models = endpoint_response.json()
-    else:
-        return jsonify(
-                {
-                "error": f"Failed to fetch models: {endpoint_response.status_code} - {endpoint_response.text}"
-                }
-        )
-    results = []
-    for item in models['data']:
-        results.append(item['id'])
-    return results
+def rejected_response(rejection: SchedulerRejected):
+    body, headers = rejection_body(rejection)
+    return jsonify(body), 429, headers
 
 
 def check_session() -> uuid.UUID:
-    if 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())
-    logger.info(f"session id: {session['session_id']}")
-    return session['session_id']
+    return session_id_from(session)
 
-@app.route('/')
-def index():
-    session_id = check_session()
-    model_list = get_model_list()
-    conv_hist = app_db.get_conversation_history(
-            session_id=session_id,
-            persona_name='FeyCreature'
-    )
-    # use conv hist to pre-populate chat
-    return render_template('index.html', models=model_list)
 
-@app.route('/list_models')
-def list_models():
-    model_list = get_model_list()
-    return jsonify(model_list)
+def create_app(services: AppServices, secret_key: Optional[str] = None) -> Flask:
+    """The threaded Flask app. Creating it builds none of ``services``; each route builds what
+    it uses the first time it runs, unless :meth:`AppServices.warm_up` got there first."""
+    app = Flask(__name__)
+    # Required for sessions
+    app.secret_key = (secret_key if secret_key is not None
+                      else os.environ.get('DND_APP_SECRET_KEY', 'your_secret_key'))
+    # the signed session cookie carries only the session id; settings live in the app DB
+    app.config['SESSION_PERMANENT'] = False
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-@app.route('/submit', methods=['POST'])
-def submit():
-    session_id = check_session()
-    conv_hist = app_db.get_conversation_history(
-            session_id=session_id,
-            persona_name='FeyCreature'
-    )
-    llm_endpoints: LargeLanguageModelEndpoints = globals()['llm_endpoints']
-    data = request.get_json()
-    logger.info(f"FORM DATA RECEIVED:\n{data}\n")
-    
-    if not app_db.contains_persona('FeyCreature'):
-        from app_db.init_db import init_db
-        init_db()
-    default_persona = app_db.fetch_persona('FeyCreature')
-    
-    selected_model = data['model']
-    chat_input = data['chat_input']
-    
-    headers = {'Content-Type': 'application/json'}
-    user_timestamp = datetime.now()
-    user_conv_item = Conversation(
-        session_id=session_id,
-        persona_name='FeyCreature',
-        message_time=user_timestamp,
-        conversation_sender='user',
-        conversation_content=chat_input
-    )
-    app_db.upsert_conversation_entry(user_conv_item)
-    data = {
-            "model": selected_model, "messages": [
-                {
-                        "role": "system",
-                        "content": default_persona.system_prompt
-                },
+    @app.teardown_appcontext
+    def release_db_session(exception=None):
+        services.remove_db_session()
+
+    @app.route('/')
+    def index():
+        check_session()
+        try:
+            model_list = services.model_catalog.get_models()
+        except ModelCatalogUnavailable as e:
+            logger.error(e)
+            model_list = []
+        # chat history is fetched page by page by the UI through /conversation_history
+        return render_template('index.html', models=model_list)
+
+    @app.route('/conversation_history')
+    def conversation_history():
+        session_id = check_session()
+        chat_service = services.chat_service
+        # imported with the service, off the worker's import path
+        from backend.chat_app.chat_service import DEFAULT_HISTORY_PAGE_SIZE
+        limit = request.args.get('limit', DEFAULT_HISTORY_PAGE_SIZE, type=int)
+        try:
+            before = parse_history_cursor(request.args.get('before'))
+        except ValueError:
+            return (jsonify({"error": f"Invalid history cursor: {request.args.get('before')}"}),
+                    400)
+        records, next_cursor = chat_service.history_page(session_id, limit, before)
+        return jsonify({
+            'messages': [
                 {
-                        "role": "user",
-                        "content": chat_input
+                    'sender': record.conversation_sender,
+                    'content': record.conversation_content,
+                    'message_time': record.message_time.isoformat(),
                 }
+                for record in records
             ],
-            "temperature": 0.7,
-            "max_tokens": -1,
-            "stream": True
-    }
-    persona_timestamp = datetime.now()
-    persona_conversation_item = Conversation(
-        session_id=session_id,
-        persona_name='FeyCreature',
-        message_time=user_timestamp,
-        conversation_sender='llm',
-        conversation_content=''
-    )
-    def generate_response() -> str:
+            'next_cursor': next_cursor,
+        })
+
+    @app.route('/list_models')
+    def list_models():
         try:
-            generated_response = llm_endpoints.chat_completions.post(
-                headers=headers,
-                json=data,
-                stream=True
-            )
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error during streaming: {e}")
-            return json.dumps({'role_name': 'system',
-                    'text_content': f"An error occurred during the stream: {str(e)}",
-                    'streaming_complete': True})
-        if generated_response.status_code == 200:
-            # response_data = generated_response.json()
-            for chunk in generated_response.iter_content(chunk_size=1024): #type: bytes
-                if chunk:
-                    raw_response_data = chunk.decode("utf-8")
-                    # logger.debug(f"'{raw_response_data}'")
-                    mobj = re.match("^data[:] ([{].+[}])$", raw_response_data.strip())
-                    if not mobj:
-                        logger.error(f"Failed to parse generated_response: {raw_response_data}")
-                        continue
-                    json_part = mobj.group(1)
-                    # logger.debug(json_part)
+            model_list = services.model_catalog.get_models()
+        except ModelCatalogUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        return jsonify(model_list)
+
+    @app.route('/submit', methods=['POST'])
+    def submit():
+        timer = TurnTimer()
+        with span('session_lookup'):
+            session_id = check_session()
+        llm_backends = services.llm_backends
+        chat_service = services.chat_service
+        llm_scheduler = services.llm_scheduler
+        data = request.get_json()
+        logger.info(f"FORM DATA RECEIVED:\n{data}\n")
+        try:
+            # admitted before the user message is recorded, so a turned away request leaves no
+            # unanswered message behind, and the client's retry doesn't record it twice
+            ticket = llm_scheduler.enqueue(data['model'], session_id)
+        except SchedulerRejected as e:
+            timer.finished('rejected')
+            return rejected_response(e)
+        streaming = False
+        try:
+            turn = chat_service.prepare_turn(session_id, data['model'], data['chat_input'])
+            if turn.answer is not None:
+                ticket.release(used=False)
+                timer.token()
+                timer.finished(turn.answer_source)
+                chat_service.finish_turn(turn, [turn.answer], turn.answer_source)
+                return flask.Response(
+                    answer_events(turn.answer),
+                    mimetype='application/json',
+                    content_type='application/json'
+                )
+            headers = {'Content-Type': 'application/json'}
+
+            def generate_response() -> str:
+                response_parts = []
+                outcome = 'ok'
+                try:
                     try:
-                        response_data = json.loads(json_part)
-                        # logger.debug(response_data)
-                        choices = response_data['choices']
-                        # logger.debug(choices)
-                        finish_reason = choices[0]['finish_reason']
-                        delta = choices[0]['delta']
-                        if len(delta) == 0 and finish_reason is not None:
-                            yield json.dumps(
-                                {
-                                    'role_name': '',
-                                    'text_content': '',
-                                    'streaming_complete': True
-                                }
-                            )
-                        else:
-                            role_name = delta['role']
-                            content_text = delta['content']
-                            yield json.dumps(
-                                {
-                                    'role_name': f'{role_name[0].upper()}{role_name[1:]}',
-                                    'text_content': content_text,
-                                    'streaming_complete': finish_reason is not None
-                                }
-                            )
-                            
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON Decode Error for chunk: {raw_response_data} exception: {e}")
-        else:
-            yield json.dumps(
-                {
-                    'role_name': 'system',
-                    'text_content': f"Failed to send data: {generated_response.status_code} - {generated_response.text}"
-                }
+                        for position in ticket.positions():
+                            yield queue_event(position)
+                    except SchedulerRejected as e:
+                        outcome = 'rejected'
+                        yield chat_event('system',
+                                f"The model is busy; try again in {e.retry_after} s", True)
+                        return
+                    timer.connecting()
+                    deltas = llm_backends.stream_chat(turn.payload, headers, timer.connected)
+                    # closed on break, so the backend is released before the turn is recorded
+                    with closing(deltas):
+                        for delta in deltas:
+                            if not delta.is_terminal:
+                                timer.token()
+                                response_parts.append(delta.content)
+                            elif delta.done:
+                                # the stream ended without a finish_reason
+                                outcome = 'truncated'
+                            yield delta_event(delta)
+                            if delta.is_terminal or delta.finish_reason is not None:
+                                break
+                except UpstreamError as e:
+                    outcome = 'upstream_error'
+                    yield chat_event('system', f"Failed to send data: {e}")
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Error during streaming: {e}")
+                    outcome = 'stream_error'
+                    yield chat_event('system', f"An error occurred during the stream: {str(e)}",
+                            True)
+                finally:
+                    # frees the slot as soon as the reply is done; closing the response below
+                    # covers a client gone before the body started
+                    ticket.release()
+                    timer.finished(outcome)
+                    chat_service.finish_turn(turn, response_parts, outcome)
+            response = flask.Response(
+                generate_response(),
+                mimetype='application/json',
+                content_type='application/json'
             )
-    generated_response = generate_response()
-    persona_conversation_item.conversation_content = (
-            f'{persona_conversation_item.conversation_content}{generated_response}'
-    )
-    app_db.upsert_conversation_entry(persona_conversation_item)
-    response = flask.Response(
-        generated_response,
-        mimetype='application/json',
-        content_type='application/json'
-    )
-    return response
+            response.call_on_close(lambda: ticket.release(used=False))
+            streaming = True
+            return response
+        finally:
+            if not streaming:
+                ticket.release(used=False)
 
-@app.route('/create_persona', methods=['POST'])
-def create_persona():
-    data = request.get_json()
-    name = data['name']
-    default_model = data['model']
-    system_prompt = data['prompt']
-    persona_data = Persona(name=name, default_model=default_model, system_prompt=system_prompt)
-    print(persona_data)
-    app_db.upsert_persona(persona_data)
+    @app.route('/session_settings', methods=['GET', 'POST'])
+    def session_settings():
+        session_id = check_session()
+        chat_service = services.chat_service
+        if request.method == 'POST':
+            data = request.get_json()
+            try:
+                settings = chat_service.select(session_id, persona_name=data.get('persona'),
+                        model=data.get('model'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            settings = chat_service.session_settings(session_id)
+        return jsonify({
+            'persona': chat_service.session_persona(session_id).name,
+            'model': settings.custom_mode_model,
+        })
 
+    @app.route('/compendium/<kind>')
+    def compendium_search(kind: str):
+        compendium = services.compendium
+        try:
+            return jsonify(compendium.search(kind, request.args))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return flask.Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    @app.route('/create_persona', methods=['POST'])
+    def create_persona():
+        from llm_common.persona import Persona
+        chat_service = services.chat_service
+        data = request.get_json()
+        name = data['name']
+        default_model = data['model']
+        system_prompt = data['prompt']
+        persona_data = Persona(name=name, default_model=default_model, system_prompt=system_prompt)
+        if not chat_service.create_persona(persona_data):
+            return jsonify({"error": f"Failed to save persona {persona_data.name}"}), 500
+        return jsonify({'name': persona_data.name})
 
-@app.route('/list_personas', methods=['GET'])
-def list_personas():
-    def dictify(personas:List[Persona]):
-        return {
-                p.name: {
-                        'model': p.default_model,
-                        'prompt': p.system_prompt
-                }
-        for p in personas
-        }
-    if not app_db.contains_persona('FeyCreature'):
-        from app_db.init_db import init_db
-        init_db()
-    personas = app_db.get_personas()
-    return jsonify(dictify(personas))
+
+    @app.route('/list_personas', methods=['GET'])
+    def list_personas():
+        chat_service = services.chat_service
+        return jsonify(persona_listing(chat_service.list_personas()))
+
+    return app
 
 
 @click.command()
 @click.option('--llm_host', default='localhost', help='LLM endpoint host')
 @click.option('--llm_port', default=1234, help='LLM endpoint port')
+@click.option('--llm_backend', 'llm_backends', multiple=True,
+        help='Base URL of an LLM server (http://host:port); repeat for a pool of servers. '
+             'Default: --llm_host/--llm_port')
+@click.option('--llm_health_interval', default=10.0,
+        help='Seconds between health checks of the LLM servers')
 @click.option('--version_str', default='v1', help='LLM endpoint version str')
 @click.option('--port', default=2345, help='Port to listen on')
-def main_cli(llm_host, llm_port, version_str, port):
-    globals()['llm_endpoints'] = LargeLanguageModelEndpoints(
-        base_url=f"http://{llm_host}:{llm_port}",
+@click.option('--llm_pool_size', default=16, help='Keep-alive connections kept per LLM host')
+@click.option('--llm_max_in_flight', default=32, help='Max concurrent requests per LLM host')
+@click.option('--llm_connect_timeout', default=3.05, help='LLM connect timeout in seconds')
+@click.option('--llm_read_timeout', default=300.0, help='LLM read timeout in seconds')
+@click.option('--llm_connect_retries', default=3, help='Retries with backoff on LLM connect errors')
+@click.option('--model_list_ttl', default=30.0, help='Seconds a fetched model list is served fresh')
+@click.option('--model_list_stale_ttl', default=600.0,
+        help='Seconds a model list may be served stale while it refreshes in the background')
+@click.option('--max_prompt_tokens', default=4096, help='Token budget for the assembled prompt')
+@click.option('--max_retrieved_tokens', default=1536,
+        help='Part of the prompt budget retrieved rule chunks may use')
+@click.option('--index_dir', default=None, type=click.Path(file_okay=False),
+        help='Directory holding the lexical/vector retrieval indexes')
+@click.option('--archive_dir', default=None, type=click.Path(file_okay=False),
+        help='Conversation archive written by app_db.compact_conversations; archived sessions '
+             'are restored from it when they are opened')
+@click.option('--embedding_model', default=None, help='Embedding model for vector retrieval')
+@click.option('--ann_nprobe', default=None, type=int,
+        help='Partitions the IVF-PQ vector index probes per query; default: as built')
+@click.option('--index_reload_interval', default=5.0,
+        help='Seconds between checks for a new index generation published by the ingester')
+@click.option('--answer_cache/--no-answer_cache', default=True,
+        help='Answer repeated questions from the answer cache')
+@click.option('--answer_cache_ttl', default=7 * 24 * 3600.0,
+        help='Seconds a cached answer is valid')
+@click.option('--answer_cache_max_entries', default=10_000, help='Cached answers kept (LRU)')
+@click.option('--answer_cache_near_hit_threshold', default=None, type=float,
+        help='Serve the cached answer of a question at least this similar (cosine, needs '
+             '--embedding_model); off by default')
+@click.option('--compendium_routing/--no-compendium_routing', default=True,
+        help='Answer listing questions ("all CR 3 undead") from the monster/spell tables '
+             'without the LLM')
+@click.option('--llm_max_concurrent', default=4,
+        help='Chat completions running at once per model and LLM server; more wait in the '
+             'scheduler queue')
+@click.option('--llm_max_queue_depth', default=64,
+        help='Requests waiting per model beyond which /submit answers 429')
+@click.option('--llm_max_wait', default=60.0,
+        help='Seconds a request may wait for the model (estimated at admission, enforced after)')
+@click.option('--serving_mode', default='threaded', type=click.Choice(['threaded', 'async']),
+        help='threaded: Flask dev server, one thread per open stream; '
+             'async: asyncio server proxying LLM streams as coroutines')
+@click.option('--warm_up/--lazy', default=True,
+        help='Open the DB, indexes and caches before serving instead of on the first request '
+             'that needs them')
+def main_cli(llm_host, llm_port, llm_backends, llm_health_interval, version_str, port,
+        llm_pool_size, llm_max_in_flight, llm_connect_timeout, llm_read_timeout,
+        llm_connect_retries, model_list_ttl, model_list_stale_ttl, max_prompt_tokens,
+        max_retrieved_tokens, index_dir, archive_dir, embedding_model, ann_nprobe,
+        index_reload_interval, answer_cache, answer_cache_ttl, answer_cache_max_entries,
+        answer_cache_near_hit_threshold, compendium_routing, llm_max_concurrent,
+        llm_max_queue_depth, llm_max_wait, serving_mode, warm_up):
+    services = AppServices(WebAppSettings(
+        llm_backends=list(llm_backends) or [f"http://{llm_host}:{llm_port}"],
         version_str=version_str,
-    )
-    app.run(debug=True, port=port)
+        llm_health_interval=llm_health_interval,
+        llm_pool_size=llm_pool_size,
+        llm_max_in_flight=llm_max_in_flight,
+        llm_connect_timeout=llm_connect_timeout,
+        llm_read_timeout=llm_read_timeout,
+        llm_connect_retries=llm_connect_retries,
+        model_list_ttl=model_list_ttl,
+        model_list_stale_ttl=model_list_stale_ttl,
+        max_prompt_tokens=max_prompt_tokens,
+        max_retrieved_tokens=max_retrieved_tokens,
+        index_dir=index_dir,
+        archive_dir=archive_dir,
+        embedding_model=embedding_model,
+        ann_nprobe=ann_nprobe,
+        index_reload_interval=index_reload_interval,
+        answer_cache=answer_cache,
+        answer_cache_ttl=answer_cache_ttl,
+        answer_cache_max_entries=answer_cache_max_entries,
+        answer_cache_near_hit_threshold=answer_cache_near_hit_threshold,
+        compendium_routing=compendium_routing,
+        llm_max_concurrent=llm_max_concurrent,
+        llm_max_queue_depth=llm_max_queue_depth,
+        llm_max_wait=llm_max_wait,
+    ))
+    if serving_mode == 'async':
+        from web_ui.async_app import create_async_app, serve_async_app
+        async_app = create_async_app(services, warm_up=warm_up)
+        serve_async_app(async_app, port=port)
+        return
+    if warm_up:
+        services.warm_up()
+    create_app(services).run(debug=True, port=port)
+
 
 if __name__ == "__main__":
     main_cli()
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator, Callable, Optional, TypeVar
+
+import httpx
+from quart import Quart, jsonify, render_template, request, session
+
+from backend.chat_app.chat_events import (TurnTimer, answer_events, chat_event, delta_event,
+        parse_history_cursor, persona_listing, queue_event, rejection_body, session_id_from)
+from llm_common.backend_pool import UpstreamError
+from llm_common.model_catalog import ModelCatalogUnavailable
+from llm_common.scheduler import SchedulerRejected
+from log.logger import logger
+from log.metrics import PROMETHEUS_CONTENT_TYPE, metrics, span
+from web_ui.services import AppServices
+
+T = TypeVar('T')
+
+
+class ClosingBody:
+    """A streamed response body that calls ``on_close`` when the server closes it, even if the
+    client went away before iteration started and so before ``body``'s own cleanup could run."""
+
+    def __init__(self, body: AsyncIterator[str], on_close: Callable[[], None]):
+        self._body = body
+        self._on_close = on_close
+
+    def __aiter__(self) -> 'ClosingBody':
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._body.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._body.aclose()
+        finally:
+            self._on_close()
+
+
+def create_async_app(services: AppServices, secret_key: Optional[str] = None,
+        warm_up: bool = True) -> Quart:
+    """The routes of ``web_ui.app`` on asyncio: the LLM stream of a /submit is proxied with
+    an async HTTP client, so an open chat costs a coroutine rather than a server thread. Only
+    the DB work before and after the stream runs on the default thread pool, as does building
+    a subsystem of ``services``: before serving with ``warm_up``, else on first use."""
+    app = Quart(__name__)
+    app.secret_key = (secret_key if secret_key is not None
+                      else os.environ.get('DND_APP_SECRET_KEY', 'your_secret_key'))
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+    async def run_blocking(func: Callable[..., T], *args) -> T:
+        """Run DB/catalog work on a worker thread, releasing that thread's DB session after."""
+        def call():
+            try:
+                return func(*args)
+            finally:
+                services.remove_db_session()
+        return await asyncio.to_thread(call)
+
+    async def service(name: str):
+        if services.built(name):
+            return getattr(services, name)
+        return await run_blocking(getattr, services, name)
+
+    def rejected_response(rejection: SchedulerRejected):
+        body, headers = rejection_body(rejection)
+        return jsonify(body), 429, headers
+
+    def check_session() -> uuid.UUID:
+        return session_id_from(session)
+
+    @app.before_serving
+    async def warm_up_services():
+        if warm_up:
+            await run_blocking(services.warm_up)
+
+    @app.after_serving
+    async def close_llm_client():
+        await services.aclose()
+
+    @app.route('/')
+    async def index():
+        check_session()
+        try:
+            model_catalog = await service('model_catalog')
+            model_list = await run_blocking(model_catalog.get_models)
+        except ModelCatalogUnavailable as e:
+            logger.error(e)
+            model_list = []
+        return await render_template('index.html', models=model_list)
+
+    @app.route('/conversation_history')
+    async def conversation_history():
+        session_id = check_session()
+        chat_service = await service('chat_service')
+        # imported with the service, off the worker's import path
+        from backend.chat_app.chat_service import DEFAULT_HISTORY_PAGE_SIZE
+        limit = request.args.get('limit', DEFAULT_HISTORY_PAGE_SIZE, type=int)
+        try:
+            before = parse_history_cursor(request.args.get('before'))
+        except ValueError:
+            return jsonify({"error": f"Invalid history cursor: {request.args.get('before')}"}), 400
+        records, next_cursor = await run_blocking(
+            chat_service.history_page, session_id, limit, before
+        )
+        return jsonify({
+            'messages': [
+                {
+                    'sender': record.conversation_sender,
+                    'content': record.conversation_content,
+                    'message_time': record.message_time.isoformat(),
+                }
+                for record in records
+            ],
+            'next_cursor': next_cursor,
+        })
+
+    @app.route('/list_models')
+    async def list_models():
+        try:
+            model_catalog = await service('model_catalog')
+            model_list = await run_blocking(model_catalog.get_models)
+        except ModelCatalogUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        return jsonify(model_list)
+
+    @app.route('/submit', methods=['POST'])
+    async def submit():
+        timer = TurnTimer()
+        with span('session_lookup'):
+            session_id = check_session()
+        llm_backends = await service('llm_backends')
+        chat_service = await service('chat_service')
+        llm_scheduler = await service('llm_scheduler')
+        data = await request.get_json()
+        logger.info(f"FORM DATA RECEIVED:\n{data}\n")
+        try:
+            # admitted before the user message is recorded, so a turned away request leaves no
+            # unanswered message behind, and the client's retry doesn't record it twice
+            ticket = llm_scheduler.enqueue(data['model'], session_id)
+        except SchedulerRejected as e:
+            timer.finished('rejected')
+            return rejected_response(e)
+        streaming = False
+        try:
+            turn = await run_blocking(
+                chat_service.prepare_turn, session_id, data['model'], data['chat_input']
+            )
+            if turn.answer is not None:
+                ticket.release(used=False)
+                timer.token()
+                timer.finished(turn.answer_source)
+                await run_blocking(chat_service.finish_turn, turn, [turn.answer],
+                        turn.answer_source)
+                return (answer_events(turn.answer), 200,
+                        {'Content-Type': 'application/json'})
+            headers = {'Content-Type': 'application/json'}
+
+            async def generate_response() -> AsyncIterator[str]:
+                response_parts = []
+                outcome = 'ok'
+                try:
+                    try:
+                        async for position in ticket.apositions():
+                            yield queue_event(position)
+                    except SchedulerRejected as e:
+                        outcome = 'rejected'
+                        yield chat_event('system',
+                                f"The model is busy; try again in {e.retry_after} s", True)
+                        return
+                    timer.connecting()
+                    deltas = llm_backends.astream_chat(turn.payload, headers, timer.connected)
+                    try:
+                        async for delta in deltas:
+                            if not delta.is_terminal:
+                                timer.token()
+                                response_parts.append(delta.content)
+                            elif delta.done:
+                                # the stream ended without a finish_reason
+                                outcome = 'truncated'
+                            yield delta_event(delta)
+                            if delta.is_terminal or delta.finish_reason is not None:
+                                break
+                    finally:
+                        # release the backend now, not whenever the generator is collected
+                        await deltas.aclose()
+                except UpstreamError as e:
+                    outcome = 'upstream_error'
+                    yield chat_event('system', f"Failed to send data: {e}")
+                except httpx.HTTPError as e:
+                    logger.error(f"Error during streaming: {e}")
+                    outcome = 'stream_error'
+                    yield chat_event('system', f"An error occurred during the stream: {str(e)}",
+                            True)
+                finally:
+                    # frees the slot as soon as the reply is done; ClosingBody covers a client
+                    # gone before the body started
+                    ticket.release()
+                    timer.finished(outcome)
+                    await run_blocking(chat_service.finish_turn, turn, response_parts, outcome)
+
+            body = ClosingBody(generate_response(), lambda: ticket.release(used=False))
+            streaming = True
+            return app.response_class(body, 200, {'Content-Type': 'application/json'})
+        finally:
+            if not streaming:
+                ticket.release(used=False)
+
+    @app.route('/session_settings', methods=['GET', 'POST'])
+    async def session_settings():
+        session_id = check_session()
+        chat_service = await service('chat_service')
+        if request.method == 'POST':
+            data = await request.get_json()
+            try:
+                settings = await run_blocking(chat_service.select, session_id,
+                        data.get('persona'), data.get('model'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            settings = await run_blocking(chat_service.session_settings, session_id)
+        persona = await run_blocking(chat_service.session_persona, session_id)
+        return jsonify({'persona': persona.name, 'model': settings.custom_mode_model})
+
+    @app.route('/compendium/<kind>')
+    async def compendium_search(kind: str):
+        compendium = await service('compendium')
+        try:
+            return jsonify(await run_blocking(compendium.search, kind, request.args.to_dict()))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    @app.route('/metrics')
+    async def prometheus_metrics():
+        return metrics.render(), 200, {'Content-Type': PROMETHEUS_CONTENT_TYPE}
+
+    @app.route('/create_persona', methods=['POST'])
+    async def create_persona():
+        from llm_common.persona import Persona
+        chat_service = await service('chat_service')
+        data = await request.get_json()
+        persona_data = Persona(
+            name=data['name'],
+            default_model=data['model'],
+            system_prompt=data['prompt'],
+        )
+        if not await run_blocking(chat_service.create_persona, persona_data):
+            return jsonify({"error": f"Failed to save persona {persona_data.name}"}), 500
+        return jsonify({'name': persona_data.name})
+
+    @app.route('/list_personas', methods=['GET'])
+    async def list_personas():
+        chat_service = await service('chat_service')
+        personas = await run_blocking(chat_service.list_personas)
+        return jsonify(persona_listing(personas))
+
+    return app
+
+
+def serve_async_app(app: Quart, port: int, host: str = 'localhost'):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = [f'{host}:{port}']
+    asyncio.run(serve(app, config))
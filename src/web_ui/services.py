@@ -0,0 +1,232 @@
+"""The subsystems behind the web routes, built on first use.
+
+Importing the web app opens no database, starts no threads and loads neither SQLAlchemy nor
+numpy: each subsystem's module is imported, and the subsystem constructed, the first time a
+route (or :meth:`AppServices.warm_up`) asks for it.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from dnd_pydantic_base.base_model import DnDAppBaseModel
+from log.logger import logger
+
+
+class WebAppSettings(DnDAppBaseModel):
+    llm_backends: List[str] = ['http://localhost:1234']
+    version_str: str = 'v1'
+    llm_health_interval: float = 10.0
+    llm_pool_size: int = 16
+    llm_max_in_flight: int = 32
+    llm_connect_timeout: float = 3.05
+    llm_read_timeout: float = 300.0
+    llm_connect_retries: int = 3
+    model_list_ttl: float = 30.0
+    model_list_stale_ttl: float = 600.0
+    max_prompt_tokens: int = 4096
+    max_retrieved_tokens: int = 1536
+    index_dir: Optional[str] = None
+    archive_dir: Optional[str] = None
+    embedding_model: Optional[str] = None
+    ann_nprobe: Optional[int] = None
+    index_reload_interval: float = 5.0
+    answer_cache: bool = True
+    answer_cache_ttl: float = 7 * 24 * 3600.0
+    answer_cache_max_entries: int = 10_000
+    answer_cache_near_hit_threshold: Optional[float] = None
+    compendium_routing: bool = True
+    llm_max_concurrent: int = 4
+    llm_max_queue_depth: int = 64
+    llm_max_wait: float = 60.0
+
+
+class AppServices:
+    """Builds each subsystem once, on first access, from :class:`WebAppSettings`.
+
+    Safe to share between request threads: construction runs under one re-entrant lock (a
+    subsystem builds the ones it depends on while holding it), and a built subsystem is read
+    without it.
+    """
+
+    def __init__(self, settings: Optional[WebAppSettings] = None):
+        self.settings = settings if settings is not None else WebAppSettings()
+        self._lock = threading.RLock()
+        self._built: Dict[str, Any] = {}
+
+    def _get(self, name: str, build: Callable[[], Any]) -> Any:
+        try:
+            return self._built[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._built:
+                started = time.perf_counter()
+                self._built[name] = build()
+                # None: configured off
+                if self._built[name] is not None:
+                    logger.info(f"Built {name} in {time.perf_counter() - started:.3f} s")
+            return self._built[name]
+
+    def built(self, name: str) -> bool:
+        return name in self._built
+
+    def warm_up(self):
+        """Build everything now, so the first requests don't pay for it."""
+        started = time.perf_counter()
+        self.chat_service
+        self.model_catalog
+        self.llm_scheduler
+        logger.info(f"Web app services ready in {time.perf_counter() - started:.3f} s")
+
+    def remove_db_session(self):
+        """Release the calling thread's DB session, if the DB has been opened at all."""
+        if self.built('db'):
+            self.db.remove_session()
+
+    async def aclose(self):
+        if self.built('llm_backends'):
+            await self.llm_backends.aclose()
+
+    @property
+    def db(self):
+        from app_db.app_data_db import get_app_db
+        return self._get('db', get_app_db)
+
+    @property
+    def llm_backends(self):
+        def build():
+            from llm_common.backend_pool import BackendPoolSettings, LLMBackendPool
+            from llm_common.endpoints import LargeLanguageModelEndpoints
+            from llm_common.http_client import HttpClientSettings
+            s = self.settings
+            http_settings = HttpClientSettings(
+                pool_maxsize=s.llm_pool_size,
+                max_in_flight=s.llm_max_in_flight,
+                connect_timeout=s.llm_connect_timeout,
+                read_timeout=s.llm_read_timeout,
+                connect_retries=s.llm_connect_retries,
+            )
+            backends = LLMBackendPool(
+                [
+                    LargeLanguageModelEndpoints(base_url=base_url.rstrip('/'),
+                            version_str=s.version_str, http_settings=http_settings)
+                    for base_url in s.llm_backends
+                ],
+                BackendPoolSettings(health_check_interval=s.llm_health_interval),
+            )
+            backends.start_health_checks()
+            return backends
+        return self._get('llm_backends', build)
+
+    @property
+    def model_catalog(self):
+        def build():
+            from llm_common.model_catalog import ModelCatalog
+            return ModelCatalog(
+                self.llm_backends,
+                ttl=self.settings.model_list_ttl,
+                stale_ttl=self.settings.model_list_stale_ttl,
+            )
+        return self._get('model_catalog', build)
+
+    @property
+    def llm_scheduler(self):
+        def build():
+            from llm_common.scheduler import LLMScheduler, SchedulerSettings
+            return LLMScheduler(
+                SchedulerSettings(
+                    max_concurrent_per_model=self.settings.llm_max_concurrent,
+                    max_queue_depth=self.settings.llm_max_queue_depth,
+                    max_wait=self.settings.llm_max_wait,
+                ),
+                backend_count=self.llm_backends.backend_count,
+            )
+        return self._get('llm_scheduler', build)
+
+    @property
+    def conversation_writer(self):
+        def build():
+            from app_db.conversation_writer import ConversationWriteBehind
+            return ConversationWriteBehind(self.db)
+        return self._get('conversation_writer', build)
+
+    @property
+    def persona_registry(self):
+        def build():
+            from llm_common.persona_registry import PersonaRegistry
+            return PersonaRegistry(self.db)
+        return self._get('persona_registry', build)
+
+    @property
+    def embedder(self):
+        def build():
+            if self.settings.embedding_model is None:
+                return None
+            from llm_common.embeddings import EmbeddingService
+            return EmbeddingService(self.llm_backends, self.db, self.settings.embedding_model)
+        return self._get('embedder', build)
+
+    @property
+    def retriever(self):
+        def build():
+            if self.settings.index_dir is None:
+                return None
+            from backend.retrieval.retriever import HybridRetriever
+            return HybridRetriever.from_directory(self.db, self.settings.index_dir,
+                    self.embedder, nprobe=self.settings.ann_nprobe,
+                    reload_interval=self.settings.index_reload_interval)
+        return self._get('retriever', build)
+
+    @property
+    def answer_cache(self):
+        def build():
+            if not self.settings.answer_cache:
+                return None
+            from backend.chat_app.answer_cache import AnswerCache
+            return AnswerCache(
+                self.db,
+                ttl=self.settings.answer_cache_ttl,
+                max_entries=self.settings.answer_cache_max_entries,
+                embedder=self.embedder,
+                near_hit_threshold=self.settings.answer_cache_near_hit_threshold,
+            )
+        return self._get('answer_cache', build)
+
+    @property
+    def compendium(self):
+        def build():
+            from backend.compendium.lookup import CompendiumLookup
+            return CompendiumLookup(self.db)
+        return self._get('compendium', build)
+
+    @property
+    def archive(self):
+        def build():
+            if self.settings.archive_dir is None:
+                return None
+            from app_db.conversation_archive import ConversationArchive
+            return ConversationArchive(self.db, self.settings.archive_dir)
+        return self._get('archive', build)
+
+    @property
+    def chat_service(self):
+        def build():
+            from backend.chat_app.chat_service import ChatService
+            from backend.chat_app.context_assembly import ContextAssembler, ContextBudget
+            from backend.chat_app.summarizer import ConversationSummarizer
+            return ChatService(
+                self.db,
+                self.conversation_writer,
+                self.persona_registry,
+                ContextAssembler(ContextBudget(
+                    max_prompt_tokens=self.settings.max_prompt_tokens,
+                    max_retrieved_tokens=self.settings.max_retrieved_tokens,
+                )),
+                summarizer=ConversationSummarizer(self.llm_backends, self.db,
+                        scheduler=self.llm_scheduler),
+                retriever=self.retriever,
+                answer_cache=self.answer_cache,
+                compendium=self.compendium if self.settings.compendium_routing else None,
+                archive=self.archive,
+            )
+        return self._get('chat_service', build)
@@ -88,6 +88,11 @@ document.addEventListener("DOMContentLoaded", function () {
             body: JSON.stringify(payload)
         })
             .then(async (response) => {
+                if (response.status === 429) {
+                    const retryAfter = response.headers.get('Retry-After');
+                    appendMessage('System', `The model is busy; try again in ${retryAfter} s.`);
+                    return;
+                }
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
@@ -160,8 +165,11 @@ document.addEventListener("DOMContentLoaded", function () {
             let messages = [];
             let [sender, message, streaming_complete] = handle_value(value);
             let done = streamDone || streaming_complete;
-            messages.push(message);
-            let fixed_message = edit_message(messages.join(''));
+            // queue position updates are shown until the reply starts, never kept
+            if (sender !== 'queue') {
+                messages.push(message);
+            }
+            let fixed_message = edit_message(sender === 'queue' ? message : messages.join(''));
             const messageDiv = create_messagediv(sender, fixed_message);
             messageDiv.innerHTML = create_message_html(sender, fixed_message);
             chatBox.appendChild(messageDiv);
@@ -170,6 +178,10 @@ document.addEventListener("DOMContentLoaded", function () {
                 let {value, done: streamDone} = await reader.read();
                 [sender, message, streaming_complete] = handle_value(value);
                 done = streamDone || streaming_complete || done;
+                if (sender === 'queue') {
+                    messageDiv.innerHTML = create_message_html(sender, edit_message(message));
+                    continue;
+                }
                 messages.push(message);
                 fixed_message = edit_message(messages.join(''));
                 messageDiv.innerHTML = create_message_html(sender, fixed_message);
@@ -189,6 +201,46 @@ document.addEventListener("DOMContentLoaded", function () {
         chatBox.scrollTop = chatBox.scrollHeight;
     }
 
+    // Conversation history: the latest page on load, older pages on demand
+    const loadOlderButton = document.createElement("button");
+    loadOlderButton.id = "load-older";
+    loadOlderButton.textContent = "Load older messages";
+    loadOlderButton.style.display = "none";
+    chatBox.prepend(loadOlderButton);
+    let historyCursor = null;
+
+    function loadHistory(before) {
+        const params = new URLSearchParams({limit: 20});
+        if (before) {
+            params.set('before', before);
+        }
+        return fetch(`/conversation_history?${params}`)
+            .then(response => response.json())
+            .then(page => {
+                const previousHeight = chatBox.scrollHeight;
+                let anchor = loadOlderButton;
+                page.messages.forEach(entry => {
+                    const fixed_message = edit_message(entry.content);
+                    const messageDiv = create_messagediv(entry.sender, fixed_message);
+                    messageDiv.innerHTML = create_message_html(entry.sender, fixed_message);
+                    anchor.after(messageDiv);
+                    anchor = messageDiv;
+                });
+                historyCursor = page.next_cursor;
+                loadOlderButton.style.display = historyCursor ? "" : "none";
+                if (before) {
+                    // keep the message the user was looking at in place
+                    chatBox.scrollTop += chatBox.scrollHeight - previousHeight;
+                } else {
+                    chatBox.scrollTop = chatBox.scrollHeight;
+                }
+            })
+            .catch(error => console.error('Failed to load conversation history:', error));
+    }
+
+    loadOlderButton.addEventListener("click", () => loadHistory(historyCursor));
+    loadHistory(null);
+
     // Event Listeners
     sendButton.addEventListener("click", sendMessage);
 
@@ -0,0 +1,11 @@
+import pytest
+
+from app_db.app_data_db import AppDataDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    app_db = AppDataDB(f'sqlite:///{tmp_path / "app.db"}')
+    yield app_db
+    app_db.remove_session()
+    app_db.engine.dispose()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from backend.chat_app.answer_cache import AnswerCache
+
+PROMPT = 'You are a dungeon master.'
+
+
+class WordEmbedder:
+    """Bag-of-words vectors over a fixed vocabulary: similar questions, similar vectors."""
+    VOCABULARY = ['how', 'much', 'damage', 'does', 'fireball', 'deal', 'do', 'goblin']
+
+    def embed_query(self, text):
+        words = text.split()
+        return np.array([words.count(w) for w in self.VOCABULARY], dtype=np.float32)
+
+
+def test_near_hit_after_storing_into_an_empty_cache(db):
+    cache = AnswerCache(db, embedder=WordEmbedder(), near_hit_threshold=0.8)
+    assert cache.lookup('dm', PROMPT, 'model', 'How much damage does fireball deal?',
+                        ['c1']) is None
+
+    cache.store('dm', PROMPT, 'model', 'How much damage does fireball deal?', ['c1'], '8d6 fire')
+    hit = cache.lookup('dm', PROMPT, 'model', 'how much damage does fireball do', ['c2'])
+
+    assert hit is not None and hit.answer_text == '8d6 fire'
+    assert 0.8 <= hit.similarity < 1.0
+
+
+def test_editing_the_persona_prompt_misses_its_old_answers(db):
+    cache = AnswerCache(db, embedder=WordEmbedder(), near_hit_threshold=0.8)
+    question = 'How much damage does fireball deal?'
+    cache.store('dm', PROMPT, 'model', question, ['c1'], '8d6 fire')
+
+    assert cache.lookup('dm', PROMPT, 'model', question, ['c1']) is not None
+    assert cache.lookup('dm', 'You are a pirate.', 'model', question, ['c1']) is None
@@ -0,0 +1,54 @@
+import datetime
+import threading
+import uuid
+
+from sqlalchemy.exc import OperationalError
+
+from llm_common.conversation import Conversation
+
+WRITES = 100
+READERS = 8
+
+
+def test_readers_and_a_writer_share_the_db_without_locking_errors(db):
+    session_id = uuid.uuid4()
+    start = datetime.datetime(2026, 1, 1)
+    writing = threading.Event()
+    writing.set()
+    errors = []
+
+    def reader():
+        try:
+            while writing.is_set():
+                db.get_conversation_history(session_id, 'dm')
+                # one scoped session per simulated request, as the web app's teardown does
+                db.remove_session()
+        except OperationalError as e:
+            errors.append(e)
+        finally:
+            db.remove_session()
+
+    def writer():
+        try:
+            for i in range(WRITES):
+                db.upsert_conversation_entry(Conversation(session_id=session_id,
+                        persona_name='dm', message_time=start + datetime.timedelta(seconds=i),
+                        conversation_sender='user', conversation_content=f'message {i}'))
+                db.remove_session()
+        except OperationalError as e:
+            errors.append(e)
+        finally:
+            writing.clear()
+            db.remove_session()
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+    history = db.get_conversation_history(session_id, 'dm')
+    assert [c.conversation_content for c in history] == [f'message {i}' for i in range(WRITES)]
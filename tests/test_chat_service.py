@@ -0,0 +1,57 @@
+import datetime
+import uuid
+
+import pytest
+
+from app_db.conversation_writer import ConversationWriteBehind
+from backend.chat_app.chat_service import DEFAULT_PERSONA, MAX_PROMPT_HISTORY_RECORDS, ChatService
+from backend.chat_app.context_assembly import ContextAssembler, ContextBudget
+from llm_common.conversation import Conversation
+from llm_common.persona import Persona
+from llm_common.persona_registry import PersonaRegistry
+
+
+class RecordingSummarizer:
+    def schedule(self, model, turns, summary):
+        self.scheduled = turns
+
+
+@pytest.fixture
+def session_id(db):
+    db.upsert_persona(Persona(name=DEFAULT_PERSONA, default_model='model', system_prompt='Hi'))
+    session_id = uuid.uuid4()
+    start = datetime.datetime(2026, 1, 1)
+    db.upsert_conversation_entries([
+        Conversation(session_id=session_id, persona_name=DEFAULT_PERSONA,
+                message_time=start + datetime.timedelta(seconds=i), conversation_sender='user',
+                conversation_content=f'message {i}')
+        for i in range(MAX_PROMPT_HISTORY_RECORDS + 5)
+    ])
+    return session_id
+
+
+def _chat_service(db, summarizer=None):
+    # room for a few turns only, so most fall out of the window
+    assembler = ContextAssembler(ContextBudget(max_prompt_tokens=200))
+    return ChatService(db, ConversationWriteBehind(db), PersonaRegistry(db), assembler,
+            summarizer=summarizer)
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_history_page_clamps_the_limit(db, session_id, limit):
+    records, next_cursor = _chat_service(db).history_page(session_id, limit)
+
+    assert [r.conversation_content for r in records] == [
+        f'message {MAX_PROMPT_HISTORY_RECORDS + 4}']
+    assert next_cursor is not None
+
+
+def test_prompt_history_reaches_every_unsummarized_turn(db, session_id):
+    summarizer = RecordingSummarizer()
+
+    turn = _chat_service(db, summarizer).prepare_turn(session_id, 'model', 'Next question')
+
+    assert turn.payload is not None
+    assert len(turn.payload['messages']) < MAX_PROMPT_HISTORY_RECORDS
+    # the oldest turns, beyond one page of history, still reach the summarizer
+    assert summarizer.scheduled[0].conversation_content == 'message 0'
@@ -0,0 +1,39 @@
+import pytest
+
+from backend.compendium.lookup import (
+    MonsterFilter,
+    SpellFilter,
+    monster_filter_from_args,
+    parse_compendium_question,
+)
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('list all CR 3 undead', MonsterFilter(creature_type='undead', cr_min=3.0, cr_max=3.0)),
+    ('Show me all large dragons with challenge rating 5 to 10',
+     MonsterFilter(creature_type='dragon', cr_min=5.0, cr_max=10.0, size='large')),
+    ('all 3rd-level evocation spells', SpellFilter(level=3, school='evocation')),
+    ('list every cantrip', SpellFilter(level=0)),
+    ('list all ritual spells of level 1', SpellFilter(level=1, ritual=True)),
+])
+def test_listing_requests_are_routed(question, expected):
+    assert parse_compendium_question(question) == expected
+
+
+@pytest.mark.parametrize('question', [
+    'Which undead are immune to poison?',
+    'What undead monsters would suit a level 3 party?',
+    'Tell me about evocation spells and how they scale',
+    'List the undead that resist necrotic damage',
+    'How do all evocation spells work?',
+    'CR 3 undead',
+    'list all spells',
+])
+def test_other_questions_go_to_the_llm(question):
+    assert parse_compendium_question(question) is None
+
+
+def test_zero_denominator_challenge_rating_is_a_value_error():
+    with pytest.raises(ValueError):
+        monster_filter_from_args({'cr': '1/0'})
+    assert parse_compendium_question('list all cr 1/0 monsters') is None
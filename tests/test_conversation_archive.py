@@ -0,0 +1,54 @@
+import datetime
+import uuid
+
+from app_db.app_data_db import AppDataDB
+from app_db.conversation_archive import ConversationArchive
+from llm_common import uuid_type
+from llm_common.conversation import Conversation
+
+
+def _turn(session_id, content, minutes_ago):
+    return Conversation(
+        session_id=session_id,
+        persona_name='dm',
+        message_time=datetime.datetime(2026, 1, 1) - datetime.timedelta(minutes=minutes_ago),
+        conversation_sender='user',
+        conversation_content=content,
+    )
+
+
+def test_archiving_a_session_twice_keeps_earlier_turns(db, tmp_path):
+    archive = ConversationArchive(db, tmp_path / 'archive')
+    session_id = uuid.uuid4()
+    db.upsert_conversation_entry(_turn(session_id, 'first message', 10))
+    assert archive.archive_session(session_id) is not None
+    # a new turn lands in the hot table without the session being rehydrated first
+    db.upsert_conversation_entry(_turn(session_id, 'second message', 5))
+
+    entry = archive.archive_session(session_id)
+
+    assert entry is not None and entry.turn_count == 2
+    assert db.get_session_conversations(session_id) == []
+    assert archive.rehydrate(session_id)
+    contents = [c.conversation_content for c in db.get_session_conversations(session_id)]
+    assert contents == ['first message', 'second message']
+
+
+def test_archiving_ids_stored_unlike_the_environment_says(tmp_path, monkeypatch):
+    url = f'sqlite:///{tmp_path / "app.db"}'
+    monkeypatch.setattr(uuid_type, '_uuid_as_blob', True)
+    writer_db = AppDataDB(url)
+    session_id = uuid.uuid4()
+    writer_db.upsert_conversation_entry(_turn(session_id, 'stored as a blob', 60))
+    writer_db.remove_session()
+    writer_db.engine.dispose()
+
+    monkeypatch.setattr(uuid_type, '_uuid_as_blob', False)
+    db = AppDataDB(url)
+    result = ConversationArchive(db, tmp_path / 'archive').archive_idle(
+        datetime.timedelta(minutes=1))
+
+    assert uuid_type.uuid_as_blob()
+    assert result.sessions == 1 and result.turns == 1
+    db.remove_session()
+    db.engine.dispose()
@@ -0,0 +1,73 @@
+import datetime
+import sqlite3
+import time
+import uuid
+
+from sqlalchemy.exc import OperationalError
+
+from app_db.conversation_writer import ConversationWriteBehind
+from llm_common.conversation import Conversation
+
+
+def test_flush_waits_only_for_the_sessions_own_writes(db):
+    # a batch window long enough that nothing commits unless a flush forces it
+    writer = ConversationWriteBehind(db, flush_interval=30.0)
+    busy, idle = uuid.uuid4(), uuid.uuid4()
+    writer.submit(Conversation(session_id=busy, persona_name='dm',
+            message_time=datetime.datetime.now(), conversation_sender='user',
+            conversation_content='hello'))
+
+    started = time.monotonic()
+    assert writer.flush(timeout=5, session_id=idle)
+    assert time.monotonic() - started < 1
+    assert writer.has_pending(busy)
+
+    assert writer.flush(timeout=5, session_id=busy)
+    assert not writer.has_pending(busy)
+    assert len(db.get_session_conversations(busy)) == 1
+    writer.close()
+
+
+def _turn(session_id):
+    return Conversation(session_id=session_id, persona_name='dm',
+            message_time=datetime.datetime.now(), conversation_sender='user',
+            conversation_content='hello')
+
+
+def _locked_upserts(db, monkeypatch, failures):
+    upsert = db.upsert_conversation_entries
+    attempts = []
+
+    def flaky_upsert(conversations):
+        attempts.append(len(conversations))
+        if len(attempts) <= failures:
+            raise OperationalError('INSERT', {}, sqlite3.OperationalError('database is locked'))
+        upsert(conversations)
+
+    monkeypatch.setattr(db, 'upsert_conversation_entries', flaky_upsert)
+    return attempts
+
+
+def test_a_locked_batch_is_retried_until_it_commits(db, monkeypatch):
+    attempts = _locked_upserts(db, monkeypatch, failures=2)
+    writer = ConversationWriteBehind(db, max_retries=3, retry_backoff=0.01)
+    session_id = uuid.uuid4()
+    writer.submit(_turn(session_id))
+
+    assert writer.flush(timeout=5)
+    assert attempts == [1, 1, 1]
+    assert len(db.get_session_conversations(session_id)) == 1
+    writer.close()
+
+
+def test_a_batch_is_dropped_once_its_retries_are_used_up(db, monkeypatch):
+    attempts = _locked_upserts(db, monkeypatch, failures=10)
+    writer = ConversationWriteBehind(db, max_retries=2, retry_backoff=0.01)
+    session_id = uuid.uuid4()
+    writer.submit(_turn(session_id))
+
+    assert writer.flush(timeout=5)
+    assert attempts == [1, 1, 1]
+    assert not writer.has_pending(session_id)
+    assert db.get_session_conversations(session_id) == []
+    writer.close()
@@ -0,0 +1,17 @@
+import datetime
+
+from sqlalchemy import text
+
+from app_db.documents import DocumentPage, SourceDocument
+
+
+def test_deleting_a_source_document_cascades_to_its_pages(db):
+    db.upsert_source_document(SourceDocument(source_path='/books/phb.pdf', title='phb',
+            file_sha256='abc', page_count=1, ingested_at=datetime.datetime.now()))
+    db.upsert_document_pages([DocumentPage(source_path='/books/phb.pdf', page_number=0,
+            page_text='Fireball', text_sha256='def', ocr_used=False)])
+
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM source_documents WHERE source_path = '/books/phb.pdf'"))
+
+    assert db.get_document_pages('/books/phb.pdf') == []
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.import_time_bench import PROBE, parse_importtime
+
+SRC_DIR = Path(__file__).resolve().parents[1] / 'src'
+MODULE = 'web_ui.app'
+BUDGET_MS = 800.0
+# built on first use by the services that need them, never by importing the web worker
+DEFERRED_PACKAGES = {'numpy', 'httpx', 'quart', 'fitz', 'sqlalchemy'}
+
+
+def _cold_import(cwd: Path):
+    env = {name: value for name, value in os.environ.items() if name != 'DND_APP_DB_URL'}
+    env['PYTHONPATH'] = str(SRC_DIR)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=MODULE)],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True,
+    )
+    total_us = next(cumulative for name, _, cumulative in parse_importtime(result.stderr)
+                    if name.strip() == MODULE)
+    return total_us / 1000, set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def test_web_app_cold_import_stays_lazy_and_under_budget(tmp_path):
+    # the first run fills the bytecode cache; the best of the rest counts
+    _cold_import(tmp_path)
+    runs = [_cold_import(tmp_path) for _ in range(3)]
+
+    assert min(ms for ms, _ in runs) < BUDGET_MS
+    assert DEFERRED_PACKAGES & runs[-1][1] == set()
+    # the app DB (default sqlite:///dnd_rag_data.db, relative to the working directory) is
+    # opened on first use only
+    assert list(tmp_path.iterdir()) == []
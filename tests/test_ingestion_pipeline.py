@@ -0,0 +1,24 @@
+import pymupdf
+
+from backend.ingestion.pipeline import PdfIngestionPipeline
+
+
+def _write_pdf(path, pages):
+    document = pymupdf.open()
+    for i in range(pages):
+        document.new_page().insert_text((72, 72), f"Chapter {i + 1}\nFireball deals 8d6 damage.")
+    document.save(path)
+
+
+def test_reingesting_a_shrunk_pdf_drops_its_missing_pages(db, tmp_path):
+    path = tmp_path / 'book.pdf'
+    _write_pdf(path, 4)
+    pipeline = PdfIngestionPipeline(db, workers=1, ocr=False)
+    pipeline.ingest_all([path])
+
+    _write_pdf(path, 2)
+    result = pipeline.ingest_all([path])[0]
+
+    assert result.changed
+    pages = db.get_document_pages(str(path.resolve()))
+    assert [page.page_number for page in pages] == [0, 1]
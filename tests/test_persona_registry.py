@@ -0,0 +1,22 @@
+from sqlalchemy import text
+
+from llm_common.persona import Persona
+from llm_common.persona_registry import PersonaRegistry
+
+
+def test_failed_upsert_leaves_the_registry_unchanged(db):
+    registry = PersonaRegistry(db)
+    assert registry.upsert(Persona(name='sage', default_model='a', system_prompt='Old'))
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE TABLE doomed (x)'))
+        for event in ('INSERT', 'UPDATE'):
+            conn.execute(text(f'CREATE TRIGGER fail_{event.lower()} BEFORE {event} ON personas '
+                              f'BEGIN INSERT INTO doomed VALUES (1); END'))
+        # the triggers now write to a missing table, failing every persona write
+        conn.execute(text('DROP TABLE doomed'))
+
+    assert not registry.upsert(Persona(name='sage', default_model='b', system_prompt='New'))
+    assert not registry.upsert(Persona(name='bard', default_model='b', system_prompt='Sing'))
+
+    assert registry.get('sage').system_prompt == 'Old'
+    assert not registry.contains('bard')
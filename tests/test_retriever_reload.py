@@ -0,0 +1,27 @@
+import numpy as np
+
+from backend.retrieval.generations import IndexGenerations
+from backend.retrieval.retriever import VECTOR_STORE_DIR, HybridRetriever
+from backend.retrieval.vector_store import MemmapVectorStore
+
+
+class FixedEmbedder:
+    def embed_query(self, text):
+        return np.ones(4, dtype=np.float32)
+
+
+def test_reload_sees_rows_deleted_since_the_last_generation(db, tmp_path):
+    store = MemmapVectorStore(db, tmp_path / VECTOR_STORE_DIR, dim=4)
+    store.append(['a', 'b'], np.eye(4, dtype=np.float32)[:2])
+    generations = IndexGenerations(tmp_path)
+    generations.publish(generations.stage())
+    retriever = HybridRetriever.from_directory(db, tmp_path, FixedEmbedder(), reload_interval=0)
+    assert list(retriever._indexes.vector_store.dead_rows()) == []
+
+    # the ingester, in its own process, deletes a chunk and publishes a new generation
+    MemmapVectorStore(db, tmp_path / VECTOR_STORE_DIR).delete(['a'])
+    published = generations.publish(generations.stage())
+    retriever._reload(published.name)
+
+    assert retriever.generation == published.name
+    assert list(retriever._indexes.vector_store.dead_rows()) == [0]